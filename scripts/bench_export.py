@@ -0,0 +1,279 @@
+"""
+Benchmark export_data.py on synthetic catalogs of a chosen size.
+
+Generates a products.db, pricelist and brand workbooks and an image tree
+with the same shape as the real sources (a few nbsp and multi-SKU spellings,
+DB-only products, SKUs without images) under scripts/bench_data/<scale>/,
+once per scale and seed. Each export step is then timed on its own:
+
+    load_categories / load_db_products     products.db
+    load_pricelist/cold, /warm             openpyxl parse vs. cached snapshot
+    load_nextcloud_brands/cold, /warm
+    scan_local_images, get_local_images    one walk vs. a lookup per SKU
+    merge                                  merge_products()
+    write/categories, /products, /search_index
+
+Every run appends one record per scale to scripts/metrics/bench_export.jsonl
+(the instrumentation.py format, with `scale` and `skus` gauges) and prints
+each stage next to the previous run of the same scale, flagging stages that
+got more than REGRESSION slower. The real scripts/xlsx_snapshots.db and
+image store are never touched.
+
+Usage:
+    python scripts/bench_export.py                        # 2k SKUs
+    python scripts/bench_export.py --scale 2k --scale 20k --scale 200k
+    python scripts/bench_export.py --scale 20k --repeat 3 --trace-memory
+    python scripts/bench_export.py --scale 5000 --regenerate
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import sys
+
+import openpyxl
+
+import catalog_db
+import export_data
+import instrumentation
+import xlsx_snapshot
+from catalog_output import write_json, write_products
+from search_index import SEARCH_INDEX_NAME, build_search_index
+
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8', errors='replace')
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCH_DIR = os.path.join(SCRIPT_DIR, 'bench_data')
+RESULTS_PATH = os.path.join(instrumentation.METRICS_DIR, 'bench_export.jsonl')
+
+SCALES = {'2k': 2_000, '20k': 20_000, '200k': 200_000}
+REGRESSION = 0.20          # slower than the previous run by more than this is flagged
+
+DB_SHARE = 0.45            # pricelist SKUs that also have a DB record
+DB_ONLY_SHARE = 0.05       # extra SKUs only in the DB (e.g. Disposable Items)
+BRAND_SHARE = 0.6
+IMAGE_SHARE = 0.35         # SKUs with a local image folder
+ALIAS_SHARE = 0.01         # DB SKUs spelled with nbsp or as several codes
+
+
+def parse_scale(value):
+    if value in SCALES:
+        return value, SCALES[value]
+    try:
+        return value, int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'scale must be one of {", ".join(SCALES)} or a number')
+
+
+# ============================================================================
+# SYNTHETIC CATALOG
+# ============================================================================
+
+def generate(root, skus, seed):
+    """Write a synthetic catalog with `skus` pricelist products under root."""
+    rng = random.Random(seed)
+    shutil.rmtree(root, ignore_errors=True)
+    os.makedirs(root)
+    chapters = sorted(export_data.CHAPTER_TO_CATEGORY)
+    brands = [f'Brand {i}' for i in range(40)]
+    codes = [f'{rng.choice("ABCDEFGHKLMPRSTW")}{i:06d}' for i in range(skus)]
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet('Verifica')
+    ws.append(['SKU', 'NAME LV', 'NAME EN', 'CHAPTER', 'SUB', 'CATALOGUE PRICE', 'VAT', 'EAN']
+              + [f'COL{i}' for i in range(8, 14)])
+    for i, sku in enumerate(codes):
+        name = f'Product {i} {rng.choice(("dryer", "brush", "comb", "scissors", "clipper"))}'
+        ws.append([sku, f'Prece {i}' if rng.random() < 0.7 else 'Nav atrasts', name.upper(),
+                   rng.choice(chapters), None, round(rng.uniform(1, 400), 2), None,
+                   str(4_000_000_000_000 + i)] + [None] * 6)
+    wb.save(os.path.join(root, 'pricelist.xlsx'))
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet('Catalog')
+    ws.append(['SKU', 'BRAND'])
+    for sku in codes:
+        if rng.random() < BRAND_SHARE:
+            ws.append([sku, rng.choice(brands)])
+    wb.save(os.path.join(root, 'brands.xlsx'))
+
+    conn = sqlite3.connect(os.path.join(root, 'products.db'))
+    conn.executescript('''
+        CREATE TABLE categories (id INTEGER PRIMARY KEY, name_en TEXT, name_lv TEXT, slug TEXT, sort_order INT);
+        CREATE TABLE products (id INTEGER PRIMARY KEY, sku TEXT, name_lv TEXT, description_lv TEXT, price REAL,
+                               category_id INT, source_url_lv TEXT, source_url_lt TEXT);
+        CREATE TABLE product_images (id INTEGER PRIMARY KEY, product_id INT, image_url TEXT, sort_order INT);
+    ''')
+    conn.executemany('INSERT INTO categories VALUES (?, ?, ?, ?, ?)',
+                     [(i, f'Category {i}', f'Kategorija {i}', f'kategorija-{i}', i) for i in range(1, 23)])
+    db_skus = [sku for sku in codes if rng.random() < DB_SHARE]
+    db_skus += [f'D{i:06d}' for i in range(int(skus * DB_ONLY_SHARE))]
+    products, images = [], []
+    for pid, sku in enumerate(db_skus, 1):
+        if rng.random() < ALIAS_SHARE:
+            sku = rng.choice((f'\xa0{sku} ', f'{sku} {sku}X1'))
+        products.append((pid, sku, f'Prece {pid}', f'Apraksts {pid}. ' * rng.randint(0, 6),
+                         round(rng.uniform(1, 400), 2), rng.randint(1, 22),
+                         f'https://example.lv/p/{pid}', None))
+        for n in range(rng.randint(0, 3)):
+            images.append((None, pid, f'https://example.lv/img/{pid}_{n}.jpg', n))
+    conn.executemany('INSERT INTO products VALUES (?, ?, ?, ?, ?, ?, ?, ?)', products)
+    conn.executemany('INSERT INTO product_images VALUES (?, ?, ?, ?)', images)
+    conn.commit()
+    conn.close()
+
+    images_dir = os.path.join(root, 'images')
+    for sku in codes:
+        if rng.random() < IMAGE_SHARE:
+            sku_dir = os.path.join(images_dir, sku)
+            os.makedirs(sku_dir)
+            for n in range(rng.randint(1, 4)):
+                open(os.path.join(sku_dir, f'{n + 1}.jpg'), 'wb').close()
+
+    with open(os.path.join(root, 'catalog.json'), 'w', encoding='utf-8') as f:
+        json.dump({'skus': skus, 'seed': seed}, f)
+
+
+def ensure_catalog(label, skus, seed, regenerate=False):
+    root = os.path.join(BENCH_DIR, label)
+    marker = os.path.join(root, 'catalog.json')
+    if not regenerate and os.path.exists(marker):
+        with open(marker, 'r', encoding='utf-8') as f:
+            if json.load(f) == {'skus': skus, 'seed': seed}:
+                return root
+    print(f'Generating {skus} SKU catalog in {root}...')
+    generate(root, skus, seed)
+    return root
+
+
+def use_catalog(root):
+    """Point export_data at a synthetic catalog (and away from the real caches)."""
+    catalog_db.close_all()
+    export_data.DB_PATH = os.path.join(root, 'products.db')
+    export_data.PRICELIST_PATH = os.path.join(root, 'pricelist.xlsx')
+    export_data.NEXTCLOUD_PATH = os.path.join(root, 'brands.xlsx')
+    export_data.LOCAL_IMAGES_DIR = os.path.join(root, 'images')
+    export_data._store_manifest = {'version': 1, 'blobs': {}, 'skus': {}, 'sources': {}}
+    xlsx_snapshot.SNAPSHOT_DB = os.path.join(root, 'xlsx_snapshots.db')
+
+
+# ============================================================================
+# BENCHMARK
+# ============================================================================
+
+def run_stages(root, repeat):
+    """Time every export step on the catalog under root, `repeat` times."""
+    stage = instrumentation.stage
+    output_dir = os.path.join(root, 'output')
+    os.makedirs(output_dir, exist_ok=True)
+    for _ in range(repeat):
+        with stage('load_categories'):
+            categories = export_data.load_categories_from_db()
+        with stage('load_db_products'):
+            db_products = export_data.load_db_products()
+        for name, load in (('load_pricelist', export_data.load_pricelist),
+                           ('load_nextcloud_brands', export_data.load_nextcloud_brands)):
+            if os.path.exists(xlsx_snapshot.SNAPSHOT_DB):
+                os.remove(xlsx_snapshot.SNAPSHOT_DB)
+            with stage(f'{name}/cold'):
+                rows = load()
+            with stage(f'{name}/warm'):
+                rows = load()
+            if name == 'load_pricelist':
+                pricelist = rows
+            else:
+                brands = rows
+
+        with stage('scan_local_images'):
+            image_index = export_data.scan_local_images()
+        with stage('get_local_images'):
+            for pl in pricelist:
+                export_data.get_local_images(pl.sku)
+
+        with stage('merge'):
+            images_for = export_data.image_lookup(image_index, export_data._store_manifest)
+            products, _ = export_data.merge_products(categories, db_products, pricelist, brands,
+                                                     images_for=images_for)
+        with stage('write'):
+            with stage('categories'):
+                write_json(os.path.join(output_dir, 'categories.json'),
+                           sorted(categories.values(), key=lambda c: int(c['number'])))
+            with stage('products'):
+                write_products(products, output_dir)
+            with stage('search_index'):
+                write_json(os.path.join(output_dir, SEARCH_INDEX_NAME), build_search_index(products),
+                           compact=True)
+        # Later passes compare file contents; make every pass write from scratch
+        shutil.rmtree(output_dir)
+        os.makedirs(output_dir)
+
+    instrumentation.gauge('rows.db_products', len(db_products))
+    instrumentation.gauge('rows.pricelist', len(pricelist))
+    instrumentation.gauge('products', len(products))
+
+
+def previous_runs(path, label):
+    """Bench records of one scale, oldest first."""
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return [r for r in records if r['gauges'].get('scale') == label and r['status'] == 'ok']
+
+
+def compare(path, label):
+    """Print the last run of a scale against the one before it (per call)."""
+    runs = previous_runs(path, label)
+    if not runs:
+        return
+    # tracemalloc and cProfile slow everything down: only compare like with like
+    def mode(record):
+        return 'peak_memory_bytes' in record, 'profile' in record
+
+    runs = [r for r in runs if mode(r) == mode(runs[-1])]
+    current = runs[-1]
+    before = runs[-2]['timers'] if len(runs) > 1 else {}
+    print(f'\n{label} ({current["gauges"]["skus"]} SKUs) vs. '
+          f'{runs[-2]["started"] if len(runs) > 1 else "no previous run"}:')
+    print(f'  {"stage":<38} {"seconds":>9} {"previous":>9} {"change":>8}')
+    for key, timer in sorted(current['timers'].items()):
+        seconds = timer['seconds'] / timer['calls']
+        old = before.get(key)
+        if old:
+            old_seconds = old['seconds'] / old['calls']
+            change = seconds / old_seconds - 1 if old_seconds else 0.0
+            flag = '  REGRESSION' if change > REGRESSION and seconds - old_seconds > 0.01 else ''
+            print(f'  {key:<38} {seconds:>9.3f} {old_seconds:>9.3f} {change:>+8.0%}{flag}')
+        else:
+            print(f'  {key:<38} {seconds:>9.3f} {"-":>9}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark export_data.py on synthetic catalogs.')
+    parser.add_argument('--scale', type=parse_scale, action='append',
+                        help=f'catalog size: {", ".join(SCALES)} or a SKU count (repeatable, default 2k)')
+    parser.add_argument('--repeat', type=int, default=1, help='passes per scale (default 1)')
+    parser.add_argument('--seed', type=int, default=1, help='random seed of the synthetic catalogs')
+    parser.add_argument('--regenerate', action='store_true', help='rebuild the synthetic catalogs')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    for label, skus in args.scale or [parse_scale('2k')]:
+        root = ensure_catalog(label, skus, args.seed, args.regenerate)
+        use_catalog(root)
+        print(f'\n=== {label}: {skus} SKUs, {args.repeat} pass(es) ===')
+        with instrumentation.run('bench_export', args):
+            instrumentation.gauge('scale', label)
+            instrumentation.gauge('skus', skus)
+            instrumentation.gauge('seed', args.seed)
+            run_stages(root, args.repeat)
+        catalog_db.close_all()
+        compare(args.metrics or RESULTS_PATH, label)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark the gallery extraction engines on saved product pages.
+
+Runs every available engine of gallery_extract.py over the same saved
+hairsera.lv / hairsera.lt pages, checks they find the same images as the
+original BeautifulSoup parse and reports time per page and how much of
+each page the streaming engines actually had to read.
+
+Usage:
+    python scripts/bench_html_extract.py --fetch 20     # save 20 LV + 20 LT pages first
+    python scripts/bench_html_extract.py                # benchmark scripts/html_fixtures/
+    python scripts/bench_html_extract.py page1.html page2.html --repeat 10
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import catalog_db
+from gallery_extract import CHUNK_SIZE, etree, extract_gallery_images
+from scrape_web_images import DB_PATH, client
+
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8', errors='replace')
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+FIXTURE_DIR = SCRIPT_DIR / 'html_fixtures'
+
+
+def fetch_fixtures(db_path, count):
+    """Save the first `count` LV and `count` LT product pages from the DB."""
+    FIXTURE_DIR.mkdir(exist_ok=True)
+    conn = catalog_db.connect(db_path)
+    wanted = {'lv': count, 'lt': count}
+    for row, _ in catalog_db.iter_products(conn, with_images=False):
+        for site in ('lv', 'lt'):
+            url = (row[f'source_url_{site}'] or '').strip()
+            if not url or not wanted[site]:
+                continue
+            r = client.request('GET', url, timeout=30)
+            if r.status_code != 200:
+                continue
+            (FIXTURE_DIR / f'{site}_{catalog_db.sku_key(row["sku"])}.html').write_bytes(r.content)
+            wanted[site] -= 1
+        if not any(wanted.values()):
+            break
+    print(f'Saved fixtures to {FIXTURE_DIR}')
+
+
+def chunked(data, consumed):
+    for i in range(0, len(data), CHUNK_SIZE):
+        consumed[0] += min(CHUNK_SIZE, len(data) - i)
+        yield data[i:i + CHUNK_SIZE]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark gallery extraction engines.')
+    parser.add_argument('pages', nargs='*', help=f'saved HTML pages (default: {FIXTURE_DIR}/*.html)')
+    parser.add_argument('--repeat', type=int, default=5, help='passes over the pages (default 5)')
+    parser.add_argument('--fetch', type=int, metavar='N', help='first save N LV and N LT pages from the DB')
+    parser.add_argument('--db', default=str(DB_PATH), help='path to products.db (for --fetch)')
+    args = parser.parse_args()
+
+    if args.fetch:
+        fetch_fixtures(args.db, args.fetch)
+
+    paths = [Path(p) for p in args.pages] or sorted(FIXTURE_DIR.glob('*.html'))
+    if not paths:
+        print('No pages to benchmark; save some with --fetch N')
+        return
+    pages = [p.read_bytes() for p in paths]
+    total_bytes = sum(len(p) for p in pages)
+    print(f'{len(pages)} pages, {total_bytes / 1024:.0f} KB, {args.repeat} passes')
+
+    engines = ['soup', 'html.parser'] + (['lxml'] if etree is not None else [])
+    reference = None
+    print(f'\n  {"engine":<12} {"ms/page":>9} {"speedup":>8} {"read":>6}  results')
+    for engine in engines:
+        consumed = [0]
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            results = [extract_gallery_images(chunked(p, consumed), engine) for p in pages]
+        elapsed = time.perf_counter() - start
+        ms = elapsed * 1000 / (len(pages) * args.repeat)
+
+        if reference is None:
+            reference, base_ms = results, ms
+        mismatched = [paths[i].name for i, (a, b) in enumerate(zip(reference, results))
+                      if set(a) != set(b)]
+        read = consumed[0] / (total_bytes * args.repeat)
+        status = 'same as soup' if not mismatched else f'{len(mismatched)} differ: {", ".join(mismatched[:5])}'
+        print(f'  {engine:<12} {ms:>9.2f} {base_ms / ms:>7.1f}x {read:>6.0%}  {status}')
+
+    if etree is None:
+        print('\n  (lxml not installed; pip install lxml to benchmark it)')
+
+
+if __name__ == '__main__':
+    main()
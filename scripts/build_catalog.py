@@ -0,0 +1,366 @@
+"""
+Build the whole catalog in one go: images, export, descriptions, translation.
+
+The pipeline is a small dependency graph of stages. Each stage declares its
+dependencies, the files it reads and the options that shape its output; a
+stage whose inputs and options hash the same as after its last successful
+run (scripts/build_state.json) is skipped, and stages whose dependencies are
+done run concurrently:
+
+    images-nextcloud -> images-web -> verify-images -> image-variants --.
+    sources (DB + workbooks) ------------------------------------------+--> export -> descriptions -> translate
+
+`sources` parses products.db and the workbooks while the images are still
+downloading. Data flows between the Python stages in memory: `export` gets
+the parsed sources and hands its category/product lists straight to
+`descriptions`, instead of every script re-reading products.json. A skipped
+stage whose result is still needed downstream is loaded on demand (sources
+re-parsed, export output read from data/). The downloaders, the variant
+renderer, the image verifier and the Node translation script run as subprocesses with their
+output prefixed by the stage name.
+
+Stages without declared inputs (the downloads, which compare against the
+remote side themselves, and the source parse) always run; unchanged results
+leave the downstream inputs unchanged. --offline skips every stage that
+needs the network.
+
+Usage:
+    python scripts/build_catalog.py
+    python scripts/build_catalog.py --offline                  # local stages only
+    python scripts/build_catalog.py --only export descriptions
+    python scripts/build_catalog.py --force                    # ignore recorded inputs
+    python scripts/build_catalog.py --dry-run                  # show which stages are stale
+"""
+
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import description_sidecar
+import export_data
+import image_store
+import image_variants
+import instrumentation
+from generate_descriptions import generate
+from translation_engine import BACKENDS
+
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8', errors='replace')
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(SCRIPT_DIR)
+STATE_PATH = os.path.join(SCRIPT_DIR, 'build_state.json')
+CATEGORIES_FILE = os.path.join(export_data.OUTPUT_DIR, 'categories.json')
+PRODUCTS_FILE = os.path.join(export_data.OUTPUT_DIR, 'products.json')
+
+
+# ============================================================================
+# FINGERPRINTS
+# ============================================================================
+
+def tree_fingerprint(path):
+    """Fingerprint of a folder of SKU folders by their names and mtimes (as scan_local_images)."""
+    h = hashlib.sha1()
+    with os.scandir(path) as it:
+        for entry in sorted(it, key=lambda e: e.name):
+            h.update(f'{entry.name}\t{entry.stat().st_mtime_ns}\n'.encode('utf-8'))
+    return {'sha1': h.hexdigest()}
+
+
+def fingerprint(path, previous=None):
+    if os.path.isdir(path):
+        return tree_fingerprint(path)
+    if os.path.exists(path):
+        return export_data.file_fingerprint(path, previous)
+    return {'sha1': None}
+
+
+def fingerprint_inputs(paths, previous):
+    previous = previous or {}
+    return {path: fingerprint(path, previous.get(path)) for path in paths}
+
+
+def fingerprint_stage(stage, previous):
+    """Fingerprints of the stage's inputs, plus its options as an 'options' pseudo-input."""
+    current = fingerprint_inputs(stage.inputs, previous)
+    if stage.options:
+        text = json.dumps(stage.options, sort_keys=True)
+        current['options'] = {'sha1': hashlib.sha1(text.encode('utf-8')).hexdigest()}
+    return current
+
+
+def same_inputs(current, previous):
+    return previous is not None and current.keys() == previous.keys() and all(
+        current[p]['sha1'] == previous[p]['sha1'] for p in current)
+
+
+def load_state():
+    if os.path.exists(STATE_PATH):
+        with open(STATE_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+
+def save_state(state):
+    tmp_path = STATE_PATH + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp_path, STATE_PATH)
+
+
+# ============================================================================
+# STAGES
+# ============================================================================
+
+class Stage:
+    """One pipeline step.
+
+    `run(ctx)` does the work and returns the value handed to dependents;
+    `load()` recreates that value when the stage was skipped. `inputs` are
+    files or folders whose content decides whether the stage is stale; a
+    stage without inputs always runs. `options` are the settings that change
+    the stage's output (e.g. --compact); changing them makes it stale too.
+    `remote` stages need the network.
+    """
+
+    def __init__(self, name, run, deps=(), inputs=(), outputs=(), options=None, remote=False, load=None):
+        self.name = name
+        self.run = run
+        self.deps = tuple(deps)
+        self.inputs = tuple(str(p) for p in inputs)
+        self.outputs = tuple(str(p) for p in outputs)
+        self.options = dict(options or {})
+        self.remote = remote
+        self.load = load
+
+
+class Context:
+    """Values of finished stages, loading skipped ones on first use."""
+
+    def __init__(self, stages):
+        self.stages = stages
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            if name not in self.values:
+                stage = self.stages[name]
+                print(f'[{name}] loading result of skipped stage')
+                self.values[name] = stage.load() if stage.load else None
+            return self.values[name]
+
+
+def run_script(name, command):
+    """Run a script as a subprocess, prefixing its output with the stage name."""
+    env = dict(os.environ, PYTHONIOENCODING='utf-8', PYTHONUNBUFFERED='1')
+    with subprocess.Popen(command, cwd=PROJECT_DIR, env=env, stdout=subprocess.PIPE,
+                          stderr=subprocess.STDOUT, text=True, encoding='utf-8',
+                          errors='replace') as proc:
+        for line in proc.stdout:
+            print(f'[{name}] {line.rstrip()}')
+    if proc.returncode:
+        raise RuntimeError(f'{os.path.basename(command[1])} exited with {proc.returncode}')
+
+
+def python_script(name, script, *args):
+    return lambda ctx: run_script(name, [sys.executable, os.path.join(SCRIPT_DIR, script), *args])
+
+
+def read_export():
+    with open(CATEGORIES_FILE, 'r', encoding='utf-8') as f:
+        categories = json.load(f)
+    with open(PRODUCTS_FILE, 'r', encoding='utf-8') as f:
+        products = json.load(f)
+    return categories, products
+
+
+def load_workbook_sources():
+    # The image tree is scanned by the export stage, after the downloads
+    return export_data.load_sources(image_index={})[:4]
+
+
+def build_stages(args):
+    dedupe = ['--dedupe'] if args.dedupe else []
+    source_files = [export_data.DB_PATH, export_data.PRICELIST_PATH, export_data.NEXTCLOUD_PATH]
+
+    def render_variants(ctx):
+        if importlib.util.find_spec('PIL') is None:
+            print('[image-variants] Pillow not installed, keeping the existing variants')
+            return
+        run_script('image-variants', [sys.executable, os.path.join(SCRIPT_DIR, 'image_variants.py')])
+
+    def export(ctx):
+        result = export_data.export(compact=args.compact, sources=ctx.get('sources'))
+        return result if result is not None else read_export()
+
+    def describe(ctx):
+        categories, products = ctx.get('export')
+        generate(products, categories, backend=args.backend)
+
+    stages = [
+        Stage('images-nextcloud', python_script('images-nextcloud', 'download_nextcloud_images.py', *dedupe),
+              remote=True),
+        Stage('images-web', python_script('images-web', 'scrape_web_images.py', *dedupe),
+              deps=['images-nextcloud'], remote=True),
+        # No inputs: always runs, only new or changed files are checked
+        Stage('verify-images', python_script('verify-images', 'verify_images.py'), deps=['images-web']),
+        Stage('image-variants', render_variants, deps=['verify-images'],
+              inputs=[image_variants.PRODUCTS_DIR, image_store.MANIFEST_PATH,
+                      os.path.join(SCRIPT_DIR, 'image_variants.py')],
+              outputs=[image_variants.MANIFEST_PATH]),
+        # No inputs: always parsed (cheap with the xlsx snapshots) while the downloads run
+        Stage('sources', lambda ctx: load_workbook_sources(), load=load_workbook_sources),
+        Stage('export', export, deps=['sources', 'image-variants'], load=read_export,
+              inputs=source_files + [
+                  os.path.join(SCRIPT_DIR, 'export_data.py'),
+                  export_data.LOCAL_IMAGES_DIR, image_store.MANIFEST_PATH,
+                  image_variants.MANIFEST_PATH, description_sidecar.SIDECAR_PATH],
+              outputs=[CATEGORIES_FILE, PRODUCTS_FILE], options={'compact': args.compact}),
+        Stage('descriptions', describe, deps=['export'], remote=args.backend != 'stub',
+              inputs=[CATEGORIES_FILE, PRODUCTS_FILE, description_sidecar.SIDECAR_PATH,
+                      os.path.join(SCRIPT_DIR, 'generate_descriptions.py')]),
+        Stage('translate', lambda ctx: run_script(
+                  'translate', ['node', os.path.join(SCRIPT_DIR, 'translate-descriptions.mjs')]),
+              deps=['descriptions'], remote=True,
+              inputs=[PRODUCTS_FILE, description_sidecar.SIDECAR_PATH,
+                      os.path.join(SCRIPT_DIR, 'translate-descriptions.mjs')]),
+    ]
+    return {stage.name: stage for stage in stages}
+
+
+# ============================================================================
+# RUNNER
+# ============================================================================
+
+class Pipeline:
+    def __init__(self, stages, force=False, offline=False, only=None):
+        for stage in stages.values():
+            unknown = set(stage.deps) - stages.keys()
+            if unknown:
+                raise ValueError(f'stage {stage.name} depends on unknown stage(s): {", ".join(sorted(unknown))}')
+        self.stages = stages
+        self.force = force
+        self.offline = offline
+        self.only = set(only) if only else None
+        self.state = load_state()
+        self.ctx = Context(stages)
+        self.status = {}
+        self.timings = {}
+        self._lock = threading.Lock()
+
+    def why_skip(self, stage):
+        """Reason to skip the stage, or None when it has to run."""
+        if self.only is not None and stage.name not in self.only:
+            return 'not selected'
+        if stage.remote and self.offline:
+            return 'offline'
+        if self.force or not stage.inputs:
+            return None
+        if not all(os.path.exists(p) for p in stage.outputs):
+            return None
+        current = fingerprint_stage(stage, self.state.get(stage.name))
+        return 'up to date' if same_inputs(current, self.state.get(stage.name)) else None
+
+    def execute(self, stage):
+        reason = self.why_skip(stage)
+        if reason:
+            return f'skipped ({reason})'
+        print(f'==> {stage.name}')
+        start = time.perf_counter()
+        with instrumentation.stage(stage.name, parent=''):
+            value = stage.run(self.ctx)
+        self.timings[stage.name] = time.perf_counter() - start
+        with self._lock:
+            self.ctx.values[stage.name] = value
+            if stage.inputs:
+                # Recorded after the run: a stage that rewrites its own inputs is not stale next time
+                self.state[stage.name] = fingerprint_stage(stage, self.state.get(stage.name))
+                save_state(self.state)
+        return 'ran'
+
+    def run(self):
+        """Run every stage once its dependencies are done; returns True when none failed."""
+        pending = dict(self.stages)
+        running = {}
+        with ThreadPoolExecutor(max_workers=len(self.stages)) as pool:
+            while pending or running:
+                for name, stage in list(pending.items()):
+                    dep_status = [self.status.get(dep) for dep in stage.deps]
+                    if any(s and (s.startswith('failed') or s.startswith('blocked')) for s in dep_status):
+                        self.status[name] = 'blocked'
+                        del pending[name]
+                    elif all(dep_status):
+                        running[pool.submit(self.execute, stage)] = name
+                        del pending[name]
+                if not running:
+                    # Nothing runs and nothing could start: the rest wait on each other
+                    for name in pending:
+                        print(f'[{name}] BLOCKED: dependency cycle')
+                        self.status[name] = 'blocked'
+                    pending.clear()
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        self.status[name] = future.result()
+                    except Exception as e:
+                        print(f'[{name}] FAILED: {e}')
+                        self.status[name] = 'failed'
+        return not any(s in ('failed', 'blocked') for s in self.status.values())
+
+    def dry_run(self):
+        for name, stage in self.stages.items():
+            reason = self.why_skip(stage)
+            print(f'  {name:<18} {"would run" if reason is None else reason}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the catalog: images, export, descriptions, translation.')
+    parser.add_argument('--only', nargs='+', metavar='STAGE',
+                        help='run only these stages (others are loaded from disk when needed)')
+    parser.add_argument('--offline', action='store_true',
+                        help='skip the downloads and translation (remote stages)')
+    parser.add_argument('--force', action='store_true', help='run stages even when their inputs are unchanged')
+    parser.add_argument('--dry-run', action='store_true', help='only show which stages are stale')
+    parser.add_argument('--dedupe', action='store_true', help='download images into the image store')
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='google',
+                        help='translation backend for generated descriptions')
+    parser.add_argument('--compact', action='store_true', help='export unindented JSON')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    stages = build_stages(args)
+    unknown = set(args.only or ()) - stages.keys()
+    if unknown:
+        parser.error(f'unknown stage(s): {", ".join(sorted(unknown))} (choose from {", ".join(stages)})')
+
+    pipeline = Pipeline(stages, force=args.force, offline=args.offline, only=args.only)
+    if args.dry_run:
+        pipeline.dry_run()
+        return
+
+    start = time.perf_counter()
+    with instrumentation.run('build_catalog', args):
+        ok = pipeline.run()
+
+    print(f'\n{"=" * 60}')
+    print(f'  BUILD {"DONE" if ok else "FAILED"} in {time.perf_counter() - start:.1f}s')
+    print(f'{"=" * 60}')
+    for name in stages:
+        took = pipeline.timings.get(name)
+        print(f'  {name:<18} {pipeline.status.get(name, "-"):<26} {f"{took:.1f}s" if took is not None else ""}')
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
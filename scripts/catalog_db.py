@@ -0,0 +1,82 @@
+"""
+Read-only access to products.db shared by the catalog scripts.
+
+All readers go through one cached connection per database file, opened with
+a `mode=ro` URI (plus `immutable=1` when no writer journal is present, which
+lets SQLite skip locking entirely). Products and their images come back in a
+single ordered pass over a LEFT JOIN, grouped per product in Python instead
+of a second query and per-row dict lookups.
+
+Usage:
+    import catalog_db
+    conn = catalog_db.connect(DB_PATH)
+    for row, images in catalog_db.iter_products(conn):
+        ...
+"""
+
+import itertools
+import os
+import sqlite3
+from pathlib import Path
+
+from sku_index import normalize_sku
+
+_connections = {}
+
+
+def connect(db_path):
+    """Return the shared read-only connection for db_path (one per process)."""
+    key = os.path.abspath(db_path)
+    conn = _connections.get(key)
+    if conn is None:
+        uri = Path(key).as_uri() + '?mode=ro'
+        if not any(os.path.exists(key + suffix) for suffix in ('-wal', '-journal')):
+            uri += '&immutable=1'  # nobody is writing: no locks, no change detection
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        _connections[key] = conn
+    return conn
+
+
+def close_all():
+    """Close every shared connection opened by connect()."""
+    for conn in _connections.values():
+        conn.close()
+    _connections.clear()
+
+
+def sku_key(sku):
+    """Normalized SKU used as dict key across the scripts (see sku_index.normalize_sku)."""
+    return normalize_sku(sku)
+
+
+def fetch_categories(conn):
+    """All categories ordered by sort_order."""
+    return conn.execute(
+        'SELECT id, name_en, name_lv, slug, sort_order FROM categories ORDER BY sort_order'
+    ).fetchall()
+
+
+def iter_products(conn, with_images=True):
+    """Yield (product_row, image_urls) for every product, ordered by SKU.
+
+    product_row is a sqlite3.Row with id, sku, name_lv, description_lv, price,
+    category_id, source_url_lv and source_url_lt. image_urls is ordered by
+    sort_order (always empty when with_images is False).
+    """
+    columns = '''p.id, p.sku, p.name_lv, p.description_lv, p.price, p.category_id,
+                 p.source_url_lv, p.source_url_lt'''
+    if not with_images:
+        for row in conn.execute(f'SELECT {columns} FROM products p ORDER BY p.sku, p.id'):
+            yield row, []
+        return
+
+    cur = conn.execute(f'''
+        SELECT {columns}, pi.image_url
+        FROM products p
+        LEFT JOIN product_images pi ON pi.product_id = p.id
+        ORDER BY p.sku, p.id, pi.sort_order
+    ''')
+    for _, rows in itertools.groupby(cur, key=lambda r: r['id']):
+        rows = list(rows)
+        yield rows[0], [r['image_url'] for r in rows if r['image_url'] is not None]
@@ -0,0 +1,263 @@
+"""
+Change sets and price history between catalog exports.
+
+export_data.py replaces data/products.json wholesale, so on its own a
+consumer cannot tell which products changed. The previous export's products
+are kept in scripts/catalog_history.db (SQLite, one row per SKU with a digest
+of the exported record), and every export is diffed against them:
+
+    data/changes.json
+    {"export": 12, "previous": 11, "exported_at": "2026-...",
+     "added": ["B348", ...], "removed": [...],
+     "changed": {"UG04E": {"price": [12.5, 13.9], "images": [[...], [...]]}}}
+
+The diff is a streaming merge of two SKU-sorted sequences: the stored rows
+come from an ORDER BY cursor and only records whose digest differs are
+decoded, so the previous export is never loaded as a dict. The database also
+keeps every change set (`changes`) and each product's prices over time
+(`price_history`, starting with the price it was added at).
+Positional fields (`id`, renumbered on every export) are not part of the
+stored record, so removing one product is one change, not a renumbering of
+every product after it.
+An export that changes nothing adds no rows and leaves data/changes.json as
+it was.
+
+Usage:
+    change_set = catalog_history.record_export(products)   # from export_data.py
+    python scripts/catalog_history.py                      # recent exports
+    python scripts/catalog_history.py --sku B348           # price history of one SKU
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+from datetime import datetime, timezone
+from operator import itemgetter
+
+from catalog_output import write_json
+from sku_index import normalize_sku
+from stream_join import merge_join
+
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8', errors='replace')
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+HISTORY_DB = os.path.join(SCRIPT_DIR, 'catalog_history.db')
+CHANGES_NAME = 'changes.json'
+
+# Fields that follow a product's position in the export, not its content
+POSITIONAL_FIELDS = ('id',)
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS products (
+        sku TEXT PRIMARY KEY,
+        digest TEXT NOT NULL,
+        record TEXT NOT NULL
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS exports (
+        id INTEGER PRIMARY KEY,
+        exported_at TEXT NOT NULL,
+        products INTEGER NOT NULL,
+        added INTEGER NOT NULL,
+        removed INTEGER NOT NULL,
+        changed INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS changes (
+        export_id INTEGER NOT NULL,
+        sku TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        fields TEXT,
+        PRIMARY KEY (export_id, sku)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS price_history (
+        sku TEXT NOT NULL,
+        export_id INTEGER NOT NULL,
+        exported_at TEXT NOT NULL,
+        old_price REAL,
+        new_price REAL,
+        PRIMARY KEY (sku, export_id)
+    ) WITHOUT ROWID;
+'''
+
+
+def connect(path=HISTORY_DB):
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def content(product):
+    """The product without its positional fields."""
+    return {k: v for k, v in product.items() if k not in POSITIONAL_FIELDS}
+
+
+def record_text(product):
+    return json.dumps(content(product), ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+
+
+def iter_current(products):
+    """(sku_key, record_text, digest) of the exported products in SKU order."""
+    keyed = sorted((normalize_sku(p['sku']), i) for i, p in enumerate(products))
+    for key, i in keyed:
+        text = record_text(products[i])
+        yield key, text, hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def field_diff(old, new):
+    """{field: [old, new]} for every top-level content field whose value differs."""
+    old, new = content(old), content(new)
+    return {field: [old.get(field), new.get(field)]
+            for field in sorted(old.keys() | new.keys())
+            if old.get(field) != new.get(field)}
+
+
+def merge_diff(previous, current):
+    """Sort-merge two SKU-ordered streams into (kind, previous_row, current_row) events.
+
+    `previous` yields stored (sku, digest, record_text) rows, `current`
+    yields iter_current() tuples; unchanged SKUs produce no event.
+    """
+    for _, prev, cur in merge_join(previous, current, key=itemgetter(0)):
+        prev = prev[0] if prev else None
+        cur = cur[0] if cur else None
+        if prev is None:
+            yield 'added', None, cur
+        elif cur is None:
+            yield 'removed', prev, None
+        elif prev[1] != cur[2]:
+            yield 'changed', prev, cur
+
+
+def last_change_set(conn):
+    """The most recent stored change set in the changes.json format, or None."""
+    row = conn.execute('SELECT id, exported_at FROM exports ORDER BY id DESC LIMIT 1').fetchone()
+    if row is None:
+        return None
+    export_id, exported_at = row
+    previous_id = conn.execute('SELECT MAX(id) FROM exports WHERE id < ?', (export_id,)).fetchone()[0]
+    change_set = {'export': export_id, 'previous': previous_id, 'exported_at': exported_at,
+                  'added': [], 'removed': [], 'changed': {}}
+    for sku, kind, fields in conn.execute(
+            'SELECT sku, kind, fields FROM changes WHERE export_id = ? ORDER BY sku', (export_id,)):
+        if kind == 'changed':
+            change_set['changed'][sku] = json.loads(fields)
+        else:
+            change_set[kind].append(sku)
+    return change_set
+
+
+def record_export(products, output_dir=None, path=None):
+    """Diff `products` against the previous export, store them and return the change set.
+
+    The change set is also written to <output_dir>/changes.json when
+    something changed (or the file is missing: then the last stored change
+    set is written again). Returns None when nothing changed.
+    """
+    exported_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    conn = connect(path or HISTORY_DB)
+    try:
+        previous_id = conn.execute('SELECT MAX(id) FROM exports').fetchone()[0]
+        change_set = {'export': (previous_id or 0) + 1, 'previous': previous_id,
+                      'exported_at': exported_at, 'added': [], 'removed': [], 'changed': {}}
+        # Separate cursor: the merge reads it while the writes below go to `conn`
+        stored = conn.cursor().execute('SELECT sku, digest, record FROM products ORDER BY sku')
+        events = []
+        restamped = []  # rows stored before positional fields were dropped
+        for kind, prev, cur in merge_diff(stored, iter_current(products)):
+            sku = (cur or prev)[0]
+            fields = None
+            if kind == 'changed':
+                fields = field_diff(json.loads(prev[2]), json.loads(cur[1]))
+                if not fields:
+                    restamped.append((sku, cur[2], cur[1]))
+                    continue
+                change_set['changed'][sku] = fields
+            else:
+                change_set[kind].append(sku)
+            events.append((kind, sku, cur, fields))
+        if restamped:
+            with conn:
+                conn.executemany('UPDATE products SET digest = ?, record = ? WHERE sku = ?',
+                                 [(digest, text, sku) for sku, digest, text in restamped])
+        if not events:
+            changes_path = output_dir and os.path.join(output_dir, CHANGES_NAME)
+            if changes_path and not os.path.exists(changes_path):
+                last = last_change_set(conn)
+                if last:
+                    write_json(changes_path, last)
+            return None
+
+        export_id = change_set['export']
+        with conn:
+            conn.execute(
+                'INSERT INTO exports (id, exported_at, products, added, removed, changed) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (export_id, exported_at, len(products), len(change_set['added']),
+                 len(change_set['removed']), len(change_set['changed'])),
+            )
+            for kind, sku, cur, fields in events:
+                if kind == 'removed':
+                    conn.execute('DELETE FROM products WHERE sku = ?', (sku,))
+                else:
+                    conn.execute('INSERT OR REPLACE INTO products (sku, digest, record) VALUES (?, ?, ?)',
+                                 (sku, cur[2], cur[1]))
+                conn.execute('INSERT INTO changes (export_id, sku, kind, fields) VALUES (?, ?, ?, ?)',
+                             (export_id, sku, kind, json.dumps(fields, ensure_ascii=False) if fields else None))
+                if kind == 'added':
+                    prices = (None, json.loads(cur[1]).get('price'))
+                elif fields and 'price' in fields:
+                    prices = fields['price']
+                else:
+                    continue
+                conn.execute(
+                    'INSERT INTO price_history (sku, export_id, exported_at, old_price, new_price) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (sku, export_id, exported_at, *prices),
+                )
+    finally:
+        conn.close()
+
+    if output_dir:
+        write_json(os.path.join(output_dir, CHANGES_NAME), change_set)
+    return change_set
+
+
+# ============================================================================
+# REPORTS
+# ============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description='Show catalog export history.')
+    parser.add_argument('--sku', help='print the price history and changes of one SKU')
+    parser.add_argument('--limit', type=int, default=20, help='number of exports to list')
+    args = parser.parse_args()
+
+    if not os.path.exists(HISTORY_DB):
+        print(f'No export history at {HISTORY_DB}')
+        return
+    conn = connect()
+    if args.sku:
+        sku = normalize_sku(args.sku)
+        print(f'Price history of {sku}:')
+        for exported_at, old, new in conn.execute(
+                'SELECT exported_at, old_price, new_price FROM price_history WHERE sku = ? ORDER BY export_id',
+                (sku,)):
+            print(f'  {exported_at}  {old} -> {new}')
+        print('Changes:')
+        for export_id, kind, fields in conn.execute(
+                'SELECT export_id, kind, fields FROM changes WHERE sku = ? ORDER BY export_id', (sku,)):
+            print(f'  #{export_id} {kind}: {", ".join(json.loads(fields)) if fields else ""}')
+    else:
+        print(f'{"export":>6}  {"exported_at":<25} {"products":>8} {"added":>6} {"removed":>7} {"changed":>7}')
+        for row in conn.execute('SELECT id, exported_at, products, added, removed, changed '
+                                'FROM exports ORDER BY id DESC LIMIT ?', (args.limit,)):
+            print(f'{row[0]:>6}  {row[1]:<25} {row[2]:>8} {row[3]:>6} {row[4]:>7} {row[5]:>7}')
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Writers for the catalog JSON files read by src/lib/data.ts.
+
+Besides data/products.json (every product), each export emits one shard per
+category in data/products/<slug>.json and a small data/products-manifest.json
+mapping id ranges to shards, so a category or product page cold start only
+parses the products it needs.
+
+Records are streamed to disk one at a time, optionally without indentation,
+and a file is only replaced when its bytes actually change.
+"""
+
+import filecmp
+import json
+import os
+
+SHARD_DIR_NAME = 'products'
+MANIFEST_NAME = 'products-manifest.json'
+
+
+def iter_json_array(items, compact=False):
+    """Yield the JSON text of a list chunk by chunk.
+
+    Pretty output is byte-identical to json.dump(items, indent=2); compact
+    output puts one unindented record per line.
+    """
+    if not items:
+        yield '[]'
+        return
+    yield '[\n'
+    for i, item in enumerate(items):
+        if i:
+            yield ',\n'
+        if compact:
+            yield json.dumps(item, ensure_ascii=False, separators=(',', ':'))
+        else:
+            text = json.dumps(item, ensure_ascii=False, indent=2)
+            yield '  ' + text.replace('\n', '\n  ')
+    yield '\n]'
+
+
+def write_chunks(path, chunks):
+    """Stream chunks to path atomically; keep the old file if the bytes are identical.
+
+    Returns True when the file was (re)written.
+    """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8', newline='\n') as f:
+        for chunk in chunks:
+            f.write(chunk)
+    if os.path.exists(path) and filecmp.cmp(tmp_path, path, shallow=False):
+        os.remove(tmp_path)
+        return False
+    os.replace(tmp_path, path)
+    return True
+
+
+def write_json(path, data, compact=False):
+    """Write any JSON value with the same pretty/compact conventions."""
+    if isinstance(data, list):
+        return write_chunks(path, iter_json_array(data, compact))
+    if compact:
+        text = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    else:
+        text = json.dumps(data, ensure_ascii=False, indent=2)
+    return write_chunks(path, [text])
+
+
+def build_manifest(products):
+    """Group products by category slug and collect contiguous id ranges per shard."""
+    shards = {}
+    ranges = []
+    for p in products:
+        slug = p.get('categorySlug')
+        if not slug:
+            continue  # not reachable from any category page; lives in products.json only
+        shards.setdefault(slug, []).append(p)
+        if ranges and ranges[-1][2] == slug and ranges[-1][1] == p['id'] - 1:
+            ranges[-1][1] = p['id']
+        else:
+            ranges.append([p['id'], p['id'], slug])
+    manifest = {
+        'total': len(products),
+        'shards': {slug: {'file': f'{SHARD_DIR_NAME}/{slug}.json', 'count': len(items)}
+                   for slug, items in shards.items()},
+        'ranges': ranges,
+    }
+    return manifest, shards
+
+
+def written_compact(output_dir):
+    """Whether the last export wrote output_dir compact (as recorded in its manifest)."""
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return bool(json.load(f).get('compact'))
+    except (OSError, ValueError):
+        return False
+
+
+def write_products(products, output_dir, compact=False):
+    """Write products.json, the per-category shards and the manifest.
+
+    Returns the paths (relative to output_dir) that were rewritten.
+    """
+    written = []
+    os.makedirs(output_dir, exist_ok=True)
+    if write_chunks(os.path.join(output_dir, 'products.json'), iter_json_array(products, compact)):
+        written.append('products.json')
+
+    manifest, shards = build_manifest(products)
+    manifest['compact'] = compact  # translate-descriptions.mjs rewrites the shards in the same layout
+    shard_dir = os.path.join(output_dir, SHARD_DIR_NAME)
+    os.makedirs(shard_dir, exist_ok=True)
+    for slug, items in shards.items():
+        rel = manifest['shards'][slug]['file']
+        if write_chunks(os.path.join(output_dir, rel), iter_json_array(items, compact)):
+            written.append(rel)
+
+    # Drop shards of categories that no longer have products
+    keep = {f'{slug}.json' for slug in shards}
+    for name in os.listdir(shard_dir):
+        if name.endswith('.json') and name not in keep:
+            os.remove(os.path.join(shard_dir, name))
+            written.append(f'{SHARD_DIR_NAME}/{name} (removed)')
+
+    if write_json(os.path.join(output_dir, MANIFEST_NAME), manifest, compact=True):
+        written.append(MANIFEST_NAME)
+    return written
@@ -0,0 +1,97 @@
+"""
+Sidecar file for generated and translated product descriptions.
+
+export_data.py rebuilds data/products.json from the sources, which used to
+throw away everything generate_descriptions.py and translate-descriptions.mjs
+had added. Their results now live in data/descriptions.json and the export
+merges them back in:
+
+    {"version": 1,
+     "generated":  {SKU: {"inputs": sha1, "description_lv": text}},
+     "translated": {SKU: {"source": sha1, "description_en": text}}}
+
+`inputs` hashes the fields a generated description is built from (see
+INPUT_FIELDS), so generate_descriptions.py only rebuilds products whose
+inputs changed; `source` is the SHA-1 of the description_lv a translation
+was made from, so translate-descriptions.mjs only translates changed
+descriptions. Entries whose hash no longer matches are ignored by the merge.
+SKU keys are normalize_sku() keys, as in export_state.json.
+"""
+
+import hashlib
+import json
+import os
+
+from catalog_output import write_json
+from sku_index import normalize_sku
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SIDECAR_PATH = os.path.join(PROJECT_DIR, 'data', 'descriptions.json')
+
+# Bump when build_description changes so every generated description is rebuilt
+GENERATOR_VERSION = 1
+INPUT_FIELDS = ('name_en', 'brand', 'categoryId', 'ean')
+MIN_DESCRIPTION_LENGTH = 10   # shorter source descriptions are replaced by generated ones
+
+
+def load(path=SIDECAR_PATH):
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            sidecar = json.load(f)
+        # Files written before normalize_sku() keyed nbsp spellings as-is
+        for section in ('generated', 'translated'):
+            sidecar[section] = {normalize_sku(sku): e for sku, e in sidecar[section].items()}
+        return sidecar
+    return {'version': 1, 'generated': {}, 'translated': {}}
+
+
+def save(sidecar, path=SIDECAR_PATH):
+    """Write the sidecar (sorted by SKU); returns True when the file changed."""
+    data = {
+        'version': 1,
+        'generated': dict(sorted(sidecar['generated'].items())),
+        'translated': dict(sorted(sidecar['translated'].items())),
+    }
+    return write_json(path, data)
+
+
+def text_sha1(text):
+    return hashlib.sha1((text or '').encode('utf-8')).hexdigest()
+
+
+def input_hash(product):
+    """Hash of the product fields a generated description depends on."""
+    inputs = [GENERATOR_VERSION] + [product.get(field) or '' for field in INPUT_FIELDS]
+    return text_sha1(json.dumps(inputs, ensure_ascii=False))
+
+
+def has_source_description(description):
+    return bool(description) and len(description.strip()) > MIN_DESCRIPTION_LENGTH
+
+
+def is_generated(product, sidecar):
+    """True when the product's description is (or should be) a generated one."""
+    if not has_source_description(product.get('description_lv')):
+        return True
+    entry = sidecar['generated'].get(normalize_sku(product['sku']))
+    return bool(entry) and entry['description_lv'] == product['description_lv']
+
+
+def apply(products, sidecar):
+    """Merge up-to-date sidecar descriptions into exported products (in place).
+
+    Returns (generated, translated) counts.
+    """
+    generated = translated = 0
+    for product in products:
+        sku = normalize_sku(product['sku'])
+        entry = sidecar['generated'].get(sku)
+        if (entry and entry['inputs'] == input_hash(product)
+                and not has_source_description(product.get('description_lv'))):
+            product['description_lv'] = entry['description_lv']
+            generated += 1
+        entry = sidecar['translated'].get(sku)
+        if entry and entry['source'] == text_sha1(product.get('description_lv')):
+            product['description_en'] = entry['description_en']
+            translated += 1
+    return generated, translated
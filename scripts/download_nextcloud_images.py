@@ -6,17 +6,29 @@ and downloads them into public/images/products/{SKU}/ for the Next.js webapp.
 
 Usage:
     python scripts/download_nextcloud_images.py
+    python scripts/download_nextcloud_images.py --workers 16 --rate 20
+    python scripts/download_nextcloud_images.py --recursive   # list via tree manifest
+    python scripts/download_nextcloud_images.py --recursive --delta --prune
+    python scripts/download_nextcloud_images.py --dedupe      # write into the image store
 """
 
+import argparse
 import os
 import sys
-import time
 import json
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.utils import formatdate
 from xml.etree import ElementTree as ET
-from urllib.parse import unquote, quote
+from urllib.parse import unquote, quote, urlparse
 from pathlib import Path
 
+import instrumentation
+from http_pool import PoliteClient, iter_body
+from image_store import ImageStore
+from progress_journal import ProgressJournal
+from sku_index import SkuIndex, normalize_sku
+
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8', errors='replace')
 
@@ -34,10 +46,16 @@ WEBDAV_BASE = f'{BASE_URL}/remote.php/dav/files/{NC_USER}/'
 SCRIPT_DIR = Path(__file__).resolve().parent
 PROJECT_DIR = SCRIPT_DIR.parent
 OUTPUT_DIR = PROJECT_DIR / 'public' / 'images' / 'products'
-PROGRESS_FILE = SCRIPT_DIR / 'image_download_progress.json'
+PROGRESS_FILE = SCRIPT_DIR / 'image_download_progress.jsonl'
+LEGACY_PROGRESS_FILE = SCRIPT_DIR / 'image_download_progress.json'
+MANIFEST_FILE = SCRIPT_DIR / 'nextcloud_manifest.json'
+SYNC_STATE_FILE = SCRIPT_DIR / 'image_sync_state.json'
 
-# Rate limiting
-DELAY = 0.1  # seconds between requests
+# Concurrency / politeness (per host; everything goes to BASE_URL)
+WORKERS = 8          # parallel SKU folders
+RATE = 10.0          # requests per second (token bucket, bursts up to this many)
+LIST_TIMEOUT = 120   # seconds per PROPFIND (a recursive listing can take a while)
+DOWNLOAD_TIMEOUT = 60
 
 # Brand image paths on Nextcloud (same as extract_catalog_from_nextcloud.py)
 BRAND_IMAGE_PATHS = [
@@ -54,81 +72,397 @@ BRAND_IMAGE_PATHS = [
 
 IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tiff', '.tif'}
 
-# Session
-session = requests.Session()
-session.auth = (LOGIN_USER, LOGIN_PASS)
-session.headers.update({
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)',
-})
+
+def _setup_session(session):
+    session.auth = (LOGIN_USER, LOGIN_PASS)
+    session.headers.update({
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)',
+    })
+
+
+# Shared by all worker threads: one keep-alive session per thread, per-host limits
+client = PoliteClient(per_host=WORKERS, rate=RATE, setup=_setup_session)
+
+# Content-addressed image store (set by --dedupe)
+store = None
 
 
 # ============================================================================
 # WEBDAV HELPERS
 # ============================================================================
 
-def list_folder(path):
-    """List contents of a Nextcloud folder via WebDAV PROPFIND."""
-    url = WEBDAV_BASE + quote(path, safe='/:@!$&\'()*+,;=')
+DAV_NS = '{DAV:}'
+OC_NS = '{http://owncloud.org/ns}'
+PROPFIND_BODY = (
+    '<?xml version="1.0" encoding="utf-8"?>'
+    '<d:propfind xmlns:d="DAV:" xmlns:oc="http://owncloud.org/ns"><d:prop>'
+    '<d:resourcetype/><d:getetag/><d:getcontentlength/><d:getlastmodified/>'
+    '<oc:checksums/>'
+    '</d:prop></d:propfind>'
+)
+
+
+def _checksum_sha1(text):
+    """SHA-1 from an oc:checksum value like 'SHA1:ab12.. MD5:.. ADLER32:..'."""
+    for part in (text or '').split():
+        algo, _, value = part.partition(':')
+        if algo.upper() == 'SHA1' and value:
+            return value.lower()
+    return None
+
+
+def _dav_url(path):
+    return WEBDAV_BASE + quote(path, safe='/:@!$&\'()*+,;=')
+
+
+def propfind(path, depth):
+    """PROPFIND `path` and return one entry per d:response, or None on failure.
+
+    The multistatus body is parsed incrementally with iterparse straight from
+    the socket, clearing each response element once read, so a recursive
+    listing of a whole brand tree never sits in memory as one XML document.
+    Entry: {'path': path relative to WEBDAV_BASE, 'is_dir', 'etag', 'size', 'mtime',
+    'sha1'}; sha1 is the server-side checksum when Nextcloud has one, else None.
+    """
+    base_path = unquote(urlparse(WEBDAV_BASE).path)
     try:
-        r = session.request('PROPFIND', url, headers={'Depth': '1'}, timeout=120)
-    except requests.RequestException as e:
+        with client.open('PROPFIND', _dav_url(path), data=PROPFIND_BODY.encode('utf-8'),
+                         headers={'Depth': depth, 'Content-Type': 'application/xml'},
+                         timeout=LIST_TIMEOUT, stream=True) as r:
+            if r.status_code != 207:
+                print(f'  WARNING: Got status {r.status_code} for {path} (Depth: {depth})')
+                return None
+            r.raw.decode_content = True
+            entries = []
+            for _, elem in ET.iterparse(r.raw, events=('end',)):
+                if elem.tag != DAV_NS + 'response':
+                    continue
+                href = unquote(elem.findtext(DAV_NS + 'href', ''))
+                restype = elem.find(f'.//{DAV_NS}resourcetype')
+                size = elem.findtext(f'.//{DAV_NS}getcontentlength')
+                entries.append({
+                    'path': href[len(base_path):] if href.startswith(base_path) else href,
+                    'is_dir': restype is not None and restype.find(DAV_NS + 'collection') is not None,
+                    'etag': elem.findtext(f'.//{DAV_NS}getetag'),
+                    'size': int(size) if size else None,
+                    'mtime': elem.findtext(f'.//{DAV_NS}getlastmodified'),
+                    'sha1': _checksum_sha1(elem.findtext(f'.//{OC_NS}checksum')),
+                })
+                elem.clear()
+            return entries
+    except (requests.RequestException, ET.ParseError) as e:
         print(f'  ERROR requesting {path}: {e}')
-        return []
+        return None
+
 
-    if r.status_code != 207:
-        print(f'  WARNING: Got status {r.status_code} for {path}')
+def list_folder(path):
+    """List contents of a Nextcloud folder via WebDAV PROPFIND."""
+    entries = propfind(path, '1')
+    if not entries:
         return []
+    # Skip first entry (self-reference)
+    return [(e['path'].rstrip('/').split('/')[-1], e['is_dir']) for e in entries[1:]]
+
+
+# ----------------------------------------------------------------------------
+# Recursive listing + remote tree manifest
+#
+# A brand tree is stored as {folder_rel: {'etag', 'dirs': [names],
+# 'files': {name: {'etag', 'size', 'mtime'}}}}, with '' for the brand root.
+# Nextcloud folder etags change whenever anything below them changes, so an
+# unchanged etag lets a whole subtree be taken from the manifest unlisted.
+# ----------------------------------------------------------------------------
+
+def _file_meta(entry):
+    return {'etag': entry['etag'], 'size': entry['size'], 'mtime': entry['mtime'],
+            'sha1': entry.get('sha1')}
+
+
+def _tree_from_entries(root, entries):
+    """Build the folder map from a flat (Depth: infinity) listing of `root`."""
+    folders = {}
+
+    def folder(rel):
+        return folders.setdefault(rel, {'etag': None, 'dirs': [], 'files': {}})
+
+    for e in entries:
+        rel = e['path'][len(root):].strip('/')
+        if e['is_dir']:
+            folder(rel)['etag'] = e['etag']
+        if not rel:
+            continue
+        parent, _, name = rel.rpartition('/')
+        if e['is_dir']:
+            folder(parent)['dirs'].append(name)
+        else:
+            folder(parent)['files'][name] = _file_meta(e)
+    return folders
+
+
+def _copy_subtree(previous, rel, into):
+    """Copy an unchanged folder and its descendants from the previous manifest."""
+    stack = [rel]
+    while stack:
+        key = stack.pop()
+        folder = previous.get(key)
+        if folder is None:
+            continue
+        into[key] = folder
+        stack.extend(f'{key}/{d}' if key else d for d in folder['dirs'])
+
+
+def list_tree(root, previous=None, pool=None):
+    """List every folder below `root`, reusing `previous` where etags match.
+
+    Costs one Depth: 0 request when the brand root is unchanged. Otherwise a
+    single Depth: infinity request is tried; servers that refuse it (the
+    Nextcloud default) are walked level by level with Depth: 1 requests,
+    skipping subfolders whose etag matches the manifest. Returns None if the
+    root or any changed subfolder cannot be listed: a partial tree must not
+    be saved as the manifest, where it would be reused while the root etag
+    stays the same.
+    """
+    previous = previous or {}
+    head = propfind(root, '0')
+    if not head:
+        return None
+    root_etag = head[0]['etag']
+    if root_etag and previous.get('', {}).get('etag') == root_etag:
+        return previous
+
+    entries = propfind(root, 'infinity')
+    if entries is not None:
+        return _tree_from_entries(root, entries)
+
+    folders = {}
+    level = ['']
+    map_fn = pool.map if pool else map
+    while level:
+        listings = list(map_fn(lambda rel: propfind(root + rel + ('/' if rel else ''), '1'), level))
+        next_level = []
+        for rel, entries in zip(level, listings):
+            if not entries:
+                print(f'  WARNING: could not list {root}{rel}, tree of {root} incomplete')
+                return None
+            folder = {'etag': entries[0]['etag'], 'dirs': [], 'files': {}}
+            folders[rel] = folder
+            for e in entries[1:]:
+                name = e['path'].rstrip('/').rsplit('/', 1)[-1]
+                if not e['is_dir']:
+                    folder['files'][name] = _file_meta(e)
+                    continue
+                folder['dirs'].append(name)
+                child = f'{rel}/{name}' if rel else name
+                if e['etag'] and previous.get(child, {}).get('etag') == e['etag']:
+                    _copy_subtree(previous, child, folders)
+                else:
+                    next_level.append(child)
+        level = next_level
+    return folders
 
-    ns = {'d': 'DAV:'}
-    root = ET.fromstring(r.text)
-    items = []
-    for resp in root.findall('d:response', ns):
-        href = resp.find('d:href', ns).text
-        restype = resp.find('.//d:resourcetype', ns)
-        is_dir = (restype is not None and
-                  restype.find('d:collection', ns) is not None)
-        name = unquote(href.rstrip('/').split('/')[-1])
-        items.append((name, is_dir))
 
-    # Skip first entry (self-reference)
-    return items[1:] if items else []
+def load_manifest():
+    if MANIFEST_FILE.exists():
+        with open(MANIFEST_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+
+def load_sync_state():
+    """Per-SKU record of downloaded files: {sku: {name: {'etag', 'size', 'mtime'}}}."""
+    if SYNC_STATE_FILE.exists():
+        with open(SYNC_STATE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+
+def save_sync_state(state):
+    with open(SYNC_STATE_FILE, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, separators=(',', ':'))
+
 
+def save_manifest(manifest):
+    with open(MANIFEST_FILE, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, separators=(',', ':'))
 
-def download_file(remote_path, local_path):
-    """Download a file from Nextcloud WebDAV."""
-    url = WEBDAV_BASE + quote(remote_path, safe='/:@!$&\'()*+,;=')
+
+def download_file(remote_path, local_path, etag=None, since=None):
+    """Download a file from Nextcloud WebDAV.
+
+    With `etag` (If-None-Match) or `since` (If-Modified-Since, epoch seconds)
+    the request is conditional and a 304 leaves the local file untouched.
+    The body goes to a .part file that replaces local_path only when complete.
+    Returns (status, etag) with status 'downloaded', 'unchanged' or 'error'.
+    """
+    url = _dav_url(remote_path)
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    elif since:
+        headers['If-Modified-Since'] = formatdate(since, usegmt=True)
+    tmp_path = local_path.with_name(local_path.name + '.part')
     try:
-        r = session.get(url, timeout=60, stream=True)
-        r.raise_for_status()
-        local_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(local_path, 'wb') as f:
-            for chunk in r.iter_content(chunk_size=8192):
-                f.write(chunk)
-        return True
+        with client.open('GET', url, headers=headers, timeout=DOWNLOAD_TIMEOUT, stream=True) as r:
+            if r.status_code == 304:
+                return 'unchanged', r.headers.get('ETag') or etag
+            r.raise_for_status()
+            local_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                for chunk in iter_body(r, 65536):
+                    f.write(chunk)
+            os.replace(tmp_path, local_path)
+            return 'downloaded', r.headers.get('ETag')
     except Exception as e:
         print(f'    ERROR downloading: {e}')
-        return False
+        tmp_path.unlink(missing_ok=True)
+        return 'error', None
 
 
 # ============================================================================
 # MAIN
 # ============================================================================
 
-def load_progress():
-    """Load download progress from file."""
-    if PROGRESS_FILE.exists():
-        with open(PROGRESS_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {'completed_skus': [], 'stats': {'downloaded': 0, 'skipped': 0, 'errors': 0}}
-
+def open_progress():
+    """Progress journal of completed SKUs (adopts the old JSON progress file)."""
+    return ProgressJournal(PROGRESS_FILE,
+                           stats={'downloaded': 0, 'skipped': 0, 'errors': 0, 'pruned': 0,
+                                  'deduplicated': 0},
+                           legacy_path=LEGACY_PROGRESS_FILE, legacy_key='completed_skus')
+
+
+def is_image(name):
+    return os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+
+
+def _same_version(record, meta):
+    """True when the recorded download still matches the remote file."""
+    if record.get('etag') and meta.get('etag'):
+        return record['etag'] == meta['etag']
+    return (record.get('size'), record.get('mtime')) == (meta.get('size'), meta.get('mtime'))
+
+
+def sync_sku(sku, product_path, files=None, known=None, prune=False):
+    """Bring one product folder up to date (runs in a worker thread).
+
+    `files` maps remote names to {'etag', 'size', 'mtime'}; the folder is
+    listed first when it is None (i.e. not known from the tree manifest).
+
+    Without `known` only missing files are fetched. With `known` (delta sync:
+    name -> metadata recorded at download time) a file is also re-fetched,
+    conditionally, when its remote etag/size/mtime changed, and with `prune`
+    recorded files that disappeared remotely are deleted locally.
+
+    With the image store enabled (--dedupe), files go into the store instead
+    of the SKU folder, and a file whose content the store already holds
+    (matched by server checksum or etag) is linked instead of downloaded.
+
+    Returns a dict with sku, listed, images, downloaded, skipped, errors,
+    pruned, deduplicated and records (name -> new metadata, or None when the
+    record should be dropped). When the folder cannot be listed, listed is
+    False, errors is 1 and nothing is downloaded or pruned.
+    """
+    result = {'sku': sku, 'listed': True, 'images': 0, 'downloaded': 0, 'skipped': 0,
+              'errors': 0, 'pruned': 0, 'deduplicated': 0, 'records': {}}
+    if files is None:
+        entries = propfind(product_path, '1')
+        if entries is None:
+            # An unreadable folder is not an empty one: never prune against it
+            result.update(listed=False, errors=1)
+            return result
+        files = {e['path'].rstrip('/').rsplit('/', 1)[-1]: _file_meta(e)
+                 for e in entries[1:] if not e['is_dir']}
+    files = {name: meta for name, meta in files.items() if is_image(name)}
+    result['images'] = len(files)
+
+    sku_dir = OUTPUT_DIR / sku
+    if files and store is None:
+        sku_dir.mkdir(parents=True, exist_ok=True)
+
+    for name, meta in files.items():
+        local_file = sku_dir / name
+        in_folder = local_file.exists()
+        exists = in_folder or (store is not None and store.has(sku, name))
+        record = known.get(name) if known is not None else None
+        if exists and (known is None or (record and _same_version(record, meta))):
+            result['skipped'] += 1
+            continue
+
+        etag_key = meta.get('etag') and f'nextcloud:{meta["etag"]}'
+        if store is not None:
+            sha1 = meta.get('sha1') if store.has_blob(meta.get('sha1')) else store.known(etag_key)
+            if sha1:
+                store.link(sku, name, sha1, [etag_key])
+                result['deduplicated'] += 1
+                if known is not None:
+                    result['records'][name] = meta
+                continue
 
-def save_progress(progress):
-    """Save download progress to file."""
-    with open(PROGRESS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(progress, f, ensure_ascii=False, indent=2)
+        # Recorded copy: revalidate by etag. Unrecorded copy (downloaded
+        # before delta sync existed): ask whether it changed since we wrote it.
+        target = store.staging_path(name) if store is not None else local_file
+        status, etag = download_file(
+            product_path + name, target,
+            etag=record.get('etag') if exists and record else None,
+            since=local_file.stat().st_mtime if in_folder and known is not None and not record else None,
+        )
+
+        if status == 'error':
+            result['errors'] += 1
+            continue
+        result['downloaded' if status == 'downloaded' else 'skipped'] += 1
+        if status == 'downloaded' and store is not None:
+            store.add_file(sku, name, target, [etag and f'nextcloud:{etag}', etag_key])
+        if known is not None:
+            result['records'][name] = dict(meta, etag=meta['etag'] or etag)
+
+    if known is not None and prune:
+        for name in known:
+            if name not in files:
+                (sku_dir / name).unlink(missing_ok=True)
+                if store is not None:
+                    store.remove(sku, name)
+                result['records'][name] = None
+                result['pruned'] += 1
+    return result
 
 
 def main():
+    parser = argparse.ArgumentParser(description='Download product images from Nextcloud.')
+    parser.add_argument('--workers', type=int, default=WORKERS,
+                        help=f'concurrent SKU folders / requests per host (default {WORKERS})')
+    parser.add_argument('--rate', type=float, default=RATE,
+                        help=f'max requests per second, 0 = unlimited (default {RATE})')
+    parser.add_argument('--recursive', action='store_true',
+                        help='list each brand tree in one recursive PROPFIND and keep a local '
+                             'manifest so unchanged folders are not listed again')
+    parser.add_argument('--delta', action='store_true',
+                        help='re-check every SKU and re-download files whose remote etag/size/'
+                             'mtime changed (instead of skipping completed SKUs forever)')
+    parser.add_argument('--prune', action='store_true',
+                        help='with --delta, delete local files that were removed on Nextcloud')
+    parser.add_argument('--dedupe', action='store_true',
+                        help='store images once per content hash in public/images/blobs/ '
+                             '(see image_store.py) and skip downloads of already stored content')
+    parser.add_argument('--webdav-base', default=None,
+                        help='override the WebDAV root URL (e.g. a local test server)')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.prune and not args.delta:
+        parser.error('--prune requires --delta')
+
+    global WEBDAV_BASE, store
+    if args.dedupe:
+        store = ImageStore()
+    if args.webdav_base:
+        WEBDAV_BASE = args.webdav_base.rstrip('/') + '/'
+    client.configure(per_host=args.workers, rate=args.rate)
+
+    with instrumentation.run('download_nextcloud_images', args):
+        download(args)
+
+
+def download(args):
     print("=" * 60)
     print("  Nextcloud Product Image Downloader")
     print("=" * 60)
@@ -136,109 +470,136 @@ def main():
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
     # Load progress
-    progress = load_progress()
-    completed = set(progress['completed_skus'])
-    stats = progress['stats']
+    progress = open_progress()
+    completed = progress.completed
+    stats = progress.stats
+    sync_state = load_sync_state() if args.delta else None
 
     print(f"Previously completed: {len(completed)} SKUs")
-    print(f"Output: {OUTPUT_DIR}\n")
+    print(f"Output: {OUTPUT_DIR}")
+    print(f"Workers: {args.workers}, rate limit: {args.rate or 'none'} req/s\n")
 
-    # Load catalog product SKUs for matching
+    # Load catalog product SKUs for matching (any spelling: nbsp, multi-SKU folders)
     products_json = PROJECT_DIR / 'data' / 'products.json'
     if products_json.exists():
         with open(products_json, 'r', encoding='utf-8') as f:
             catalog_products = json.load(f)
-        catalog_skus = {p['sku'].strip().upper() for p in catalog_products}
+        catalog_skus = SkuIndex(p['sku'] for p in catalog_products)
         print(f"Catalog products: {len(catalog_skus)}")
     else:
         catalog_skus = None
         print("WARNING: No products.json found, downloading ALL images")
 
-    # Crawl each brand's image folder
-    total_brands = len(BRAND_IMAGE_PATHS)
-    for brand_idx, (brand_name, images_path) in enumerate(BRAND_IMAGE_PATHS):
-        print(f"\n[{brand_idx+1}/{total_brands}] {brand_name}")
-        print(f"  Path: {images_path}")
-
-        items = list_folder(images_path)
-        product_folders = [(name, is_dir) for name, is_dir in items if is_dir]
-        print(f"  Found {len(product_folders)} product folders")
-
-        for i, (folder_name, _) in enumerate(product_folders):
-            sku = folder_name.strip()
-            sku_upper = sku.upper()
-
-            # Skip if already done
-            if sku_upper in completed:
-                continue
-
-            # Skip if not in our catalog (optional)
-            if catalog_skus and sku_upper not in catalog_skus:
-                continue
-
-            # List images in this product folder
-            product_path = images_path + folder_name + '/'
-            image_items = list_folder(product_path)
-            image_files = []
-            for name, is_dir in image_items:
-                if not is_dir:
-                    ext = os.path.splitext(name)[1].lower()
-                    if ext in IMAGE_EXTENSIONS:
-                        image_files.append(name)
-
-            if not image_files:
-                completed.add(sku_upper)
-                continue
-
-            # Download each image
-            sku_dir = OUTPUT_DIR / sku
-            sku_dir.mkdir(parents=True, exist_ok=True)
-
-            downloaded_any = False
-            for img_name in image_files:
-                local_file = sku_dir / img_name
-                if local_file.exists():
-                    stats['skipped'] += 1
+    def save():
+        if sync_state is not None:
+            save_sync_state(sync_state)
+        if store is not None:
+            store.save()
+
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        with instrumentation.stage('list'):
+            if args.recursive:
+                # One tree per brand, diffed against the manifest from the last run
+                manifest = load_manifest()
+                trees = {}
+                for _, images_path in BRAND_IMAGE_PATHS:
+                    tree = list_tree(images_path, manifest.get(images_path), pool)
+                    if tree is not None:
+                        manifest[images_path] = trees[images_path] = tree
+                save_manifest(manifest)
+                # Brands without a complete tree fall back to listing each SKU folder
+                listings = [[(name, True) for name in trees[path]['']['dirs']] if path in trees
+                            else list_folder(path)
+                            for _, path in BRAND_IMAGE_PATHS]
+                print(f"Listed {len(trees)} brand trees with {client.requests_made} requests")
+            else:
+                # List all brand roots concurrently
+                trees = {}
+                listings = list(pool.map(lambda brand: list_folder(brand[1]), BRAND_IMAGE_PATHS))
+
+        with instrumentation.stage('sync'):
+            # Queue every SKU folder of every brand; a SKU found under two brands is fetched once
+            futures = {}
+            scheduled = set()
+            total_brands = len(BRAND_IMAGE_PATHS)
+            for brand_idx, ((brand_name, images_path), items) in enumerate(zip(BRAND_IMAGE_PATHS, listings)):
+                product_folders = [name for name, is_dir in items if is_dir]
+                print(f"[{brand_idx+1}/{total_brands}] {brand_name}: {len(product_folders)} product folders")
+
+                for folder_name in product_folders:
+                    sku = folder_name.strip()
+                    sku_upper = normalize_sku(sku)
+                    if sku_upper in scheduled or (sku_upper in completed and not args.delta):
+                        continue
+                    # Skip if not in our catalog (optional)
+                    if catalog_skus and sku_upper not in catalog_skus:
+                        continue
+                    scheduled.add(sku_upper)
+                    product_path = images_path + folder_name + '/'
+                    files = None
+                    if images_path in trees and folder_name in trees[images_path]:
+                        files = trees[images_path][folder_name]['files']
+                    known = sync_state.get(sku, {}) if args.delta else None
+                    futures[pool.submit(sync_sku, sku, product_path, files, known, args.prune)] = sku_upper
+
+            print(f"\nSyncing {len(futures)} SKU folders...")
+            unlisted = 0
+            for i, future in enumerate(as_completed(futures), 1):
+                res = future.result()
+                if not res['listed']:
+                    # Left out of the journal so the next run tries again; records kept
+                    print(f"  [{i}/{len(futures)}] {res['sku']}: folder listing failed, skipped")
+                    unlisted += 1
+                    instrumentation.count('images.errors', res['errors'])
                     continue
-
-                remote_path = product_path + img_name
-                if download_file(remote_path, local_file):
-                    stats['downloaded'] += 1
-                    downloaded_any = True
-                else:
-                    stats['errors'] += 1
-
-                time.sleep(DELAY)
-
-            status = f"  [{i+1}/{len(product_folders)}] {sku}: {len(image_files)} images"
-            if downloaded_any:
-                print(status)
-
-            completed.add(sku_upper)
-
-            # Save progress periodically
-            if len(completed) % 50 == 0:
-                progress['completed_skus'] = list(completed)
-                progress['stats'] = stats
-                save_progress(progress)
-
-        # Save after each brand
-        progress['completed_skus'] = list(completed)
-        progress['stats'] = stats
-        save_progress(progress)
+                if res['downloaded'] or res['pruned']:
+                    print(f"  [{i}/{len(futures)}] {res['sku']}: {res['images']} images "
+                          f"({res['downloaded']} new/updated, {res['pruned']} pruned)")
+                if sync_state is not None:
+                    records = sync_state.setdefault(res['sku'], {})
+                    for name, meta in res['records'].items():
+                        if meta is None:
+                            records.pop(name, None)
+                        else:
+                            records[name] = meta
+
+                counts = {key: res[key] for key in
+                          ('downloaded', 'skipped', 'errors', 'pruned', 'deduplicated')}
+                progress.mark_done(futures[future], **counts)
+                for key, n in counts.items():
+                    instrumentation.count(f'images.{key}', n)
+
+                # Save sync state periodically
+                if i % 50 == 0:
+                    save()
+
+    save()
+    progress.close()
 
     # Final summary
     print("\n" + "=" * 60)
     print("  DOWNLOAD COMPLETE")
     print("=" * 60)
     print(f"  Downloaded: {stats['downloaded']} images")
-    print(f"  Skipped (exists): {stats['skipped']}")
+    print(f"  Skipped (exists / unchanged): {stats['skipped']}")
+    if args.delta:
+        print(f"  Pruned: {stats['pruned']}")
+    if store is not None:
+        print(f"  Linked to identical stored images (not downloaded): {stats['deduplicated']}")
+        print(f"  Duplicates dropped after download: {store.stats['deduplicated']}")
     print(f"  Errors: {stats['errors']}")
+    if unlisted:
+        print(f"  Folders that could not be listed (retried next run): {unlisted}")
+    print(f"  HTTP requests this run: {client.requests_made}")
 
     # Count SKUs with images
     sku_dirs = [d for d in OUTPUT_DIR.iterdir() if d.is_dir()]
     total_images = sum(len(list(d.glob('*'))) for d in sku_dirs)
     print(f"  Total: {len(sku_dirs)} SKUs, {total_images} image files")
+    if store is not None:
+        blobs = store.manifest['blobs']
+        print(f"  Store: {len(store.manifest['skus'])} SKUs, {len(blobs)} distinct images "
+              f"({sum(b['size'] for b in blobs.values()) / 1024 / 1024:.1f} MB)")
 
 
 if __name__ == '__main__':
@@ -10,14 +10,43 @@ Sources:
 Outputs:
 - data/categories.json
 - data/products.json
+- data/products/<category-slug>.json + data/products-manifest.json (per-category shards)
+- data/search-index.json (trigram index used by searchProducts)
+- data/changes.json (products added/removed/changed since the previous export;
+  history and price changes in scripts/catalog_history.db)
+
+Generated and translated descriptions from data/descriptions.json (written by
+generate_descriptions.py and translate-descriptions.mjs) are merged into the
+products whose inputs still match.
+
+Usage:
+    python scripts/export_data.py
+    python scripts/export_data.py --incremental   # reuse scripts/export_state.json
+    python scripts/export_data.py --compact       # unindented JSON, one product per line
 """
 
-import sqlite3
+import argparse
+import hashlib
 import json
+import multiprocessing
 import os
 import sys
 import re
-import openpyxl
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import groupby
+from operator import attrgetter
+
+import catalog_db
+import catalog_history
+import description_sidecar
+import instrumentation
+import image_store
+import image_variants
+from catalog_output import MANIFEST_NAME, write_json, write_products
+from search_index import SEARCH_INDEX_NAME, build_search_index
+from sku_index import AliasMap, SkuIndex
+from stream_join import Record, merge_join
+from xlsx_snapshot import read_sheet
 
 sys.stdout.reconfigure(encoding='utf-8', errors='replace')
 
@@ -30,6 +59,7 @@ PRICELIST_PATH = os.path.join(DATA_DIR, 'LAB20 CATALOGUE PRICELIST cenu analīze
 NEXTCLOUD_PATH = os.path.join(DATA_DIR, 'laborpro_nextcloud_catalog.xlsx')
 OUTPUT_DIR = os.path.join(BASE_DIR, 'data')
 LOCAL_IMAGES_DIR = os.path.join(BASE_DIR, 'public', 'images', 'products')
+STATE_PATH = os.path.join(BASE_DIR, 'scripts', 'export_state.json')
 
 # Chapter (pricelist) -> our category number mapping
 CHAPTER_TO_CATEGORY = {
@@ -140,74 +170,70 @@ SKU_CATEGORY_OVERRIDES = {
     'G003': 11,
 }
 
+# Override lookups by any spelling: nbsp/whitespace variants and single codes of multi-SKU keys
+CATEGORY_OVERRIDES = AliasMap(SKU_CATEGORY_OVERRIDES)
+
 
 def load_categories_from_db():
     """Load all 22 categories from the database."""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('SELECT id, name_en, name_lv, slug, sort_order FROM categories ORDER BY sort_order')
     categories = {}
-    for row in c.fetchall():
-        categories[row[0]] = {
-            'id': row[0],
-            'number': f'{row[4]:02d}',
-            'name_en': row[1],
-            'name_lv': row[2],
-            'slug': row[3],
+    for row in catalog_db.fetch_categories(catalog_db.connect(DB_PATH)):
+        categories[row['id']] = {
+            'id': row['id'],
+            'number': f"{row['sort_order']:02d}",
+            'name_en': row['name_en'],
+            'name_lv': row['name_lv'],
+            'slug': row['slug'],
             'productCount': 0,
         }
-    conn.close()
     return categories
 
 
+class DbProduct(Record):
+    __slots__ = ('key', 'sku', 'name_lv', 'description_lv', 'price_db', 'category_id', 'images')
+
+
+class PricelistRow(Record):
+    __slots__ = ('key', 'sku', 'name_lv', 'name_en', 'price', 'ean', 'chapter', 'category_id')
+
+
+class Product(Record):
+    """One exported product; becomes a dict only when the list is serialized."""
+    __slots__ = ('id', 'sku', 'name_lv', 'name_en', 'description_lv', 'price',
+                 'categoryId', 'categorySlug', 'brand', 'ean', 'images')
+
+
 def load_db_products():
-    """Load products from SQLite with their images."""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-
-    # Get products
-    c.execute('''
-        SELECT p.id, p.sku, p.name_lv, p.description_lv, p.price, p.category_id
-        FROM products p
-        ORDER BY p.sku
-    ''')
-    products = {}
-    for row in c.fetchall():
-        sku = row[1]
-        if sku:
-            products[sku.strip().upper()] = {
-                'sku': row[1],
-                'name_lv': row[2],
-                'description_lv': row[3],
-                'price_db': row[4],
-                'category_id': row[5],
-            }
-
-    # Get images
-    c.execute('''
-        SELECT p.sku, pi.image_url, pi.sort_order
-        FROM product_images pi
-        JOIN products p ON pi.product_id = p.id
-        ORDER BY p.sku, pi.sort_order
-    ''')
-    for row in c.fetchall():
-        sku = row[0].strip().upper() if row[0] else None
-        if sku and sku in products:
-            if 'images' not in products[sku]:
-                products[sku]['images'] = []
-            products[sku]['images'].append(row[1])
-
-    conn.close()
+    """Load products from SQLite with their images (one joined, ordered pass).
+
+    Returns DbProduct records sorted by SKU key. Rows sharing a normalized SKU
+    are collapsed into one: their images are pooled, later fields win.
+    """
+    rows = []
+    for row, images in catalog_db.iter_products(catalog_db.connect(DB_PATH)):
+        key = catalog_db.sku_key(row['sku'])
+        if key:
+            rows.append(DbProduct(key, row['sku'], row['name_lv'], row['description_lv'],
+                                  row['price'], row['category_id'], tuple(images)))
+    rows.sort(key=attrgetter('key'))  # stable: duplicates keep DB order
+    products = []
+    for _, group in groupby(rows, key=attrgetter('key')):
+        group = list(group)
+        product = group[-1]
+        if len(group) > 1:
+            product.images = tuple(img for row in group for img in row.images)
+        products.append(product)
     return products
 
 
 def load_pricelist():
-    """Load products from the pricelist Excel."""
-    wb = openpyxl.load_workbook(PRICELIST_PATH, read_only=True, data_only=True)
-    ws = wb['Verifica']
+    """Load products from the pricelist Excel (via the cached sheet snapshot).
 
+    Returns PricelistRow records sorted by SKU key; rows of a repeated SKU
+    keep their sheet order.
+    """
     products = []
-    for row in ws.iter_rows(min_row=2, max_col=14, values_only=True):
+    for row in read_sheet(PRICELIST_PATH, 'Verifica', max_col=14):
         sku = row[0]
         if not sku:
             continue
@@ -222,48 +248,128 @@ def load_pricelist():
         # Map chapter to our category
         category_id = CHAPTER_TO_CATEGORY.get(chapter) if chapter else None
 
-        products.append({
-            'sku': sku,
-            'name_lv_pricelist': name_lv,
-            'name_en': name_en,
-            'price': float(price) if price else None,
-            'ean': ean,
-            'chapter': chapter,
-            'category_id': category_id,
-        })
-
-    wb.close()
+        products.append(PricelistRow(catalog_db.sku_key(sku), sku, name_lv, name_en,
+                                     float(price) if price else None, ean, chapter, category_id))
+
+    products.sort(key=attrgetter('key'))
     return products
 
 
 def load_nextcloud_brands():
-    """Load brand info from nextcloud catalog."""
-    wb = openpyxl.load_workbook(NEXTCLOUD_PATH, read_only=True, data_only=True)
-    ws = wb['Catalog']
-
+    """Load brand info from nextcloud catalog (via the cached sheet snapshot)."""
     brands = {}
-    for row in ws.iter_rows(min_row=2, max_col=2, values_only=True):
+    for row in read_sheet(NEXTCLOUD_PATH, 'Catalog', max_col=2):
         sku = row[0]
         brand = row[1]
         if sku and brand:
-            brands[str(sku).strip().upper()] = str(brand).strip()
+            brands[catalog_db.sku_key(str(sku))] = str(brand).strip()
 
-    wb.close()
     return brands
 
 
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp'}
+
+
+def _list_sku_images(sku, sku_dir):
+    """Web paths of the image files in one SKU folder, sorted by filename."""
+    with os.scandir(sku_dir) as it:
+        names = sorted(e.name for e in it
+                       if os.path.splitext(e.name)[1].lower() in IMAGE_EXTENSIONS)
+    return [f'/images/products/{sku}/{f}' for f in names]
+
+
+def with_store_images(sku, folder_images, store_manifest):
+    """Combine a SKU folder listing with the SKU's images in the image store.
+
+    Store entries win over a folder file of the same name; the result stays
+    sorted by filename. Blobs the site cannot show (.bmp, .tiff) are left out,
+    as they are for folder files.
+    """
+    stored = {name: path for name, path in image_store.sku_images(store_manifest, sku).items()
+              if os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS}
+    if not stored:
+        return folder_images
+    by_name = {path.rsplit('/', 1)[1]: path for path in folder_images}
+    by_name.update(stored)
+    return [by_name[name] for name in sorted(by_name)]
+
+
+_store_manifest = None
+
+
 def get_local_images(sku):
-    """Find local images for a product SKU in public/images/products/{SKU}/."""
+    """Find local images for a product SKU in the image store and public/images/products/{SKU}/."""
+    global _store_manifest
+    if _store_manifest is None:
+        _store_manifest = image_store.load_manifest()
     sku_dir = os.path.join(LOCAL_IMAGES_DIR, sku)
-    if not os.path.isdir(sku_dir):
-        return []
-    image_exts = {'.jpg', '.jpeg', '.png', '.gif', '.webp'}
-    images = []
-    for f in sorted(os.listdir(sku_dir)):
-        ext = os.path.splitext(f)[1].lower()
-        if ext in image_exts:
-            images.append(f'/images/products/{sku}/{f}')
-    return images
+    images = _list_sku_images(sku, sku_dir) if os.path.isdir(sku_dir) else []
+    return with_store_images(sku, images, _store_manifest)
+
+
+def attach_image_variants(products, variants_manifest):
+    """Add `imageVariants` (aligned with `images`) to products with rendered variants.
+
+    Each entry is {'width', 'height', 'thumb': {'src', 'width', 'height'},
+    'list': {...}, 'detail': {...}} for an original processed by
+    image_variants.py, or None. Products without any variant get no key.
+    """
+    entries = variants_manifest['images']
+    for p in products:
+        found = [entries.get(img) for img in p['images']]
+        if not any(found):
+            continue
+        p['imageVariants'] = [
+            dict({'width': e['width'], 'height': e['height']},
+                 **{name: {'src': v['src'], 'width': v['width'], 'height': v['height']}
+                    for name, v in e['variants'].items()})
+            if e else None
+            for e in found
+        ]
+
+
+def scan_local_images(previous=None):
+    """Index every SKU folder under public/images/products in a single walk.
+
+    Returns {sku_folder: {'mtime': ns, 'images': [...]}}. Folders whose mtime
+    matches their entry in `previous` keep the cached listing and are not
+    rescanned, so only new or modified folders cost a directory read.
+    """
+    previous = previous or {}
+    index = {}
+    if not os.path.isdir(LOCAL_IMAGES_DIR):
+        return index
+    with os.scandir(LOCAL_IMAGES_DIR) as it:
+        for entry in it:
+            if not entry.is_dir():
+                continue
+            mtime = entry.stat().st_mtime_ns
+            cached = previous.get(entry.name)
+            if cached and cached['mtime'] == mtime:
+                index[entry.name] = cached
+            else:
+                index[entry.name] = {'mtime': mtime,
+                                     'images': _list_sku_images(entry.name, entry.path)}
+    return index
+
+
+def image_lookup(image_index, store_manifest):
+    """Return images_for(sku) over a scan_local_images() index and the store manifest.
+
+    SKU folders and store entries are found by any spelling of the product
+    SKU (see sku_index.SkuIndex); store images are merged in through
+    with_store_images().
+    """
+    image_skus = SkuIndex()
+    for folder in (*image_index, *store_manifest['skus']):
+        image_skus.add(folder, canonical=folder)
+
+    def images_for(sku):
+        folder = image_skus.resolve(sku) or sku
+        entry = image_index.get(folder)
+        return with_store_images(folder, entry['images'] if entry else [], store_manifest)
+
+    return images_for
 
 
 def slugify(text):
@@ -275,124 +381,379 @@ def slugify(text):
     return text.strip('-')
 
 
-def main():
-    print("Loading data sources...")
+# ============================================================================
+# INCREMENTAL EXPORT
+# ============================================================================
+
+def file_fingerprint(path, previous=None):
+    """Content fingerprint of a source file.
+
+    The file is only re-hashed when its size or mtime moved since `previous`,
+    so an untouched workbook costs a single stat() call.
+    """
+    st = os.stat(path)
+    stamp = [st.st_size, st.st_mtime_ns]
+    if previous and previous.get('stamp') == stamp:
+        return previous
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return {'stamp': stamp, 'sha1': h.hexdigest()}
+
+
+def source_fingerprints(previous):
+    """Fingerprint every export input, including this script (mappings live here)."""
+    sources = {
+        'db': DB_PATH,
+        'pricelist': PRICELIST_PATH,
+        'nextcloud': NEXTCLOUD_PATH,
+        'script': os.path.abspath(__file__),
+    }
+    if os.path.exists(image_store.MANIFEST_PATH):
+        sources['image_store'] = str(image_store.MANIFEST_PATH)
+    if os.path.exists(image_variants.MANIFEST_PATH):
+        sources['image_variants'] = str(image_variants.MANIFEST_PATH)
+    if os.path.exists(description_sidecar.SIDECAR_PATH):
+        sources['descriptions'] = description_sidecar.SIDECAR_PATH
+    return {name: file_fingerprint(path, previous.get(name)) for name, path in sources.items()}
+
+
+def load_state():
+    """Load fingerprints and per-record digests from the previous export."""
+    if os.path.exists(STATE_PATH):
+        with open(STATE_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {'sources': {}, 'image_index': {}, 'records': {}}
+
+
+def save_state(state):
+    with open(STATE_PATH, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, separators=(',', ':'))
+
+
+def outputs_present():
+    """True when every file the export writes is in OUTPUT_DIR (shards as listed in the manifest)."""
+    names = ['categories.json', 'products.json', MANIFEST_NAME, SEARCH_INDEX_NAME,
+             catalog_history.CHANGES_NAME]
+    if not all(os.path.exists(os.path.join(OUTPUT_DIR, name)) for name in names):
+        return False
+    with open(os.path.join(OUTPUT_DIR, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+        shards = json.load(f)['shards']
+    return all(os.path.exists(os.path.join(OUTPUT_DIR, shard['file'])) for shard in shards.values())
+
+
+def record_digest(*parts):
+    """Stable digest of the inputs that feed one merged record."""
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+# ============================================================================
+# MERGE
+# ============================================================================
+
+def merge_products(categories, db_products, pricelist_products, brands,
+                   images_for=get_local_images, previous_records=None):
+    """Merge DB, pricelist and brand data into the sorted product list.
+
+    `db_products` and `pricelist_products` are the key-sorted records of
+    load_db_products() / load_pricelist(); they are joined in one sort-merge
+    pass and carried as Product records until the final list is built.
+
+    SKUs are matched through SkuIndex aliases, so a pricelist SKU also finds
+    the DB record and brand of a differently spaced or multi-SKU spelling
+    ('B348' -> 'B348 B349 B350 B351'); a DB record matched that way is not
+    exported again on its own. Of a SKU repeated in the pricelist, the last
+    row that yields a product wins.
+
+    With `previous_records` (sku_key -> {'digest', 'record'}) a record whose
+    inputs hash to the same digest is reused instead of being rebuilt.
+    Returns (products_list, records) where `records` is the new digest map
+    (only built when `previous_records` is given).
+    """
+    db_index = SkuIndex(db.key for db in db_products)
+    brand_map = AliasMap(brands)
+    rebuilt = 0
+
+    def reuse(key, digest):
+        cached = previous_records.get(key) if previous_records else None
+        if cached and cached['digest'] == digest:
+            return Product.from_dict(cached['record'])
+        return None
+
+    def from_pricelist(pl, db):
+        nonlocal rebuilt
+        # Determine category: override > pricelist mapping > DB
+        category_id = CATEGORY_OVERRIDES.get(pl.key) or pl.category_id or (db and db.category_id)
+        if not category_id:
+            return None  # Skip products without a category
+        category_slug = categories[category_id]['slug'] if category_id in categories else ''
+        brand = brand_map.get(pl.key)
 
-    # Load all sources
-    categories = load_categories_from_db()
-    db_products = load_db_products()
-    pricelist_products = load_pricelist()
-    brands = load_nextcloud_brands()
+        # Prefer local Nextcloud images, fallback to scraped remote URLs
+        local_imgs = images_for(pl.sku)
+
+        digest = record_digest('pl', pl.values(), db and db.values(), brand, local_imgs, category_slug)
+        product = reuse(pl.key, digest)
+        if product is None:
+            rebuilt += 1
+            product = Product(
+                id=0,
+                sku=pl.sku,
+                # Determine best name_lv: prefer DB, then pricelist
+                name_lv=(db and db.name_lv) or pl.name_lv or pl.name_en,
+                name_en=pl.name_en,
+                description_lv=db.description_lv if db else '',
+                # Price: prefer pricelist, fallback DB
+                price=pl.price or (db.price_db if db else None),
+                categoryId=category_id,
+                categorySlug=category_slug,
+                brand=brand or '',
+                ean=pl.ean,
+                images=local_imgs if local_imgs else list(db.images if db else ()),
+            )
+        return pl.key, digest, product
+
+    def from_db(db):
+        nonlocal rebuilt
+        category_id = CATEGORY_OVERRIDES.get(db.key) or db.category_id
+        if not category_id or category_id not in categories:
+            return None
+
+        brand = brand_map.get(db.key)
+        category_slug = categories[category_id]['slug']
+        local_imgs = images_for(db.sku)
+
+        digest = record_digest('db', db.values(), brand, local_imgs, category_slug)
+        product = reuse(db.key, digest)
+        if product is None:
+            rebuilt += 1
+            product = Product(
+                id=0,
+                sku=db.sku,
+                name_lv=db.name_lv,
+                name_en='',
+                description_lv=db.description_lv,
+                price=db.price_db,
+                categoryId=category_id,
+                categorySlug=category_slug,
+                brand=brand or '',
+                ean='',
+                images=local_imgs if local_imgs else list(db.images),
+            )
+        return db.key, digest, product
+
+    def joined():
+        """(key, digest, Product) per exported SKU, in one pass over both sources."""
+        # Pricelist rows join on the DB record they resolve to (almost always their
+        # own key, so re-sorting the key-sorted list is close to linear)
+        def join_key(pl):
+            return db_index.resolve(pl.key) or pl.key
+
+        pricelist = sorted(pricelist_products, key=join_key)
+        for _, dbs, pls in merge_join(db_products, pricelist, key=attrgetter('key'), right_key=join_key):
+            db = dbs[-1] if dbs else None
+            produced = False
+            for _, rows in groupby(pls, key=attrgetter('key')):
+                for pl in reversed(list(rows)):
+                    merged = from_pricelist(pl, db)
+                    if merged:
+                        produced = True
+                        yield merged
+                        break
+            # DB-only products (e.g., Disposable Items category 11)
+            if db and not produced:
+                merged = from_db(db)
+                if merged:
+                    yield merged
+
+    merged = sorted(joined(), key=lambda m: (m[2].categoryId, m[2].sku))
+    instrumentation.count('records.rebuilt', rebuilt)
+    if previous_records:
+        print(f"  Records rebuilt: {rebuilt}/{len(merged)}")
+
+    # Records reach dicts here; sequential IDs follow the (category, SKU) order
+    # (cached records keep id 0 so digests stay position-free)
+    products_list = [product.to_dict(id=i) for i, (_, _, product) in enumerate(merged, 1)]
+    records = {}
+    if previous_records is not None:
+        records = {key: {'digest': digest, 'record': product.to_dict()} for key, digest, product in merged}
+    return products_list, records
+
+
+def _timed(name, fn, parent=None):
+    """Call fn inside an instrumentation stage (nested under `parent` in pool threads)."""
+    with instrumentation.stage(name, parent):
+        return fn()
+
+
+def load_db_sources():
+    """Categories and products from products.db over one shared read-only connection."""
+    return load_categories_from_db(), load_db_products()
+
+
+def load_sources(serial=False, image_index=None):
+    """Load every export source, concurrently unless `serial` is set.
+
+    The two openpyxl parses are CPU-bound and run in a process pool; the
+    SQLite reads (one thread, sharing one connection) and the image walk are
+    I/O-bound and run in threads, so the total is bounded by the slowest
+    source rather than their sum. An already built `image_index` is reused
+    instead of walking the tree again. The workers are spawned rather than
+    forked: build_catalog.py calls this from a pool thread while other
+    threads hold the stdout and instrumentation locks.
+
+    Returns (categories, db_products, pricelist_products, brands, image_index).
+    """
+    if serial:
+        return (
+            *_timed('db', load_db_sources),
+            _timed('pricelist', load_pricelist),
+            _timed('brands', load_nextcloud_brands),
+            image_index if image_index is not None else _timed('image_scan', scan_local_images),
+        )
+
+    parent = instrumentation.path()
+    spawn = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=2, mp_context=spawn) as procs, ThreadPoolExecutor(max_workers=2) as threads:
+        pricelist = procs.submit(instrumentation.collect, _timed, 'pricelist', load_pricelist)
+        brands = procs.submit(instrumentation.collect, _timed, 'brands', load_nextcloud_brands)
+        db_sources = threads.submit(_timed, 'db', load_db_sources, parent=parent)
+        if image_index is None:
+            image_index = threads.submit(_timed, 'image_scan', scan_local_images, parent=parent).result()
+        return (*db_sources.result(), instrumentation.merge(pricelist.result(), parent),
+                instrumentation.merge(brands.result(), parent), image_index)
+
+
+def export(incremental=False, serial=False, compact=False, sources=None):
+    """Run the export; returns (categories_list, products_list), or None when
+    incremental mode found nothing to do.
+
+    `sources` is an already loaded (categories, db_products,
+    pricelist_products, brands) tuple (build_catalog.py parses it while the
+    images are still downloading); only the image tree is scanned here then.
+    """
+    state = None
+    image_index = None  # one walk over the image tree serves both merge loops
+
+    if incremental:
+        state = load_state()
+        with instrumentation.stage('fingerprints'):
+            image_index = scan_local_images(state['image_index'])
+            fingerprints = source_fingerprints(state['sources'])
+        changed = [name for name in sorted(fingerprints.keys() | state['sources'].keys())
+                   if state['sources'].get(name, {}).get('sha1') != fingerprints.get(name, {}).get('sha1')]
+        image_dirs = {sku: entry['mtime'] for sku, entry in image_index.items()}
+        previous_dirs = {sku: entry['mtime'] for sku, entry in state['image_index'].items()}
+        same_options = state.get('compact') == compact
+        if not changed and image_dirs == previous_dirs and same_options and outputs_present():
+            if fingerprints != state['sources']:
+                state['sources'] = fingerprints  # touched but identical content
+                save_state(state)
+            print("No source changes since last export, nothing to do.")
+            return None
+        if changed:
+            print(f"Changed sources: {', '.join(changed)}")
+        elif image_dirs != previous_dirs:
+            print("Changed sources: image folders only")
+        else:
+            print("Sources unchanged; " + ("output options changed" if not same_options else "output files missing"))
+
+    with instrumentation.stage('load_sources'):
+        if sources is None:
+            print("Loading data sources...")
+            categories, db_products, pricelist_products, brands, image_index = load_sources(
+                serial=serial, image_index=image_index)
+        else:
+            categories, db_products, pricelist_products, brands = sources
+            if image_index is None:
+                image_index = _timed('image_scan', scan_local_images)
+    instrumentation.count('rows.db_products', len(db_products))
+    instrumentation.count('rows.pricelist', len(pricelist_products))
+    instrumentation.count('rows.brands', len(brands))
+    instrumentation.count('image_folders', len(image_index))
 
     print(f"  DB categories: {len(categories)}")
     print(f"  DB products: {len(db_products)}")
     print(f"  Pricelist products: {len(pricelist_products)}")
     print(f"  Nextcloud brands: {len(brands)}")
 
-    # Build merged product list
-    # Start with pricelist as primary (most products, has prices and EN names)
-    merged = {}
-    product_id = 0
+    with instrumentation.stage('merge'):
+        products_list, records = merge_products(
+            categories, db_products, pricelist_products, brands,
+            images_for=image_lookup(image_index, image_store.load_manifest()),
+            previous_records=state['records'] if incremental else None,
+        )
 
-    for pl in pricelist_products:
-        sku_upper = pl['sku'].upper()
-        db = db_products.get(sku_upper, {})
-        brand = brands.get(sku_upper, None)
-
-        # Determine best name_lv: prefer DB, then pricelist
-        name_lv = db.get('name_lv') or pl.get('name_lv_pricelist') or pl.get('name_en', '')
-        name_en = pl.get('name_en', '')
-
-        # Determine category: override > pricelist mapping > DB
-        category_id = SKU_CATEGORY_OVERRIDES.get(pl['sku']) or SKU_CATEGORY_OVERRIDES.get(sku_upper) or pl.get('category_id') or db.get('category_id')
-        if not category_id:
-            continue  # Skip products without a category
-
-        # Price: prefer pricelist, fallback DB
-        price = pl.get('price') or db.get('price_db')
-
-        product_id += 1
-        category_slug = categories[category_id]['slug'] if category_id in categories else ''
-
-        # Prefer local Nextcloud images, fallback to scraped remote URLs
-        local_imgs = get_local_images(pl['sku'])
-        images = local_imgs if local_imgs else db.get('images', [])
-
-        merged[sku_upper] = {
-            'id': product_id,
-            'sku': pl['sku'],
-            'name_lv': name_lv,
-            'name_en': name_en,
-            'description_lv': db.get('description_lv', ''),
-            'price': price,
-            'categoryId': category_id,
-            'categorySlug': category_slug,
-            'brand': brand or '',
-            'ean': pl.get('ean', ''),
-            'images': images,
-        }
-
-    # Add DB-only products (e.g., Disposable Items category 11)
-    for sku_upper, db in db_products.items():
-        if sku_upper not in merged:
-            category_id = SKU_CATEGORY_OVERRIDES.get(db['sku']) or SKU_CATEGORY_OVERRIDES.get(sku_upper) or db.get('category_id')
-            if not category_id or category_id not in categories:
-                continue
-
-            brand = brands.get(sku_upper, None)
-            product_id += 1
-            category_slug = categories[category_id]['slug']
-
-            local_imgs = get_local_images(db['sku'])
-            images = local_imgs if local_imgs else db.get('images', [])
-
-            merged[sku_upper] = {
-                'id': product_id,
-                'sku': db['sku'],
-                'name_lv': db.get('name_lv', ''),
-                'name_en': '',
-                'description_lv': db.get('description_lv', ''),
-                'price': db.get('price_db'),
-                'categoryId': category_id,
-                'categorySlug': category_slug,
-                'brand': brand or '',
-                'ean': '',
-                'images': images,
-            }
+    with instrumentation.stage('attach'):
+        attach_image_variants(products_list, image_variants.load_manifest())
+        generated, translated = description_sidecar.apply(products_list, description_sidecar.load())
+    print(f"  Descriptions from data/descriptions.json: {generated} generated, {translated} translated")
 
     # Count products per category
-    for prod in merged.values():
+    for prod in products_list:
         cat_id = prod['categoryId']
         if cat_id in categories:
             categories[cat_id]['productCount'] += 1
 
-    # Sort products by SKU within each category
-    products_list = sorted(merged.values(), key=lambda p: (p['categoryId'], p['sku']))
-    # Re-assign sequential IDs
-    for i, p in enumerate(products_list, 1):
-        p['id'] = i
-
     # Build categories list
     categories_list = sorted(categories.values(), key=lambda c: int(c['number']))
 
-    # Write output
+    # Write output (unchanged files are left untouched)
     os.makedirs(OUTPUT_DIR, exist_ok=True)
-
-    with open(os.path.join(OUTPUT_DIR, 'categories.json'), 'w', encoding='utf-8') as f:
-        json.dump(categories_list, f, ensure_ascii=False, indent=2)
-
-    with open(os.path.join(OUTPUT_DIR, 'products.json'), 'w', encoding='utf-8') as f:
-        json.dump(products_list, f, ensure_ascii=False, indent=2)
+    written = []
+    with instrumentation.stage('write'):
+        if write_json(os.path.join(OUTPUT_DIR, 'categories.json'), categories_list, compact=compact):
+            written.append('categories.json')
+        written += write_products(products_list, OUTPUT_DIR, compact=compact)
+        with instrumentation.stage('search_index'):
+            search_index = build_search_index(products_list)
+        if write_json(os.path.join(OUTPUT_DIR, SEARCH_INDEX_NAME), search_index, compact=True):
+            written.append(SEARCH_INDEX_NAME)
+
+        if incremental:
+            state.update(sources=fingerprints, image_index=image_index, records=records, compact=compact)
+            save_state(state)
+    with instrumentation.stage('changes'):
+        change_set = catalog_history.record_export(products_list, OUTPUT_DIR)
+    instrumentation.gauge('products', len(products_list))
+    instrumentation.gauge('files_rewritten', len(written))
 
     print(f"\nExported:")
     print(f"  {len(categories_list)} categories -> data/categories.json")
-    print(f"  {len(products_list)} products -> data/products.json")
+    print(f"  {len(products_list)} products -> data/products.json (+ per-category shards)")
+    print(f"  Files rewritten: {len(written) or 'none (output unchanged)'}")
+    if change_set:
+        print(f"  Changes since export #{change_set['previous'] or 0}: {len(change_set['added'])} added, "
+              f"{len(change_set['removed'])} removed, {len(change_set['changed'])} changed "
+              f"-> data/{catalog_history.CHANGES_NAME}")
+        for key in ('added', 'removed', 'changed'):
+            instrumentation.gauge(f'changes.{key}', len(change_set[key]))
+    else:
+        print("  Changes since the previous export: none")
 
     # Summary per category
     print("\nProducts per category:")
     for cat in categories_list:
         print(f"  {cat['number']} {cat['name_lv']}: {cat['productCount']}")
 
+    return categories_list, products_list
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export catalog data to JSON.')
+    parser.add_argument('--incremental', action='store_true',
+                        help='skip the export when no source changed and rebuild only changed records')
+    parser.add_argument('--serial', action='store_true',
+                        help='load sources one after another instead of concurrently')
+    parser.add_argument('--compact', action='store_true',
+                        help='write JSON without indentation, one product per line')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    with instrumentation.run('export_data', args):
+        export(incremental=args.incremental, serial=args.serial, compact=args.compact)
+
 
 if __name__ == '__main__':
     main()
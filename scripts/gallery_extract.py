@@ -0,0 +1,192 @@
+"""
+Gallery image extraction for hairsera.lv / hairsera.lt (WooCommerce) product pages.
+
+scrape_web_images.py only needs the <img> attributes inside the product
+gallery, so instead of building a full BeautifulSoup tree per page the
+page is fed chunk by chunk to an event parser (lxml's HTMLPullParser when
+lxml is installed, the stdlib html.parser otherwise) and reading stops as
+soon as the gallery container has been closed.
+
+Selection matches the original BeautifulSoup selectors:
+    main:    first '.woocommerce-product-gallery__image img, .wp-post-image'
+    gallery: all '.woocommerce-product-gallery__image img, .product-gallery img'
+
+Usage:
+    from gallery_extract import extract_gallery_images
+    srcs = extract_gallery_images(response.iter_content(16384), engine='auto')
+"""
+
+import codecs
+from html.parser import HTMLParser
+
+from bs4 import BeautifulSoup
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+ENGINES = ('auto', 'lxml', 'html.parser', 'soup')
+CHUNK_SIZE = 16384
+
+MAIN_SELECTOR = '.woocommerce-product-gallery__image img, .wp-post-image'
+GALLERY_SELECTOR = '.woocommerce-product-gallery__image img, .product-gallery img'
+
+# Elements that close the gallery when they end (outermost first)
+GALLERY_CONTAINERS = {'woocommerce-product-gallery', 'product-gallery'}
+IMAGE_CONTAINERS = {'woocommerce-product-gallery__image', 'product-gallery'}
+MAIN_CONTAINERS = {'woocommerce-product-gallery__image'}
+
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+             'link', 'meta', 'param', 'source', 'track', 'wbr'}
+
+
+def image_src(attrs):
+    """Preferred full-size source of a gallery <img> (same order as before)."""
+    return attrs.get('data-large_image') or attrs.get('data-src') or attrs.get('src', '')
+
+
+class GalleryCollector:
+    """Parser-independent state machine fed with start/end tag events."""
+
+    def __init__(self):
+        self.main = None          # attrs of the first MAIN_SELECTOR match
+        self.gallery = []         # attrs of every GALLERY_SELECTOR match
+        self.done = False         # gallery container closed and images seen
+        self._open = []           # tag names of the open non-void elements
+        self._image_depths = []   # depths of open IMAGE_CONTAINERS elements
+        self._main_depths = []    # depths of open MAIN_CONTAINERS elements
+        self._gallery_depth = None
+
+    def start(self, tag, attrs):
+        classes = set((attrs.get('class') or '').split())
+        in_images = bool(self._image_depths) or bool(classes & IMAGE_CONTAINERS)
+        in_main = bool(self._main_depths) or bool(classes & MAIN_CONTAINERS)
+
+        if tag == 'img' and in_images:
+            self.gallery.append(attrs)
+        if self.main is None and ((tag == 'img' and in_main) or 'wp-post-image' in classes):
+            self.main = attrs
+
+        if tag in VOID_TAGS:
+            return
+        self._open.append(tag)
+        depth = len(self._open)
+        if classes & IMAGE_CONTAINERS:
+            self._image_depths.append(depth)
+        if classes & MAIN_CONTAINERS:
+            self._main_depths.append(depth)
+        if self._gallery_depth is None and classes & GALLERY_CONTAINERS:
+            self._gallery_depth = depth
+
+    def end(self, tag):
+        """Close `tag` and every element left unclosed inside it.
+
+        html.parser reports tags exactly as written, so an unclosed <p> or
+        <li> would otherwise keep the gallery open; a stray end tag is ignored.
+        """
+        if tag in VOID_TAGS or tag not in self._open:
+            return
+        while True:
+            depth = len(self._open)
+            name = self._open.pop()
+            if self._image_depths and self._image_depths[-1] == depth:
+                self._image_depths.pop()
+            if self._main_depths and self._main_depths[-1] == depth:
+                self._main_depths.pop()
+            if self._gallery_depth == depth:
+                self._gallery_depth = None
+                # Keep reading until a main image is known: a later
+                # .wp-post-image would be the main image, as with soup
+                self.done = self.main is not None
+            if name == tag:
+                return
+
+    def images(self):
+        """Image sources in document order, main image first, no placeholders."""
+        found = []
+        for attrs in ([self.main] if self.main else []) + self.gallery:
+            src = image_src(attrs)
+            if src and 'placeholder' not in src.lower() and src not in found:
+                found.append(src)
+        return found
+
+
+class _StdlibParser(HTMLParser):
+    def __init__(self, collector):
+        super().__init__(convert_charrefs=True)
+        self.collector = collector
+
+    def handle_starttag(self, tag, attrs):
+        self.collector.start(tag, {k: v or '' for k, v in attrs})
+
+    def handle_endtag(self, tag):
+        self.collector.end(tag)
+
+
+def _extract_stdlib(chunks, encoding):
+    collector = GalleryCollector()
+    parser = _StdlibParser(collector)
+    decoder = codecs.getincrementaldecoder(encoding or 'utf-8')(errors='replace')
+    for chunk in chunks:
+        parser.feed(decoder.decode(chunk))
+        if collector.done:
+            break
+    else:
+        parser.feed(decoder.decode(b'', final=True))
+        parser.close()
+    return collector.images()
+
+
+def _extract_lxml(chunks, encoding):
+    collector = GalleryCollector()
+    parser = etree.HTMLPullParser(events=('start', 'end'), encoding=encoding)
+    for chunk in chunks:
+        parser.feed(chunk)
+        for event, el in parser.read_events():
+            if not isinstance(el.tag, str):
+                continue  # comments, processing instructions
+            if event == 'start':
+                collector.start(el.tag, dict(el.attrib))
+            else:
+                collector.end(el.tag)
+        if collector.done:
+            break
+    return collector.images()
+
+
+def _extract_soup(chunks, encoding):
+    """The original full-tree BeautifulSoup parse (kept for comparison)."""
+    soup = BeautifulSoup(b''.join(chunks).decode(encoding or 'utf-8', errors='replace'), 'html.parser')
+    found = []
+    main_img = soup.select_one(MAIN_SELECTOR)
+    for img in ([main_img] if main_img else []) + soup.select(GALLERY_SELECTOR):
+        src = image_src(img)
+        if src and 'placeholder' not in src.lower() and src not in found:
+            found.append(src)
+    return found
+
+
+def resolve_engine(engine='auto'):
+    if engine not in ENGINES:
+        raise ValueError(f'unknown HTML engine {engine!r} (choose from {", ".join(ENGINES)})')
+    if engine == 'auto':
+        return 'lxml' if etree is not None else 'html.parser'
+    if engine == 'lxml' and etree is None:
+        raise ValueError('lxml is not installed (pip install lxml)')
+    return engine
+
+
+def extract_gallery_images(chunks, engine='auto', encoding='utf-8'):
+    """Return the gallery image sources found in an iterable of byte chunks.
+
+    Stops consuming `chunks` once the gallery has been closed (streaming
+    engines only), so pass a response's iter_content() to skip the rest of
+    the page.
+    """
+    engine = resolve_engine(engine)
+    if engine == 'lxml':
+        return _extract_lxml(chunks, encoding)
+    if engine == 'html.parser':
+        return _extract_stdlib(chunks, encoding)
+    return _extract_soup(chunks, encoding)
@@ -7,54 +7,39 @@ Strategy:
    - Translate English product name to Latvian via Google Translate
    - Add brand and category context
 
+Generated descriptions are stored in data/descriptions.json together with a
+hash of their inputs (name_en, brand, categoryId, ean), so a rerun only
+rebuilds products whose inputs changed, and export_data.py merges them back
+after every export (see description_sidecar.py).
+
 Usage:
     python scripts/generate_descriptions.py
+    python scripts/generate_descriptions.py --workers 8
+    python scripts/generate_descriptions.py --backend stub   # offline dry run
+    python scripts/generate_descriptions.py --all            # rebuild every generated description
 """
 
+import argparse
 import json
 import sys
 import os
-import time
 import re
 
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8', errors='replace')
 
-from deep_translator import GoogleTranslator
+import description_sidecar
+import instrumentation
+from catalog_db import sku_key
+from catalog_output import write_products, written_compact
+from translation_cache import TranslationCache
+from translation_engine import BACKENDS, MAX_CHARS, WORKERS, TranslationEngine, get_backend
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_DIR = os.path.dirname(SCRIPT_DIR)
 PRODUCTS_FILE = os.path.join(PROJECT_DIR, 'data', 'products.json')
 OUTPUT_FILE = os.path.join(PROJECT_DIR, 'data', 'products.json')
-CACHE_FILE = os.path.join(SCRIPT_DIR, 'translation_cache_desc.json')
-
-# Translation cache
-def load_cache():
-    if os.path.exists(CACHE_FILE):
-        with open(CACHE_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {}
-
-def save_cache(cache):
-    with open(CACHE_FILE, 'w', encoding='utf-8') as f:
-        json.dump(cache, f, ensure_ascii=False, indent=2)
-
-def translate_en_to_lv(text, cache, translator):
-    """Translate English text to Latvian with caching."""
-    if not text or not text.strip():
-        return ''
-    text = text.strip()
-    if text in cache:
-        return cache[text]
-    try:
-        result = translator.translate(text)
-        cache[text] = result
-        time.sleep(0.15)  # Rate limiting
-        return result
-    except Exception as e:
-        print(f'    Translation error: {e}')
-        cache[text] = text  # Cache original to avoid retrying
-        return text
+LEGACY_CACHE_FILE = os.path.join(SCRIPT_DIR, 'translation_cache_desc.json')
 
 
 def clean_name(name):
@@ -95,77 +80,166 @@ def build_description(product, translated_name, categories_map):
     return '\n'.join(parts) if parts else ''
 
 
-def main():
-    print('=' * 60)
-    print('  Product Description Generator')
-    print('=' * 60)
-
-    # Load products
-    with open(PRODUCTS_FILE, 'r', encoding='utf-8') as f:
-        products = json.load(f)
+def adopt_existing(products, sidecar, categories_map):
+    """Record descriptions generated before the sidecar existed (they would be lost on export).
 
-    # Load categories for context
-    cats_file = os.path.join(PROJECT_DIR, 'data', 'categories.json')
-    with open(cats_file, 'r', encoding='utf-8') as f:
-        categories = json.load(f)
+    A description is adopted when rebuilding it from the product's current
+    fields reproduces it exactly. Returns the number adopted.
+    """
+    adopted = 0
+    for product in products:
+        sku = sku_key(product['sku'])
+        desc = product.get('description_lv') or ''
+        if sku in sidecar['generated'] or not description_sidecar.has_source_description(desc):
+            continue
+        first = desc.split('\n', 1)[0]
+        for translated in (first[:-1] if first.endswith('.') else None, ''):
+            if translated is not None and build_description(product, translated, categories_map) == desc:
+                sidecar['generated'][sku] = {'inputs': description_sidecar.input_hash(product),
+                                             'description_lv': desc}
+                adopted += 1
+                break
+    return adopted
+
+
+def generate(products, categories, backend='google', workers=WORKERS, max_chars=MAX_CHARS,
+             rebuild_all=False):
+    """Fill in generated descriptions and write products.json + shards.
+
+    `products` / `categories` are the exported lists (build_catalog.py passes
+    them straight from export_data.export()); products are updated in place.
+    Returns the paths rewritten by write_products.
+    """
     categories_map = {c['id']: c['name_lv'] for c in categories}
 
-    # Split into has/needs description
-    has_desc = [p for p in products if p.get('description_lv') and len(p['description_lv'].strip()) > 10]
-    needs_desc = [p for p in products if not p.get('description_lv') or len(p['description_lv'].strip()) <= 10]
+    # Split into has/needs description; generated ones are only rebuilt when their inputs changed
+    sidecar = description_sidecar.load()
+    adopted = adopt_existing(products, sidecar, categories_map)
+    if adopted:
+        print(f'Adopted {adopted} previously generated descriptions into {os.path.basename(description_sidecar.SIDECAR_PATH)}')
+    has_desc = [p for p in products if not description_sidecar.is_generated(p, sidecar)]
+    needs_desc = [p for p in products if description_sidecar.is_generated(p, sidecar)]
+    hashes = {p['id']: description_sidecar.input_hash(p) for p in needs_desc}
+
+    def is_dirty(product):
+        entry = sidecar['generated'].get(sku_key(product['sku']))
+        return rebuild_all or not entry or entry['inputs'] != hashes[product['id']] or entry.get('retry')
+
+    dirty = [p for p in needs_desc if is_dirty(p)]
 
     print(f'\nTotal products: {len(products)}')
     print(f'Already have descriptions: {len(has_desc)}')
-    print(f'Need descriptions: {len(needs_desc)}')
+    print(f'Need descriptions: {len(needs_desc)} ({len(dirty)} new or with changed inputs)')
 
-    # Load translation cache
-    cache = load_cache()
+    # Shared SQLite translation cache (scripts/translation_cache.db)
+    cache = TranslationCache('en', 'lv', backend=backend)
+    if backend == 'google' and len(cache) == 0 and os.path.exists(LEGACY_CACHE_FILE):
+        print(f'Imported {cache.import_json(LEGACY_CACHE_FILE)} entries from {os.path.basename(LEGACY_CACHE_FILE)}')
     print(f'Translation cache entries: {len(cache)}')
 
-    # Setup translator
-    translator = GoogleTranslator(source='en', target='lv')
-
-    # Generate descriptions for products that need them
+    # Translate all English names in deduplicated, concurrent batches
+    engine = TranslationEngine(get_backend(backend, 'en', 'lv'), cache=cache,
+                               workers=workers, max_chars=max_chars)
+    names = {p['id']: clean_name(p.get('name_en', '')) for p in dirty}
+    to_translate = [name for name in names.values() if name and len(name) > 3]
+
+    def progress(done, total):
+        if done % 10 == 0 or done == total:
+            print(f'  Translated batches: {done}/{total}')
+
+    with instrumentation.stage('translate'):
+        translations = engine.translate_all(to_translate, progress=progress)
+    for key, n in engine.stats.items():
+        instrumentation.count(f'translate.{key}', n)
+    instrumentation.count('translate.cache_hits', cache.hits)
+    instrumentation.count('translate.cache_misses', cache.misses)
+    print(f'  Requests: {engine.stats["requests"]}, rate limited: {engine.stats["rate_limited"]}, '
+          f'split batches: {engine.stats["split_batches"]}, failed: {engine.stats["failed"]} '
+          f'(+{engine.stats["backing_off"]} waiting to retry)')
+    print(f'  Cache hits: {cache.hits}, misses: {cache.misses}')
+
+    # Generate descriptions for products whose inputs changed
     generated = 0
     errors = 0
 
-    for i, product in enumerate(products):
-        # Skip products that already have descriptions
-        if product.get('description_lv') and len(product['description_lv'].strip()) > 10:
-            continue
-
-        name_en = clean_name(product.get('name_en', ''))
-
-        # Translate English name to Latvian
-        translated = ''
-        if name_en and len(name_en) > 3:
-            translated = translate_en_to_lv(name_en, cache, translator)
+    for product in dirty:
+        name_en = names[product['id']]
+        # Untranslatable names fall back to the English text, as before
+        translated = translations.get(name_en, name_en) if name_en and len(name_en) > 3 else ''
 
         # Build description
         desc = build_description(product, translated, categories_map)
+        entry = {'inputs': hashes[product['id']], 'description_lv': desc}
+        if name_en and len(name_en) > 3 and name_en not in translations:
+            entry['retry'] = True  # translation failed: keep the fallback but retry next run
+        sidecar['generated'][sku_key(product['sku'])] = entry
         if desc:
-            product['description_lv'] = desc
             generated += 1
         else:
             errors += 1
 
-        if (generated + errors) % 100 == 0:
-            print(f'  Progress: {generated + errors}/{len(needs_desc)} (generated: {generated})')
-            save_cache(cache)
-
-    # Save
-    save_cache(cache)
-
-    with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-        json.dump(products, f, ensure_ascii=False, indent=2)
+    # Apply the stored descriptions; drop entries of products that are gone or have their own
+    current = {sku_key(p['sku']) for p in needs_desc}
+    sidecar['generated'] = {sku: e for sku, e in sidecar['generated'].items() if sku in current}
+    for product in needs_desc:
+        entry = sidecar['generated'].get(sku_key(product['sku']))
+        if entry and entry['description_lv']:
+            product['description_lv'] = entry['description_lv']
+
+    cache_entries = len(cache)
+    cache.close()
+
+    description_sidecar.save(sidecar)
+    # products.json plus the per-category shards read by src/lib/data.ts (unchanged files are kept),
+    # in the layout the export chose
+    output_dir = os.path.dirname(OUTPUT_FILE)
+    with instrumentation.stage('write'):
+        written = write_products(products, output_dir, compact=written_compact(output_dir))
+    instrumentation.count('descriptions.generated', generated)
+    instrumentation.count('descriptions.unchanged', len(needs_desc) - len(dirty))
 
     print(f'\n{"=" * 60}')
     print(f'  DONE')
     print(f'{"=" * 60}')
     print(f'  Descriptions generated: {generated}')
+    print(f'  Unchanged generated: {len(needs_desc) - len(dirty)}')
     print(f'  Kept existing: {len(has_desc)}')
     print(f'  Errors/skipped: {errors}')
-    print(f'  Translation cache: {len(cache)} entries')
+    print(f'  Translation cache: {cache_entries} entries')
+    print(f'  Files rewritten: {len(written) or "none (output unchanged)"}')
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate missing product descriptions.')
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='google',
+                        help='translation backend (stub = local, no network)')
+    parser.add_argument('--workers', type=int, default=WORKERS,
+                        help=f'translation batches in flight (default {WORKERS})')
+    parser.add_argument('--max-chars', type=int, default=MAX_CHARS,
+                        help=f'characters per translation request (default {MAX_CHARS})')
+    parser.add_argument('--all', action='store_true',
+                        help='rebuild every generated description, not only those whose inputs changed')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    print('=' * 60)
+    print('  Product Description Generator')
+    print('=' * 60)
+
+    with instrumentation.run('generate_descriptions', args):
+        with instrumentation.stage('load'):
+            # Load products
+            with open(PRODUCTS_FILE, 'r', encoding='utf-8') as f:
+                products = json.load(f)
+
+            # Load categories for context
+            cats_file = os.path.join(PROJECT_DIR, 'data', 'categories.json')
+            with open(cats_file, 'r', encoding='utf-8') as f:
+                categories = json.load(f)
+
+        generate(products, categories, backend=args.backend, workers=args.workers,
+                 max_chars=args.max_chars, rebuild_all=args.all)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,141 @@
+"""
+Shared HTTP plumbing for the image scripts.
+
+- One requests.Session per worker thread, each with a keep-alive connection
+  pool, so concurrent workers reuse TCP/TLS connections.
+- Per-host politeness: a cap on concurrent requests per host plus a
+  token-bucket rate limit, replacing fixed time.sleep() delays.
+
+Usage:
+    client = PoliteClient(per_host=8, rate=10, setup=lambda s: s.headers.update(...))
+    r = client.request('PROPFIND', url, headers={'Depth': '1'})
+    with client.open('GET', url, stream=True) as r:   # slot held while streaming
+        for chunk in iter_body(r, 65536):
+            ...
+
+Requests and body bytes are counted in the current instrumentation run
+(http.requests, http.bytes).
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import instrumentation
+
+
+def iter_body(response, chunk_size):
+    """response.iter_content() that counts the bytes read."""
+    for chunk in response.iter_content(chunk_size=chunk_size):
+        instrumentation.count('http.bytes', len(chunk))
+        yield chunk
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`.
+
+    A rate of 0 or less disables limiting.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class HostLimiter:
+    """Concurrency cap and request rate per host, shared by all worker threads."""
+
+    def __init__(self, per_host=4, rate=10.0):
+        self.per_host = per_host
+        self.rate = rate
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _limits(self, url):
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = (threading.BoundedSemaphore(self.per_host),
+                                     TokenBucket(self.rate))
+            return self._hosts[host]
+
+    @contextmanager
+    def slot(self, url):
+        """Hold one of the host's concurrency slots after taking a rate token."""
+        semaphore, bucket = self._limits(url)
+        with semaphore:
+            bucket.acquire()
+            yield
+
+
+class PoliteClient:
+    """Thread-safe HTTP client: per-thread sessions behind a HostLimiter."""
+
+    def __init__(self, per_host=4, rate=10.0, setup=None):
+        self.setup = setup
+        self.configure(per_host, rate)
+        self._local = threading.local()
+        self.requests_made = 0
+        self._count_lock = threading.Lock()
+
+    def configure(self, per_host, rate):
+        """Change the limits (call before starting workers)."""
+        self.per_host = per_host
+        self.limiter = HostLimiter(per_host, rate)
+
+    @property
+    def session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(self.per_host, 1))
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            if self.setup:
+                self.setup(session)
+            self._local.session = session
+        return session
+
+    @contextmanager
+    def open(self, method, url, **kwargs):
+        """Send a request and keep the host slot until the block exits.
+
+        Use this for streamed bodies so a download counts against the host's
+        concurrency limit for as long as it is being read.
+        """
+        with self.limiter.slot(url):
+            with self._count_lock:
+                self.requests_made += 1
+            instrumentation.count('http.requests')
+            r = self.session.request(method, url, **kwargs)
+            try:
+                yield r
+            finally:
+                r.close()
+
+    def request(self, method, url, **kwargs):
+        """Send a request and read the whole body before releasing the slot."""
+        with self.open(method, url, **kwargs) as r:
+            instrumentation.count('http.bytes', len(r.content))  # body loaded while the slot is held
+            return r
@@ -0,0 +1,231 @@
+"""
+Content-addressed store for product images.
+
+Colour / size variants often share identical photos, and the downloaders
+used to write a separate copy into every public/images/products/{SKU}/
+folder. The store keeps each distinct image once, named by its SHA-1:
+
+    public/images/blobs/ab/ab12...ef.jpg      one file per distinct image
+    public/images/image-store.json            manifest
+
+Manifest:
+    {"version": 1,
+     "blobs":   {sha1: {"ext": ".jpg", "size": 12345}},
+     "skus":    {SKU: {filename: sha1}},
+     "sources": {source_key: sha1}}
+
+`sources` remembers which remote object produced which blob (an image URL,
+a Nextcloud etag or server-side checksum), so a download whose content is
+already known is skipped and the SKU just points at the existing blob.
+export_data.py resolves a SKU's images through the manifest (falling back to
+the SKU folder for images that were never imported).
+
+Usage:
+    python scripts/image_store.py --import    # move existing SKU folders into the store
+    python scripts/image_store.py --gc        # delete blobs no SKU references
+    python scripts/image_store.py             # print store statistics
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import uuid
+from pathlib import Path
+
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8', errors='replace')
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_DIR = SCRIPT_DIR.parent
+IMAGES_DIR = PROJECT_DIR / 'public' / 'images'
+PRODUCTS_DIR = IMAGES_DIR / 'products'
+BLOB_DIR = IMAGES_DIR / 'blobs'
+MANIFEST_PATH = IMAGES_DIR / 'image-store.json'
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tiff', '.tif'}
+
+
+def file_sha1(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def blob_web_path(sha1, ext):
+    return f'/images/blobs/{sha1[:2]}/{sha1}{ext}'
+
+
+def load_manifest(path=MANIFEST_PATH):
+    """Read the manifest (an empty one if the store does not exist yet)."""
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {'version': 1, 'blobs': {}, 'skus': {}, 'sources': {}}
+
+
+def sku_images(manifest, sku):
+    """{filename: web path} of the images a SKU references in the store."""
+    files = manifest['skus'].get(sku, {})
+    return {name: blob_web_path(sha1, manifest['blobs'][sha1]['ext'])
+            for name, sha1 in files.items() if sha1 in manifest['blobs']}
+
+
+class ImageStore:
+    """Thread-safe writer for the blob directory and its manifest."""
+
+    def __init__(self, manifest_path=MANIFEST_PATH, blob_dir=BLOB_DIR):
+        self.manifest_path = Path(manifest_path)
+        self.blob_dir = Path(blob_dir)
+        self.manifest = load_manifest(self.manifest_path)
+        self.stats = {'stored': 0, 'deduplicated': 0, 'linked': 0}
+        self._lock = threading.Lock()
+
+    def _blob_path(self, sha1, ext):
+        return self.blob_dir / sha1[:2] / f'{sha1}{ext}'
+
+    def has(self, sku, name):
+        with self._lock:
+            sha1 = self.manifest['skus'].get(sku, {}).get(name)
+            return sha1 is not None and sha1 in self.manifest['blobs']
+
+    def has_blob(self, sha1):
+        with self._lock:
+            return bool(sha1) and sha1 in self.manifest['blobs']
+
+    def known(self, *source_keys):
+        """Blob hash already produced by any of these remote objects, if any."""
+        with self._lock:
+            for key in source_keys:
+                sha1 = key and self.manifest['sources'].get(key)
+                if sha1 and sha1 in self.manifest['blobs']:
+                    return sha1
+        return None
+
+    def staging_path(self, name):
+        """Temporary download target inside the store (same filesystem as the blobs)."""
+        staging = self.blob_dir / '.staging'
+        staging.mkdir(parents=True, exist_ok=True)
+        return staging / f'{uuid.uuid4().hex}{os.path.splitext(name)[1].lower()}'
+
+    def link(self, sku, name, sha1, sources=()):
+        """Point sku/name at an existing blob without storing any bytes."""
+        with self._lock:
+            self.manifest['skus'].setdefault(sku, {})[name] = sha1
+            for key in sources:
+                if key:
+                    self.manifest['sources'][key] = sha1
+            self.stats['linked'] += 1
+
+    def add_file(self, sku, name, path, sources=()):
+        """Move a downloaded file into the store and point sku/name at it.
+
+        The file is deleted instead when an identical blob already exists.
+        Returns the blob hash.
+        """
+        sha1 = file_sha1(path)
+        ext = os.path.splitext(name)[1].lower()
+        with self._lock:
+            blob = self.manifest['blobs'].get(sha1)
+            if blob and self._blob_path(sha1, blob['ext']).exists():
+                os.remove(path)
+                self.stats['deduplicated'] += 1
+            else:
+                target = self._blob_path(sha1, ext)
+                target.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(path, target)
+                self.manifest['blobs'][sha1] = {'ext': ext, 'size': target.stat().st_size}
+                self.stats['stored'] += 1
+            self.manifest['skus'].setdefault(sku, {})[name] = sha1
+            for key in sources:
+                if key:
+                    self.manifest['sources'][key] = sha1
+        return sha1
+
+    def remove(self, sku, name):
+        """Drop sku/name from the manifest (the blob stays until gc())."""
+        with self._lock:
+            files = self.manifest['skus'].get(sku, {})
+            files.pop(name, None)
+            if not files:
+                self.manifest['skus'].pop(sku, None)
+
+    def drop_blob(self, sha1):
+        """Forget a blob (its file is moved away by the caller) and every source that produced it.
+
+        SKU entries keep pointing at the hash, so sku_images() skips them and
+        has()/known() report the image as missing: the next download fetches
+        it again. Returns the SKUs that referenced the blob.
+        """
+        with self._lock:
+            self.manifest['blobs'].pop(sha1, None)
+            self.manifest['sources'] = {k: v for k, v in self.manifest['sources'].items() if v != sha1}
+            return sorted(sku for sku, files in self.manifest['skus'].items() if sha1 in files.values())
+
+    def save(self):
+        with self._lock:
+            self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.manifest_path.with_name(self.manifest_path.name + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.manifest, f, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+            os.replace(tmp_path, self.manifest_path)
+
+    def gc(self):
+        """Delete blobs and source entries no SKU references. Returns (files, bytes) freed."""
+        with self._lock:
+            used = {sha1 for files in self.manifest['skus'].values() for sha1 in files.values()}
+            freed = [0, 0]
+            for sha1 in [s for s in self.manifest['blobs'] if s not in used]:
+                blob = self.manifest['blobs'].pop(sha1)
+                path = self._blob_path(sha1, blob['ext'])
+                if path.exists():
+                    freed[0] += 1
+                    freed[1] += path.stat().st_size
+                    path.unlink()
+            self.manifest['sources'] = {k: v for k, v in self.manifest['sources'].items() if v in used}
+        return tuple(freed)
+
+    def import_folders(self, products_dir=PRODUCTS_DIR):
+        """Move the images of every SKU folder into the store (deduplicating)."""
+        imported = 0
+        for sku_dir in sorted(p for p in Path(products_dir).iterdir() if p.is_dir()):
+            for f in sorted(sku_dir.iterdir()):
+                if f.is_file() and f.suffix.lower() in IMAGE_EXTENSIONS:
+                    self.add_file(sku_dir.name, f.name, f)
+                    imported += 1
+            if not any(sku_dir.iterdir()):
+                sku_dir.rmdir()
+        return imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the content-addressed image store.')
+    parser.add_argument('--import', dest='import_folders', action='store_true',
+                        help='move images from public/images/products/{SKU}/ into the store')
+    parser.add_argument('--gc', action='store_true', help='delete unreferenced blobs')
+    args = parser.parse_args()
+
+    store = ImageStore()
+    if args.import_folders:
+        count = store.import_folders()
+        store.save()
+        print(f'Imported {count} files: {store.stats["stored"]} stored, '
+              f'{store.stats["deduplicated"]} duplicates removed')
+    if args.gc:
+        files, size = store.gc()
+        store.save()
+        print(f'Removed {files} unreferenced blobs ({size / 1024 / 1024:.1f} MB)')
+
+    manifest = store.manifest
+    refs = sum(len(files) for files in manifest['skus'].values())
+    size = sum(b['size'] for b in manifest['blobs'].values())
+    print(f'Store: {len(manifest["skus"])} SKUs, {refs} image references, '
+          f'{len(manifest["blobs"])} blobs ({size / 1024 / 1024:.1f} MB)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+"""
+Generate resized WebP variants of the downloaded product images.
+
+Originals (often multi-megapixel JPEGs, sometimes .bmp/.tiff that browsers
+cannot show) are rendered once per distinct content into three sizes:
+
+    thumb    160 px   thumbnail strip on the product page
+    list     400 px   product grid / list (ProductListItem)
+    detail  1200 px   main product image (ProductDetail)
+
+Sizes are the longest edge; images are never upscaled. Output is WebP with
+EXIF orientation applied and all metadata (EXIF, ICC, XMP) dropped:
+
+    public/images/variants/<ab>/<sha1>-<variant>.webp
+    public/images/image-variants.json
+
+The manifest maps every original's web path to its content hash, pixel
+size and variants. export_data.py copies that into each product's
+`imageVariants`, so pages can pick a right-sized file. Originals whose
+size and mtime are unchanged are skipped, and identical content shared by
+several SKUs is rendered once. A different --quality (recorded in the
+manifest) or --force renders everything again and overwrites the existing
+files. Rendering runs in a process pool.
+
+Requires Pillow (pip install Pillow).
+
+Usage:
+    python scripts/image_variants.py
+    python scripts/image_variants.py --workers 8 --quality 75
+    python scripts/image_variants.py --force      # re-render everything
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import image_store
+import instrumentation
+
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8', errors='replace')
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_DIR = SCRIPT_DIR.parent
+PUBLIC_DIR = PROJECT_DIR / 'public'
+IMAGES_DIR = PUBLIC_DIR / 'images'
+PRODUCTS_DIR = IMAGES_DIR / 'products'
+VARIANTS_DIR = IMAGES_DIR / 'variants'
+MANIFEST_PATH = IMAGES_DIR / 'image-variants.json'
+
+VARIANTS = {'thumb': 160, 'list': 400, 'detail': 1200}
+QUALITY = 80
+WORKERS = os.cpu_count() or 4
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tiff', '.tif'}
+
+
+def variant_web_path(sha1, name):
+    return f'/images/variants/{sha1[:2]}/{sha1}-{name}.webp'
+
+
+def load_manifest(path=None):
+    path = path or MANIFEST_PATH
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {'version': 1, 'sizes': VARIANTS, 'quality': QUALITY, 'images': {}}
+
+
+def save_manifest(manifest, path=None):
+    path = path or MANIFEST_PATH
+    tmp_path = str(path) + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def iter_originals():
+    """Yield (web_path, file_path) for every SKU-folder image and every store blob."""
+    if PRODUCTS_DIR.is_dir():
+        with os.scandir(PRODUCTS_DIR) as skus:
+            for sku in skus:
+                if not sku.is_dir():
+                    continue
+                with os.scandir(sku.path) as files:
+                    for f in files:
+                        if os.path.splitext(f.name)[1].lower() in IMAGE_EXTENSIONS:
+                            yield f'/images/products/{sku.name}/{f.name}', f.path
+
+    store = image_store.load_manifest()
+    for sha1, blob in store['blobs'].items():
+        web_path = image_store.blob_web_path(sha1, blob['ext'])
+        yield web_path, str(PUBLIC_DIR / web_path.lstrip('/'))
+
+
+def render_variants(path, quality=QUALITY, sizes=VARIANTS, overwrite=False):
+    """Render the variants of one original (runs in a worker process).
+
+    Returns {'sha1', 'width', 'height', 'variants': {name: {'src', 'width',
+    'height', 'bytes'}}}; existing variant files of the same content are
+    reused unless `overwrite` is set.
+    """
+    from PIL import Image, ImageOps
+
+    sha1 = image_store.file_sha1(path)
+    with Image.open(path) as im:
+        im = ImageOps.exif_transpose(im)
+        width, height = im.size
+        has_alpha = im.mode in ('RGBA', 'LA', 'PA') or 'transparency' in im.info
+        im = im.convert('RGBA' if has_alpha else 'RGB')
+
+        variants = {}
+        for name, edge in sizes.items():
+            src = variant_web_path(sha1, name)
+            out = PUBLIC_DIR / src.lstrip('/')
+            scale = min(1.0, edge / max(width, height))
+            size = (max(1, round(width * scale)), max(1, round(height * scale)))
+            if overwrite or not out.exists():
+                out.parent.mkdir(parents=True, exist_ok=True)
+                resized = im.resize(size, Image.LANCZOS) if size != im.size else im
+                tmp = out.with_name(f'{out.name}.{os.getpid()}.tmp')
+                # No exif=/icc_profile= arguments: the WebP carries no metadata
+                resized.save(tmp, 'WEBP', quality=quality, method=4)
+                os.replace(tmp, out)
+            variants[name] = {'src': src, 'width': size[0], 'height': size[1],
+                              'bytes': out.stat().st_size}
+    return {'sha1': sha1, 'width': width, 'height': height, 'variants': variants}
+
+
+def prune_variant_files(manifest):
+    """Delete variant files no manifest entry references."""
+    keep = {v['src'] for entry in manifest['images'].values() for v in entry['variants'].values()}
+    removed = 0
+    if VARIANTS_DIR.is_dir():
+        for f in VARIANTS_DIR.rglob('*.webp'):
+            if '/' + f.relative_to(PUBLIC_DIR).as_posix() not in keep:
+                f.unlink()
+                removed += 1
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate resized WebP variants of product images.')
+    parser.add_argument('--workers', type=int, default=WORKERS,
+                        help=f'worker processes (default {WORKERS})')
+    parser.add_argument('--quality', type=int, default=QUALITY, help=f'WebP quality (default {QUALITY})')
+    parser.add_argument('--force', action='store_true', help='re-render every image')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    if importlib.util.find_spec('PIL') is None:
+        parser.error('Pillow is required: pip install Pillow')
+
+    with instrumentation.run('image_variants', args):
+        render_all(args)
+
+
+def render_all(args):
+    print('=' * 60)
+    print('  Product Image Variants')
+    print('=' * 60)
+
+    previous = load_manifest()
+    # Variant files are named by content and size only: a new quality has to overwrite them
+    overwrite = args.force or previous.get('quality', QUALITY) != args.quality
+    if previous.get('sizes') != VARIANTS or overwrite:
+        previous = {'images': {}}
+    manifest = {'version': 1, 'sizes': VARIANTS, 'quality': args.quality, 'images': {}}
+
+    todo = {}
+    with instrumentation.stage('scan'):
+        for web_path, path in iter_originals():
+            if not os.path.exists(path):
+                continue  # store manifest entry without its blob file
+            st = os.stat(path)
+            stamp = [st.st_size, st.st_mtime_ns]
+            cached = previous['images'].get(web_path)
+            if cached and cached['stamp'] == stamp:
+                manifest['images'][web_path] = cached
+            else:
+                todo[web_path] = (path, stamp)
+
+    print(f'Originals: {len(manifest["images"]) + len(todo)} ({len(todo)} new or changed)')
+
+    errors = 0
+    if todo:
+        with instrumentation.stage('render'), ProcessPoolExecutor(max_workers=args.workers) as pool:
+            futures = {pool.submit(render_variants, path, args.quality, VARIANTS, overwrite): web_path
+                       for web_path, (path, _) in todo.items()}
+            for i, future in enumerate(as_completed(futures), 1):
+                web_path = futures[future]
+                try:
+                    manifest['images'][web_path] = dict(future.result(), stamp=todo[web_path][1])
+                except Exception as e:
+                    errors += 1
+                    print(f'  ERROR {web_path}: {e}')
+                if i % 100 == 0:
+                    print(f'  [{i}/{len(todo)}]')
+
+    with instrumentation.stage('save'):
+        save_manifest(manifest)
+        removed = prune_variant_files(manifest)
+    instrumentation.count('images.rendered', len(todo) - errors)
+    instrumentation.count('images.errors', errors)
+    instrumentation.count('images.unchanged', len(manifest['images']) - (len(todo) - errors))
+
+    original_bytes = sum(os.path.getsize(PUBLIC_DIR / p.lstrip('/')) for p in manifest['images'])
+    variant_bytes = {name: sum(e['variants'][name]['bytes'] for e in manifest['images'].values())
+                     for name in VARIANTS}
+    print(f'\n  Rendered: {len(todo) - errors}, errors: {errors}, stale variant files removed: {removed}')
+    print(f'  Originals: {original_bytes / 1024 / 1024:.1f} MB')
+    for name, size in variant_bytes.items():
+        print(f'  {name:<7} {VARIANTS[name]:>5} px: {size / 1024 / 1024:.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
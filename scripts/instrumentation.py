@@ -0,0 +1,287 @@
+"""
+Stage timers, counters and optional profiling shared by the catalog scripts.
+
+Every instrumented script wraps its run in `instrumentation.run()`, which
+appends one JSON line per run to scripts/metrics/<script>.jsonl:
+
+    {"script": "export_data", "started": "2026-...", "seconds": 4.2, "status": "ok",
+     "argv": [...], "timers": {"load_sources": {"seconds": 2.9, "calls": 1},
+                               "load_sources/pricelist": {...}, ...},
+     "counters": {"http.requests": 812, "http.bytes": 51234567, ...},
+     "gauges": {"products": 2137, ...}, "peak_rss_bytes": ...}
+
+so a slow run can be compared against earlier ones stage by stage. Timers
+nest per thread (`a/b`), counters are thread-safe, and work done in a
+process pool is folded back in with `collect()` / `merge()`.
+
+Helpers deep in the code call the module-level `stage()` / `count()` /
+`gauge()`; they record into the current run, or into a throwaway registry
+when the module is used outside of one.
+
+Flags added by `add_arguments()`:
+    --metrics PATH    write the run record here instead of scripts/metrics/
+    --profile         cProfile the main thread; .prof file next to the metrics
+                      and the 25 most expensive functions printed
+    --trace-memory    tracemalloc: peak traced memory of the run and of every
+                      stage (`peak_bytes` per timer), top allocation sites
+
+Usage:
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    with instrumentation.run('export_data', args):
+        with instrumentation.stage('load_sources'):
+            ...
+        instrumentation.count('rows.pricelist', len(rows))
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+METRICS_DIR = os.path.join(SCRIPT_DIR, 'metrics')
+PROFILE_TOP = 25
+
+
+class Metrics:
+    """Thread-safe registry of stage timers, counters and gauges."""
+
+    def __init__(self):
+        self.timers = {}
+        self.counters = {}
+        self.gauges = {}
+        self.peak_traced = 0   # tracemalloc peak across stage resets
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def path(self):
+        """Key of the innermost running stage of this thread ('' outside any stage)."""
+        stack = self._local.__dict__.get('stack')
+        return stack[-1] if stack else ''
+
+    @contextmanager
+    def stage(self, name, parent=None):
+        """Time a block as `<parent>/<name>`; parent defaults to this thread's current stage.
+
+        Pass `parent=path()` from the submitting thread to nest work done in a
+        thread pool under the stage that started it.
+
+        While tracemalloc is tracing, the stage's peak traced memory is kept
+        as `peak_bytes` (exact for stages that do not overlap other threads).
+        """
+        stack = self._local.__dict__.setdefault('stack', [])
+        parent = self.path() if parent is None else parent
+        key = f'{parent}/{name}' if parent else name
+        stack.append(key)
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            # tracemalloc has one peak: hand it to the enclosing stage, then restart it
+            peaks = self._local.__dict__.setdefault('peaks', [])
+            self._note_peak(peaks)
+            tracemalloc.reset_peak()
+            peaks.append(0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            peak = None
+            if tracing:
+                peak = max(peaks.pop(), tracemalloc.get_traced_memory()[1])
+                self._note_peak(peaks, peak)
+            with self._lock:
+                timer = self.timers.setdefault(key, {'seconds': 0.0, 'calls': 0})
+                timer['seconds'] += elapsed
+                timer['calls'] += 1
+                if peak is not None:
+                    timer['peak_bytes'] = max(timer.get('peak_bytes', 0), peak)
+
+    def _note_peak(self, peaks, peak=None):
+        """Fold the current tracemalloc peak (or `peak`) into the enclosing stage and the run."""
+        if peak is None:
+            peak = tracemalloc.get_traced_memory()[1]
+        if peaks:
+            peaks[-1] = max(peaks[-1], peak)
+        with self._lock:
+            self.peak_traced = max(self.peak_traced, peak)
+
+    def traced_peak(self):
+        """Peak traced memory of the whole run, including peaks reset by stages."""
+        self._note_peak(None)
+        return self.peak_traced
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'timers': {k: dict(v, seconds=round(v['seconds'], 4)) for k, v in self.timers.items()},
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges),
+            }
+
+    def merge(self, snapshot, prefix=''):
+        """Add a snapshot (e.g. from a worker process) to this registry."""
+        with self._lock:
+            for key, v in snapshot['timers'].items():
+                timer = self.timers.setdefault(prefix + key, {'seconds': 0.0, 'calls': 0})
+                timer['seconds'] += v['seconds']
+                timer['calls'] += v['calls']
+                if 'peak_bytes' in v:
+                    timer['peak_bytes'] = max(timer.get('peak_bytes', 0), v['peak_bytes'])
+            for key, n in snapshot['counters'].items():
+                self.counters[key] = self.counters.get(key, 0) + n
+            self.gauges.update(snapshot['gauges'])
+
+
+_current = Metrics()
+
+
+def current():
+    return _current
+
+
+def stage(name, parent=None):
+    return _current.stage(name, parent)
+
+
+def path():
+    return _current.path()
+
+
+def count(name, n=1):
+    _current.count(name, n)
+
+
+def gauge(name, value):
+    _current.gauge(name, value)
+
+
+def collect(fn, *args, **kwargs):
+    """Run fn with a fresh registry; returns (result, snapshot).
+
+    Submit this to a process pool instead of fn and pass the result to
+    merge(), so counters recorded in the worker are not lost. Only for
+    process pools: it swaps the module-wide registry.
+    """
+    global _current
+    previous, _current = _current, Metrics()
+    try:
+        return fn(*args, **kwargs), _current.snapshot()
+    finally:
+        _current = previous
+
+
+def merge(collected, parent=''):
+    """Fold a collect() result into the current run (timers under `parent`) and return fn's result."""
+    result, snapshot = collected
+    _current.merge(snapshot, prefix=f'{parent}/' if parent else '')
+    return result
+
+
+# ============================================================================
+# RUN RECORDS
+# ============================================================================
+
+def add_arguments(parser):
+    group = parser.add_argument_group('instrumentation')
+    group.add_argument('--metrics', metavar='PATH',
+                       help='append the run metrics to this JSONL file (default scripts/metrics/<script>.jsonl)')
+    group.add_argument('--profile', action='store_true', help='profile the run with cProfile')
+    group.add_argument('--trace-memory', action='store_true', help='trace allocations with tracemalloc')
+
+
+def _peak_rss():
+    """Peak resident set size in bytes, where the platform reports it."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+@contextmanager
+def run(script, args=None):
+    """Record one run of `script`: fresh registry, optional profilers, JSONL record on exit."""
+    global _current
+    _current = Metrics()
+    metrics_path = getattr(args, 'metrics', None) or os.path.join(METRICS_DIR, f'{script}.jsonl')
+    profile = cProfile.Profile() if getattr(args, 'profile', False) else None
+    trace_memory = getattr(args, 'trace_memory', False)
+
+    started = datetime.now(timezone.utc)
+    start = time.perf_counter()
+    if trace_memory:
+        tracemalloc.start()
+    if profile:
+        profile.enable()
+    status = 'ok'
+    try:
+        yield _current
+    except BaseException as e:
+        status = 'interrupted' if isinstance(e, KeyboardInterrupt) else f'error: {type(e).__name__}'
+        raise
+    finally:
+        if profile:
+            profile.disable()
+        record = {
+            'script': script,
+            'started': started.isoformat(timespec='seconds'),
+            'seconds': round(time.perf_counter() - start, 3),
+            'status': status,
+            'argv': sys.argv[1:],
+            'python': sys.version.split()[0],
+            **_current.snapshot(),
+            'peak_rss_bytes': _peak_rss(),
+        }
+        if trace_memory:
+            snapshot = tracemalloc.take_snapshot()
+            record['peak_memory_bytes'] = _current.traced_peak()
+            record['top_allocations'] = [
+                {'site': str(stat.traceback[0]), 'bytes': stat.size, 'count': stat.count}
+                for stat in snapshot.statistics('lineno')[:10]
+            ]
+            tracemalloc.stop()
+        if profile:
+            prof_path = os.path.join(os.path.dirname(os.path.abspath(metrics_path)),
+                                     f'{script}-{started:%Y%m%d-%H%M%S}.prof')
+            os.makedirs(os.path.dirname(prof_path), exist_ok=True)
+            profile.dump_stats(prof_path)
+            record['profile'] = prof_path
+            out = io.StringIO()
+            pstats.Stats(profile, stream=out).sort_stats('cumulative').print_stats(PROFILE_TOP)
+            print(out.getvalue())
+
+        os.makedirs(os.path.dirname(os.path.abspath(metrics_path)), exist_ok=True)
+        with open(metrics_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+        print_summary(record)
+
+
+def print_summary(record):
+    print(f'\nMetrics ({record["seconds"]:.1f}s, {record["status"]}):')
+    for key, timer in sorted(record['timers'].items()):
+        indent = '  ' * key.count('/')
+        peak = f'  {timer["peak_bytes"] / 1024 / 1024:>7.1f}M peak' if 'peak_bytes' in timer else ''
+        calls = f'  x{timer["calls"]}' if timer['calls'] > 1 else ''
+        print(f'  {indent}{key.rsplit("/", 1)[-1]:<{28 - len(indent)}} {timer["seconds"]:>8.2f}s{peak}{calls}')
+    for key, value in sorted({**record['counters'], **record['gauges']}.items()):
+        print(f'  {key:<28} {value:>10}')
+    if record.get('peak_memory_bytes') is not None:
+        print(f'  {"peak traced memory":<28} {record["peak_memory_bytes"] / 1024 / 1024:>9.1f}M')
@@ -0,0 +1,132 @@
+"""
+Append-only progress journal shared by the image scripts.
+
+Each finished SKU is one JSON line appended (and flushed) the moment it
+completes, so a crash loses at most the line being written and resuming
+never redoes finished work. Lines carry the stats increments of that SKU,
+so totals are rebuilt by replaying the file. Every `compact_every` appends
+(and on close) the journal is rewritten as a single snapshot line through
+a temp file + os.replace, which keeps it from growing without bound.
+
+File format (one JSON object per line):
+    {"snapshot": {"completed": ["SKU", ...], "stats": {"downloaded": 12, ...}}}
+    {"sku": "B132", "stats": {"downloaded": 2}}
+
+Usage:
+    with ProgressJournal(SCRIPT_DIR / 'web_scrape_progress.jsonl',
+                         stats={'downloaded': 0, 'errors': 0}) as journal:
+        if sku not in journal.completed:
+            ...
+            journal.mark_done(sku, downloaded=2)
+"""
+
+import json
+import os
+import threading
+
+COMPACT_EVERY = 1000
+
+
+class ProgressJournal:
+    """Set of completed SKUs plus cumulative stats, persisted as a JSONL journal."""
+
+    def __init__(self, path, stats=None, legacy_path=None, legacy_key='completed',
+                 compact_every=COMPACT_EVERY):
+        self.path = str(path)
+        self.completed = set()
+        self.stats = dict(stats or {})
+        self.compact_every = compact_every
+        self._appended = 0
+        self._lock = threading.Lock()
+        self._file = None
+
+        if os.path.exists(self.path):
+            self._replay()
+        elif legacy_path and os.path.exists(legacy_path):
+            self._import_legacy(legacy_path, legacy_key)
+        self.compact()
+
+    # -- loading ----------------------------------------------------------
+
+    def _replay(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn last line from a crash mid-write
+                if 'snapshot' in entry:
+                    self.completed = set(entry['snapshot'].get('completed', []))
+                    self.stats.update(entry['snapshot'].get('stats', {}))
+                else:
+                    self.completed.add(entry['sku'])
+                    self._add_stats(entry.get('stats', {}))
+
+    def _import_legacy(self, legacy_path, legacy_key):
+        """Adopt the progress of the old whole-file JSON format."""
+        with open(legacy_path, 'r', encoding='utf-8') as f:
+            legacy = json.load(f)
+        self.completed = set(legacy.get(legacy_key, []))
+        self.stats.update(legacy.get('stats', {}))
+        print(f'Imported {len(self.completed)} completed SKUs from {os.path.basename(legacy_path)}')
+
+    def _add_stats(self, delta):
+        for key, value in delta.items():
+            self.stats[key] = self.stats.get(key, 0) + value
+
+    # -- writing ----------------------------------------------------------
+
+    def mark_done(self, sku, **stats):
+        """Record a finished SKU and its stats increments (one appended line)."""
+        entry = {'sku': sku}
+        delta = {k: v for k, v in stats.items() if v}
+        if delta:
+            entry['stats'] = delta
+        line = json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n'
+        with self._lock:
+            self.completed.add(sku)
+            self._add_stats(stats)
+            self._file.write(line)
+            self._file.flush()
+            self._appended += 1
+            if self._appended >= self.compact_every:
+                self._compact_locked()
+
+    def forget(self, skus):
+        """Mark SKUs as not done (e.g. their files were quarantined) so the next run redoes them."""
+        with self._lock:
+            forgotten = self.completed & set(skus)
+            if forgotten:
+                self.completed -= forgotten
+                self._compact_locked()
+            return len(forgotten)
+
+    def compact(self):
+        """Rewrite the journal as a single snapshot line."""
+        with self._lock:
+            self._compact_locked()
+
+    def _compact_locked(self):
+        if self._file:
+            self._file.close()
+        snapshot = {'snapshot': {'completed': sorted(self.completed), 'stats': self.stats}}
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(snapshot, ensure_ascii=False, separators=(',', ':')) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._appended = 0
+
+    def close(self):
+        if self._file:
+            self.compact()
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -8,19 +8,26 @@ Only targets products that:
 
 Usage:
     python scripts/scrape_web_images.py
+    python scripts/scrape_web_images.py --race-urls --page-workers 8 --image-workers 16
+    python scripts/scrape_web_images.py --dedupe      # write into the image store
 """
 
+import argparse
 import os
 import re
 import sys
-import time
 import json
-import sqlite3
-import requests
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
-from bs4 import BeautifulSoup
 from urllib.parse import urlparse
 
+import catalog_db
+from gallery_extract import CHUNK_SIZE, ENGINES, extract_gallery_images, resolve_engine
+import instrumentation
+from http_pool import PoliteClient, iter_body
+from image_store import ImageStore
+from progress_journal import ProgressJournal
+
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8', errors='replace')
 
@@ -30,9 +37,14 @@ PROJECT_DIR = SCRIPT_DIR.parent
 OUTPUT_DIR = PROJECT_DIR / 'public' / 'images' / 'products'
 DB_PATH = Path(r'C:\Users\Ralfs\Desktop\Webpagecopy\data\products.db')
 PRODUCTS_JSON = PROJECT_DIR / 'data' / 'products.json'
-PROGRESS_FILE = SCRIPT_DIR / 'web_scrape_progress.json'
-
-DELAY = 0.3
+PROGRESS_FILE = SCRIPT_DIR / 'web_scrape_progress.jsonl'
+LEGACY_PROGRESS_FILE = SCRIPT_DIR / 'web_scrape_progress.json'
+
+# Concurrency / politeness
+PAGE_WORKERS = 4     # concurrent product page fetches
+IMAGE_WORKERS = 8    # concurrent image downloads
+PER_HOST = 4         # concurrent requests per host (hairsera.lv, hairsera.lt, CDN)
+RATE = 3.0           # requests per second per host
 HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
     'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
@@ -40,6 +52,11 @@ HEADERS = {
 
 IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp'}
 
+client = PoliteClient(per_host=PER_HOST, rate=RATE, setup=lambda s: s.headers.update(HEADERS))
+
+# Content-addressed image store (set by --dedupe)
+store = None
+
 
 def get_full_size_url(url):
     """Convert thumbnail URL to full-size image URL."""
@@ -48,66 +65,133 @@ def get_full_size_url(url):
     return url
 
 
-def scrape_product_images(url, session):
-    """Scrape product images from a hairsera.lv or .lt product page."""
+def scrape_product_images(url, engine='auto'):
+    """Scrape product images from a hairsera.lv or .lt product page.
+
+    The page is streamed through gallery_extract and the connection is
+    dropped as soon as the product gallery has been parsed.
+    """
     try:
-        response = session.get(url, headers=HEADERS, timeout=30)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
+        with instrumentation.stage('page'), client.open('GET', url, timeout=30, stream=True) as response:
+            response.raise_for_status()
+            srcs = extract_gallery_images(iter_body(response, CHUNK_SIZE), engine,
+                                          response.encoding or 'utf-8')
+        instrumentation.count('pages.parsed')
     except Exception as e:
+        instrumentation.count('pages.failed')
         return []
 
-    images = set()
+    images = []
+    for src in srcs:
+        full = get_full_size_url(src)
+        if full not in images:
+            images.append(full)
+    return images
 
-    # Main product image
-    main_img = soup.select_one('.woocommerce-product-gallery__image img, .wp-post-image')
-    if main_img:
-        src = main_img.get('data-large_image') or main_img.get('data-src') or main_img.get('src', '')
-        if src and 'placeholder' not in src.lower():
-            images.add(get_full_size_url(src))
 
-    # Gallery images
-    for img in soup.select('.woocommerce-product-gallery__image img, .product-gallery img'):
-        src = img.get('data-large_image') or img.get('data-src') or img.get('src', '')
-        if src and 'placeholder' not in src.lower():
-            images.add(get_full_size_url(src))
+def download_image(url, filepath):
+    """Download image to filepath.
 
-    return list(images)
+    The body goes to a .part file that replaces filepath only when complete,
+    so an interrupted download never leaves a truncated image behind.
+    """
+    tmp_path = filepath.with_name(filepath.name + '.part')
+    try:
+        with instrumentation.stage('image'), client.open('GET', url, timeout=30, stream=True) as response:
+            response.raise_for_status()
+
+            content_type = response.headers.get('content-type', '')
+            if 'image' not in content_type and 'octet' not in content_type:
+                return False
+
+            filepath.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                for chunk in iter_body(response, 65536):
+                    f.write(chunk)
+        os.replace(tmp_path, filepath)
+        return True
+    except Exception as e:
+        print(f'    ERROR: {e}')
+        tmp_path.unlink(missing_ok=True)
+        return False
 
 
-def download_image(url, filepath, session):
-    """Download image to filepath."""
-    try:
-        response = session.get(url, headers=HEADERS, timeout=30, stream=True)
-        response.raise_for_status()
+def fetch_image(sku, img_url, filename):
+    """Download one product image unless the SKU already has it.
 
-        content_type = response.headers.get('content-type', '')
-        if 'image' not in content_type and 'octet' not in content_type:
-            return False
+    With the image store, an image URL that was downloaded before (for any
+    SKU) is linked to the stored copy instead of being fetched again.
+    """
+    filepath = OUTPUT_DIR / sku / filename
+    if filepath.exists() or (store is not None and store.has(sku, filename)):
+        return True
+    if store is None:
+        return download_image(img_url, filepath)
 
-        filepath.parent.mkdir(parents=True, exist_ok=True)
-        with open(filepath, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
+    source = f'url:{img_url}'
+    sha1 = store.known(source)
+    if sha1:
+        store.link(sku, filename, sha1, [source])
         return True
-    except Exception as e:
-        print(f'    ERROR: {e}')
+    tmp_path = store.staging_path(filename)
+    if not download_image(img_url, tmp_path):
+        tmp_path.unlink(missing_ok=True)
         return False
+    store.add_file(sku, filename, tmp_path, [source])
+    return True
 
 
-def load_progress():
-    if PROGRESS_FILE.exists():
-        with open(PROGRESS_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {'completed': [], 'stats': {'downloaded': 0, 'no_images': 0, 'errors': 0}}
+def image_filename(sku, img_url, index, count):
+    ext = os.path.splitext(urlparse(img_url).path)[1].lower()
+    if ext not in IMAGE_EXTENSIONS:
+        ext = '.jpg'
+    return f'{sku}{ext}' if count == 1 else f'{sku}_{index + 1}{ext}'
 
 
-def save_progress(progress):
-    with open(PROGRESS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(progress, f, ensure_ascii=False, indent=2)
+def open_progress():
+    """Progress journal of completed SKUs (adopts the old JSON progress file)."""
+    return ProgressJournal(PROGRESS_FILE, stats={'downloaded': 0, 'no_images': 0, 'errors': 0},
+                           legacy_path=LEGACY_PROGRESS_FILE, legacy_key='completed')
 
 
 def main():
+    parser = argparse.ArgumentParser(description='Scrape missing product images from hairsera.lv/.lt.')
+    parser.add_argument('--page-workers', type=int, default=PAGE_WORKERS,
+                        help=f'concurrent product page fetches (default {PAGE_WORKERS})')
+    parser.add_argument('--image-workers', type=int, default=IMAGE_WORKERS,
+                        help=f'concurrent image downloads (default {IMAGE_WORKERS})')
+    parser.add_argument('--per-host', type=int, default=PER_HOST,
+                        help=f'max concurrent requests per host (default {PER_HOST})')
+    parser.add_argument('--rate', type=float, default=RATE,
+                        help=f'max requests per second per host, 0 = unlimited (default {RATE})')
+    parser.add_argument('--race-urls', action='store_true',
+                        help='fetch the LV and LT pages of a product in parallel and use the '
+                             'first that yields images (default: LT only if LV has none)')
+    parser.add_argument('--parser', choices=ENGINES, default='auto',
+                        help='HTML extraction engine: lxml if installed, else html.parser '
+                             '(streaming); soup = full BeautifulSoup parse (default auto)')
+    parser.add_argument('--dedupe', action='store_true',
+                        help='store images once per content hash in public/images/blobs/ '
+                             '(see image_store.py) and never fetch the same image URL twice')
+    parser.add_argument('--db', default=str(DB_PATH), help='path to products.db')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    global store
+    if args.dedupe:
+        store = ImageStore()
+    try:
+        engine = resolve_engine(args.parser)
+    except ValueError as e:
+        parser.error(str(e))
+
+    client.configure(per_host=args.per_host, rate=args.rate)
+
+    with instrumentation.run('scrape_web_images', args):
+        scrape(args, engine)
+
+
+def scrape(args, engine):
     print('=' * 60)
     print('  Hairsera Web Image Scraper')
     print('=' * 60)
@@ -116,19 +200,18 @@ def main():
     with open(PRODUCTS_JSON, 'r', encoding='utf-8') as f:
         products = json.load(f)
 
-    no_images = {p['sku'].strip().upper(): p for p in products
+    no_images = {catalog_db.sku_key(p['sku']): p for p in products
                  if not any(i.startswith('/') for i in p.get('images', []))}
 
     # Get source URLs from DB
-    conn = sqlite3.connect(str(DB_PATH))
-    c = conn.cursor()
-    c.execute('SELECT sku, source_url_lv, source_url_lt FROM products')
+    conn = catalog_db.connect(args.db)
 
     targets = []
-    for sku, url_lv, url_lt in c.fetchall():
+    for row, _ in catalog_db.iter_products(conn, with_images=False):
+        sku, url_lv, url_lt = row['sku'], row['source_url_lv'], row['source_url_lt']
         if not sku:
             continue
-        sku_upper = sku.strip().upper()
+        sku_upper = catalog_db.sku_key(sku)
         if sku_upper in no_images:
             urls = []
             if url_lv and url_lv.strip():
@@ -137,76 +220,93 @@ def main():
                 urls.append(url_lt.strip())
             if urls:
                 targets.append((sku.strip(), urls))
-    conn.close()
 
     print(f'\nProducts missing images: {len(no_images)}')
     print(f'Products with web URLs to scrape: {len(targets)}')
 
     # Load progress
-    progress = load_progress()
-    completed = set(progress['completed'])
-    stats = progress['stats']
+    progress = open_progress()
+    completed = progress.completed
+    stats = progress.stats
     print(f'Previously completed: {len(completed)}')
-
-    session = requests.Session()
-
-    for i, (sku, urls) in enumerate(targets):
-        if sku.upper() in completed:
-            continue
-
-        # Try each URL until we find images
-        all_image_urls = []
-        for url in urls:
-            image_urls = scrape_product_images(url, session)
-            if image_urls:
-                all_image_urls = image_urls
-                break
-            time.sleep(DELAY)
-
-        if not all_image_urls:
-            stats['no_images'] += 1
-            completed.add(sku.upper())
-            continue
-
-        # Download images
-        sku_dir = OUTPUT_DIR / sku
-        downloaded = 0
-        for j, img_url in enumerate(all_image_urls):
-            ext = os.path.splitext(urlparse(img_url).path)[1].lower()
-            if ext not in IMAGE_EXTENSIONS:
-                ext = '.jpg'
-
-            if len(all_image_urls) == 1:
-                filename = f'{sku}{ext}'
-            else:
-                filename = f'{sku}_{j+1}{ext}'
-
-            filepath = sku_dir / filename
-            if filepath.exists():
-                downloaded += 1
+    print(f'HTML parser: {engine}')
+
+    # Two bounded stages: page fetch/parse, then image download. The main
+    # thread routes results between them; per-host limits live in `client`.
+    pending_urls = {}    # sku -> URLs not yet requested
+    open_pages = {}      # sku -> page futures still running
+    resolved = set()     # skus whose images have been chosen
+    image_jobs = {}      # sku -> [images total, finished, downloaded]
+    futures = {}         # future -> ('page', sku) | ('image', sku)
+
+    with ThreadPoolExecutor(max_workers=args.page_workers) as page_pool, \
+            ThreadPoolExecutor(max_workers=args.image_workers) as image_pool:
+
+        def request_page(sku):
+            url = pending_urls[sku].pop(0)
+            fut = page_pool.submit(scrape_product_images, url, engine)
+            futures[fut] = ('page', sku)
+            open_pages[sku].add(fut)
+
+        for sku, urls in targets:
+            if catalog_db.sku_key(sku) in completed:
                 continue
-
-            if download_image(img_url, filepath, session):
-                downloaded += 1
-            time.sleep(DELAY / 2)
-
-        if downloaded:
-            stats['downloaded'] += downloaded
-            print(f'  [{i+1}/{len(targets)}] {sku}: {downloaded} images')
-        else:
-            stats['errors'] += 1
-
-        completed.add(sku.upper())
-
-        if len(completed) % 50 == 0:
-            progress['completed'] = list(completed)
-            progress['stats'] = stats
-            save_progress(progress)
-
-    # Save final progress
-    progress['completed'] = list(completed)
-    progress['stats'] = stats
-    save_progress(progress)
+            pending_urls[sku] = list(urls)
+            open_pages[sku] = set()
+        # Racing queues every product's first URL before any second one, so a
+        # losing page is usually still queued (and cancelled) when its product resolves
+        rounds = max(map(len, pending_urls.values()), default=0) if args.race_urls else 1
+        for _ in range(rounds):
+            for sku, urls in pending_urls.items():
+                if urls:
+                    request_page(sku)
+
+        total = len(pending_urls)
+        print(f'Scraping {total} products...')
+        done_count = 0
+
+        while futures:
+            finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                kind, sku = futures.pop(fut)
+
+                if kind == 'page':
+                    open_pages[sku].discard(fut)
+                    image_urls = [] if fut.cancelled() else fut.result()
+                    if sku in resolved:
+                        continue  # another URL of this product already won
+                    if image_urls:
+                        resolved.add(sku)
+                        for other in open_pages[sku]:
+                            other.cancel()  # losing race; ignored if already running
+                        image_jobs[sku] = [len(image_urls), 0, 0]
+                        for j, img_url in enumerate(image_urls):
+                            filename = image_filename(sku, img_url, j, len(image_urls))
+                            job = image_pool.submit(fetch_image, sku, img_url, filename)
+                            futures[job] = ('image', sku)
+                    elif pending_urls[sku]:
+                        request_page(sku)
+                    elif not open_pages[sku]:
+                        done_count += 1
+                        progress.mark_done(catalog_db.sku_key(sku), no_images=1)
+                        instrumentation.count('products.no_images')
+
+                else:
+                    job = image_jobs[sku]
+                    job[1] += 1
+                    job[2] += 1 if fut.result() else 0
+                    if job[1] == job[0]:
+                        done_count += 1
+                        if job[2]:
+                            print(f'  [{done_count}/{total}] {sku}: {job[2]} images')
+                        progress.mark_done(catalog_db.sku_key(sku), downloaded=job[2], errors=0 if job[2] else 1)
+                        instrumentation.count('images.downloaded', job[2])
+                        if store is not None and done_count % 50 == 0:
+                            store.save()
+
+    progress.close()
+    if store is not None:
+        store.save()
 
     print(f'\n{"=" * 60}')
     print(f'  SCRAPING COMPLETE')
@@ -214,6 +314,7 @@ def main():
     print(f'  Images downloaded: {stats["downloaded"]}')
     print(f'  Products with no images found: {stats["no_images"]}')
     print(f'  Errors: {stats["errors"]}')
+    print(f'  HTTP requests this run: {client.requests_made}')
 
 
 if __name__ == '__main__':
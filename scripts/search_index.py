@@ -0,0 +1,59 @@
+"""
+Search index emitted by export_data.py next to products.json.
+
+Maps every character trigram of the searchable product fields to the ids of
+the products containing it, so src/lib/data.ts can answer a substring query
+by intersecting a few posting lists instead of scanning the whole catalog.
+
+Text is lowercased and diacritic-folded (ā -> a, š -> s, ...) on both sides,
+so "zavetajs" finds "Matu žāvētājs". Grams never span two fields. SKU
+prefixes and inner fragments are covered the same way as name fragments.
+
+Format (data/search-index.json):
+    {"version": 1, "gramSize": 3, "fields": [...], "total": N,
+     "grams": {"<gram>": [first_id, delta, delta, ...]}}
+
+Posting lists are sorted and delta-encoded to keep the file small.
+"""
+
+import unicodedata
+
+SEARCH_INDEX_NAME = 'search-index.json'
+SEARCH_FIELDS = ('name_lv', 'name_en', 'sku')
+GRAM_SIZE = 3
+
+
+def fold(text):
+    """Lowercase and strip diacritics; mirrors foldText() in src/lib/data.ts."""
+    decomposed = unicodedata.normalize('NFD', text.lower())
+    return ''.join(ch for ch in decomposed if not '\u0300' <= ch <= '\u036f')
+
+
+def product_grams(product, gram_size=GRAM_SIZE):
+    """All distinct grams of a product's searchable fields."""
+    grams = set()
+    for field in SEARCH_FIELDS:
+        text = fold(product.get(field) or '')
+        grams.update(text[i:i + gram_size] for i in range(len(text) - gram_size + 1))
+    return grams
+
+
+def build_search_index(products, gram_size=GRAM_SIZE):
+    """Build the gram -> product id index for a list of exported products."""
+    postings = {}
+    for p in products:
+        for gram in product_grams(p, gram_size):
+            postings.setdefault(gram, []).append(p['id'])
+
+    grams = {}
+    for gram in sorted(postings):
+        ids = sorted(postings[gram])
+        grams[gram] = [ids[0]] + [b - a for a, b in zip(ids, ids[1:])]
+
+    return {
+        'version': 1,
+        'gramSize': gram_size,
+        'fields': list(SEARCH_FIELDS),
+        'total': len(products),
+        'grams': grams,
+    }
@@ -0,0 +1,123 @@
+"""
+SKU normalization and alias lookup shared by the catalog scripts.
+
+SKUs arrive in several spellings: with non-breaking spaces from the web
+catalog ('B132 \\xa0 \\xa0 \\xa0B133'), as several codes in one cell
+('B348 B349 B350 B351'), or with a label ('Prekės kodai: UG04E UG05E').
+Exact `.strip().upper()` lookups silently miss those records.
+
+normalize_sku() collapses every whitespace run (including nbsp) to one space
+and upper-cases; split_skus() breaks a multi-SKU string into its codes. Both
+are memoized. SkuIndex maps every alias (normalized form and, for multi-SKU
+strings, each code) to a canonical key once, so lookups are a dict access:
+
+    index = SkuIndex(products.keys())
+    index.resolve('b348')                  # -> 'B348 B349 B350 B351'
+    overrides = AliasMap(SKU_CATEGORY_OVERRIDES)
+    overrides.get('B348 B349 B350 \\xa0B351')   # -> 1
+
+An exact SKU always wins over a code split out of a multi-SKU string; a code
+claimed by two multi-SKU strings resolves to the first one added.
+"""
+
+import re
+from functools import lru_cache
+
+_WHITESPACE = re.compile(r'\s+')
+_LABEL = re.compile(r'^[^\d:]*:\s*')          # 'Prekės kodai: ' before the codes
+_CODE = re.compile(r'^(?=.*\d)[A-Z0-9][A-Z0-9/.\-]*$')  # one code: has a digit, no spaces
+
+
+@lru_cache(maxsize=None)
+def normalize_sku(sku):
+    """Canonical spelling: whitespace runs (incl. nbsp) collapsed, stripped, upper-case."""
+    if sku is None:
+        return None
+    sku = _WHITESPACE.sub(' ', str(sku)).strip().upper()
+    return sku or None
+
+
+@lru_cache(maxsize=None)
+def split_skus(sku):
+    """The individual codes of a multi-SKU string, or () for a single SKU.
+
+    'B348 B349 B350 B351' and 'PREKĖS KODAI: UG04E UG05E' split; names
+    with spaces such as 'HC TRAVEL DRY SHAMPOO' (words without digits) do not.
+    """
+    key = normalize_sku(sku)
+    if not key:
+        return ()
+    parts = _LABEL.sub('', key).split(' ')
+    if len(parts) < 2 and parts[0] == key:
+        return ()
+    if all(_CODE.match(part) for part in parts):
+        return tuple(parts)
+    return ()
+
+
+class SkuIndex:
+    """Alias -> canonical SKU key, built once for a set of SKUs."""
+
+    def __init__(self, skus=()):
+        self._aliases = {}
+        self._exact = set()
+        self.ambiguous = set()
+        for sku in skus:
+            self.add(sku)
+
+    def add(self, sku, canonical=None):
+        """Register sku (and its split codes) as aliases of `canonical` (default: sku itself)."""
+        key = normalize_sku(sku)
+        if not key:
+            return None
+        canonical = canonical if canonical is not None else key
+        self._aliases[key] = canonical
+        self._exact.add(key)
+        for part in split_skus(key):
+            if part in self._exact:
+                continue
+            owner = self._aliases.setdefault(part, canonical)
+            if owner != canonical:
+                self.ambiguous.add(part)
+        return canonical
+
+    def resolve(self, sku):
+        """Canonical key for any spelling of a known SKU, else None.
+
+        A multi-SKU query resolves through its first known code.
+        """
+        key = normalize_sku(sku)
+        if not key:
+            return None
+        found = self._aliases.get(key)
+        if found is None:
+            for part in split_skus(key):
+                found = self._aliases.get(part)
+                if found is not None:
+                    break
+        return found
+
+    def __contains__(self, sku):
+        return self.resolve(sku) is not None
+
+    def __len__(self):
+        return len(self._exact)
+
+
+class AliasMap:
+    """A {sku: value} mapping looked up through a SkuIndex."""
+
+    def __init__(self, mapping):
+        self.index = SkuIndex()
+        self.values = {}
+        for sku, value in mapping.items():
+            key = self.index.add(sku)
+            if key:
+                self.values[key] = value
+
+    def get(self, sku, default=None):
+        key = self.index.resolve(sku)
+        return self.values[key] if key is not None else default
+
+    def __contains__(self, sku):
+        return self.index.resolve(sku) is not None
@@ -0,0 +1,84 @@
+"""
+Sort-merge join over SKU-ordered streams and compact record classes.
+
+export_data.py used to index every source in dicts of dicts and look each
+pricelist row up in them; catalog_history.py diffs two exports. Both now walk
+their inputs once in key order instead:
+
+    for key, db_rows, pricelist_rows in merge_join(db, pricelist, key=attrgetter('key')):
+        ...
+
+merge_join() is a full outer join: every key of either side is yielded once,
+in ascending order, with the (possibly empty) list of rows each side has for
+it. Inputs must already be sorted by the key; a key going backwards raises
+ValueError instead of silently producing a wrong join.
+
+Record is a base for `__slots__` classes: no per-instance __dict__, positional
+or keyword construction, values() for digests and a compact pickle (rows cross
+the process pool in export_data.load_sources).
+"""
+
+import itertools
+
+
+class Record:
+    """Fixed-field record; subclasses only declare `__slots__`."""
+
+    __slots__ = ()
+
+    def __init__(self, *args, **kwargs):
+        for name, value in itertools.zip_longest(self.__slots__, args):
+            if name is None:
+                raise TypeError(f'{type(self).__name__} takes {len(self.__slots__)} fields')
+            setattr(self, name, kwargs.pop(name, value))
+        if kwargs:
+            raise TypeError(f'{type(self).__name__} has no field {next(iter(kwargs))!r}')
+
+    def values(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def to_dict(self, **overrides):
+        return dict(zip(self.__slots__, self.values()), **overrides)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(*(data.get(name) for name in cls.__slots__))
+
+    def __reduce__(self):
+        return type(self), self.values()
+
+    def __repr__(self):
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)
+        return f'{type(self).__name__}({fields})'
+
+
+def _groups(items, key):
+    """(key, [items]) runs of a key-sorted iterable; raises when the order breaks."""
+    previous = None
+    for k, group in itertools.groupby(items, key):
+        if previous is not None and k < previous:
+            raise ValueError(f'merge_join input not sorted: {k!r} after {previous!r}')
+        previous = k
+        yield k, list(group)
+
+
+def merge_join(left, right, key, right_key=None):
+    """Full outer sort-merge join of two key-sorted iterables.
+
+    Yields (key, left_rows, right_rows) for every key present on either side.
+    """
+    left_groups = _groups(left, key)
+    right_groups = _groups(right, right_key or key)
+    lg = next(left_groups, None)
+    rg = next(right_groups, None)
+    while lg is not None or rg is not None:
+        if rg is None or (lg is not None and lg[0] < rg[0]):
+            yield lg[0], lg[1], []
+            lg = next(left_groups, None)
+        elif lg is None or rg[0] < lg[0]:
+            yield rg[0], [], rg[1]
+            rg = next(right_groups, None)
+        else:
+            yield lg[0], lg[1], rg[1]
+            lg = next(left_groups, None)
+            rg = next(right_groups, None)
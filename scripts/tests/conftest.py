@@ -0,0 +1,36 @@
+"""
+Test setup: the scripts import each other as top-level modules (they are run
+as `python scripts/<name>.py`), so scripts/ goes on sys.path here.
+
+The `serve` fixture runs a request handler class on a local HTTP server for
+the downloader tests and returns its base URL.
+
+Usage:
+    python -m pytest scripts/tests
+"""
+
+import os
+import sys
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(handler_class):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), handler_class)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+        servers.append(server)
+        return f'http://127.0.0.1:{server.server_address[1]}'
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
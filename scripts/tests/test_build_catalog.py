@@ -0,0 +1,56 @@
+import pytest
+
+import build_catalog
+from build_catalog import Pipeline, Stage
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.setattr(build_catalog, 'STATE_PATH', str(tmp_path / 'build_state.json'))
+    (tmp_path / 'input.txt').write_text('v1')
+    return tmp_path
+
+
+def pipeline(workdir, runs, **options):
+    stage = Stage('export', lambda ctx: runs.append(options), inputs=[workdir / 'input.txt'], options=options)
+    return Pipeline({'export': stage})
+
+
+def test_unchanged_stage_is_skipped(workdir):
+    runs = []
+    assert pipeline(workdir, runs, compact=False).run()
+    assert pipeline(workdir, runs, compact=False).run()
+    assert runs == [{'compact': False}]
+
+    (workdir / 'input.txt').write_text('v2')
+    assert pipeline(workdir, runs, compact=False).run()
+    assert len(runs) == 2
+
+
+def test_changed_options_run_the_stage_again(workdir):
+    runs = []
+    assert pipeline(workdir, runs, compact=False).run()
+    stale = pipeline(workdir, runs, compact=True)
+    assert stale.why_skip(stale.stages['export']) is None
+    assert stale.run()
+    assert pipeline(workdir, runs, compact=True).run()
+    assert runs == [{'compact': False}, {'compact': True}]
+
+
+def test_unknown_dependency_is_rejected(workdir):
+    stage = Stage('export', lambda ctx: None, deps=['sorces'])
+    with pytest.raises(ValueError, match='sorces'):
+        Pipeline({'export': stage})
+
+
+def test_dependency_cycle_blocks_its_stages(workdir):
+    runs = []
+    stages = {
+        'sources': Stage('sources', lambda ctx: runs.append('sources')),
+        'a': Stage('a', lambda ctx: runs.append('a'), deps=['sources', 'b']),
+        'b': Stage('b', lambda ctx: runs.append('b'), deps=['a']),
+    }
+    pipeline = Pipeline(stages)
+    assert not pipeline.run()
+    assert runs == ['sources']
+    assert pipeline.status == {'sources': 'ran', 'a': 'blocked', 'b': 'blocked'}
@@ -0,0 +1,76 @@
+import json
+
+import catalog_history
+
+
+def products(*rows):
+    return [{'id': i, 'sku': sku, 'name_lv': f'Produkts {sku}', 'price': price, 'images': []}
+            for i, (sku, price) in enumerate(rows, 1)]
+
+
+def test_first_export_adds_every_product(tmp_path):
+    change_set = catalog_history.record_export(products(('A1', 5.0), ('B2', 7.5)),
+                                               path=str(tmp_path / 'history.db'))
+    assert change_set['added'] == ['A1', 'B2']
+    assert change_set['removed'] == [] and change_set['changed'] == {}
+
+
+def test_unchanged_export_records_nothing(tmp_path):
+    db = str(tmp_path / 'history.db')
+    catalog_history.record_export(products(('A1', 5.0), ('B2', 7.5)), path=db)
+    assert catalog_history.record_export(products(('A1', 5.0), ('B2', 7.5)), path=db) is None
+
+
+def test_removing_one_product_is_one_change(tmp_path):
+    db = str(tmp_path / 'history.db')
+    catalog_history.record_export(products(('A1', 5.0), ('B2', 7.5), ('C3', 9.0), ('D4', 1.0)), path=db)
+    # B2 goes away, so C3 and D4 get new ids
+    change_set = catalog_history.record_export(products(('A1', 5.0), ('C3', 9.0), ('D4', 1.0)),
+                                               output_dir=str(tmp_path), path=db)
+    assert change_set['removed'] == ['B2']
+    assert change_set['added'] == [] and change_set['changed'] == {}
+    with open(tmp_path / catalog_history.CHANGES_NAME, encoding='utf-8') as f:
+        assert json.load(f)['removed'] == ['B2']
+
+
+def test_changed_fields_and_price_history(tmp_path):
+    db = str(tmp_path / 'history.db')
+    catalog_history.record_export(products(('A1', 5.0), ('B2', 7.5)), path=db)
+    change_set = catalog_history.record_export(products(('B2', 8.0)), path=db)
+    assert change_set['removed'] == ['A1']
+    assert change_set['changed'] == {'B2': {'price': [7.5, 8.0]}}
+
+    conn = catalog_history.connect(db)
+    history = conn.execute("SELECT old_price, new_price FROM price_history WHERE sku = 'B2' "
+                           'ORDER BY export_id').fetchall()
+    conn.close()
+    assert history == [(None, 7.5), (7.5, 8.0)]
+
+
+def test_rows_stored_with_ids_are_restamped_silently(tmp_path):
+    db = str(tmp_path / 'history.db')
+    catalog_history.record_export(products(('A1', 5.0), ('B2', 7.5)), path=db)
+    conn = catalog_history.connect(db)
+    with conn:
+        for i, sku in enumerate(('A1', 'B2'), 1):
+            record = json.loads(conn.execute('SELECT record FROM products WHERE sku = ?', (sku,)).fetchone()[0])
+            conn.execute("UPDATE products SET digest = 'old', record = ? WHERE sku = ?",
+                         (json.dumps(dict(record, id=i + 10)), sku))
+    conn.close()
+
+    assert catalog_history.record_export(products(('A1', 5.0), ('B2', 7.5)), path=db) is None
+    assert catalog_history.record_export(products(('A1', 5.0), ('B2', 7.5)), path=db) is None
+
+
+def test_missing_changes_file_is_restored(tmp_path):
+    db = str(tmp_path / 'history.db')
+    catalog_history.record_export(products(('A1', 5.0), ('B2', 7.5)), path=db)
+    expected = catalog_history.record_export(products(('A1', 6.0), ('B2', 7.5)),
+                                             output_dir=str(tmp_path), path=db)
+    changes = tmp_path / catalog_history.CHANGES_NAME
+    changes.unlink()
+
+    assert catalog_history.record_export(products(('A1', 6.0), ('B2', 7.5)),
+                                         output_dir=str(tmp_path), path=db) is None
+    with open(changes, encoding='utf-8') as f:
+        assert json.load(f) == expected
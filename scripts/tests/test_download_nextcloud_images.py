@@ -0,0 +1,361 @@
+import argparse
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import quote, unquote, urlparse
+
+import pytest
+
+import download_nextcloud_images as dnl
+from http_pool import PoliteClient, TokenBucket
+
+MTIME = formatdate(1700000000, usegmt=True)
+
+
+class Dav:
+    """In-memory WebDAV tree served by DavHandler.
+
+    `files` maps paths ('A/Images/SKU1/a.jpg') to content; folders are implied.
+    `faults` maps (method, depth, folder or file path) to '500', '403',
+    'timeout' or 'partial' (a 207 whose XML stops mid-response).
+    """
+
+    def __init__(self, files):
+        self.files = dict(files)
+        self.faults = {}
+        self.log = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def is_dir(self, rel):
+        return rel == '' or any(path.startswith(rel + '/') for path in self.files)
+
+    def etag(self, rel):
+        if rel in self.files:
+            return '"%s"' % hashlib.md5(self.files[rel]).hexdigest()[:16]
+        below = sorted((p, c) for p, c in self.files.items() if rel == '' or p.startswith(rel + '/'))
+        return '"%s"' % hashlib.md5(repr(below).encode()).hexdigest()[:16]
+
+    def children(self, rel):
+        prefix = rel + '/' if rel else ''
+        names = {path[len(prefix):].split('/', 1)[0] for path in self.files if path.startswith(prefix)}
+        return [prefix + name for name in sorted(names)]
+
+    def descendants(self, rel):
+        out = []
+        for child in self.children(rel):
+            out.append(child)
+            if self.is_dir(child):
+                out.extend(self.descendants(child))
+        return out
+
+    def response(self, rel):
+        if self.is_dir(rel):
+            href = '/dav/' + quote(rel) + ('/' if rel else '')
+            props = '<d:resourcetype><d:collection/></d:resourcetype>'
+        else:
+            href = '/dav/' + quote(rel)
+            props = f'<d:resourcetype/><d:getcontentlength>{len(self.files[rel])}</d:getcontentlength>'
+        return (f'<d:response><d:href>{href}</d:href><d:propstat><d:prop>{props}'
+                f'<d:getetag>{self.etag(rel)}</d:getetag><d:getlastmodified>{MTIME}</d:getlastmodified>'
+                '</d:prop><d:status>HTTP/1.1 200 OK</d:status></d:propstat></d:response>')
+
+    def requests(self, method=None):
+        return [entry for entry in self.log if method is None or entry[0] == method]
+
+
+def make_handler(dav):
+    class DavHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def reply(self, status, body=b'', headers=()):
+            self.send_response(status)
+            for name, value in headers:
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def start(self, method, depth):
+            self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            rel = unquote(urlparse(self.path).path)[len('/dav/'):].strip('/')
+            with dav.lock:
+                dav.log.append((method, depth, rel))
+                dav.active += 1
+                dav.max_active = max(dav.max_active, dav.active)
+            return rel, dav.faults.get((method, depth, rel))
+
+        def finish_request(self):
+            with dav.lock:
+                dav.active -= 1
+
+        def do_PROPFIND(self):
+            depth = self.headers.get('Depth', '1')
+            rel, fault = self.start('PROPFIND', depth)
+            try:
+                if fault == 'timeout':
+                    time.sleep(1.0)
+                if fault in ('500', '403'):
+                    return self.reply(int(fault))
+                if rel not in dav.files and not dav.is_dir(rel):
+                    return self.reply(404)
+                listed = [rel]
+                if dav.is_dir(rel) and depth == '1':
+                    listed += dav.children(rel)
+                elif dav.is_dir(rel) and depth == 'infinity':
+                    listed += dav.descendants(rel)
+                body = ('<?xml version="1.0"?><d:multistatus xmlns:d="DAV:">'
+                        + ''.join(dav.response(r) for r in listed) + '</d:multistatus>').encode()
+                if fault == 'partial':
+                    body = body[:body.rindex(b'<d:response>') + 40]
+                self.reply(207, body, [('Content-Type', 'application/xml')])
+            finally:
+                self.finish_request()
+
+        def do_GET(self):
+            rel, fault = self.start('GET', '')
+            try:
+                if fault == 'timeout':
+                    time.sleep(1.0)
+                if fault == '500':
+                    return self.reply(500)
+                if rel not in dav.files:
+                    return self.reply(404)
+                time.sleep(0.02)
+                etag = dav.etag(rel)
+                if self.headers.get('If-None-Match') == etag:
+                    return self.reply(304, headers=[('ETag', etag)])
+                self.reply(200, dav.files[rel], [('ETag', etag)])
+            finally:
+                self.finish_request()
+
+    return DavHandler
+
+
+FILES = {
+    'A/Images/SKU1/a.jpg': b'\xff\xd8\xff jpeg a \xff\xd9',
+    'A/Images/SKU1/b.png': b'\x89PNG png b IEND',
+    'A/Images/SKU1/notes.txt': b'not an image',
+    'A/Images/SKU2/c.jpg': b'\xff\xd8\xff jpeg c \xff\xd9',
+    'B/Images/SKU3/d.jpg': b'\xff\xd8\xff jpeg d \xff\xd9',
+}
+
+
+@pytest.fixture
+def dav(serve, monkeypatch, tmp_path):
+    """Point the downloader at an in-memory WebDAV server and temporary state files."""
+    dav = Dav(FILES)
+    base = serve(make_handler(dav))
+    monkeypatch.setattr(dnl, 'WEBDAV_BASE', base + '/dav/')
+    monkeypatch.setattr(dnl, 'BRAND_IMAGE_PATHS', [('A', 'A/Images/'), ('B', 'B/Images/')])
+    monkeypatch.setattr(dnl, 'PROJECT_DIR', tmp_path)
+    monkeypatch.setattr(dnl, 'OUTPUT_DIR', tmp_path / 'products')
+    monkeypatch.setattr(dnl, 'PROGRESS_FILE', tmp_path / 'progress.jsonl')
+    monkeypatch.setattr(dnl, 'LEGACY_PROGRESS_FILE', tmp_path / 'progress.json')
+    monkeypatch.setattr(dnl, 'MANIFEST_FILE', tmp_path / 'manifest.json')
+    monkeypatch.setattr(dnl, 'SYNC_STATE_FILE', tmp_path / 'sync_state.json')
+    monkeypatch.setattr(dnl, 'LIST_TIMEOUT', 0.3)
+    monkeypatch.setattr(dnl, 'DOWNLOAD_TIMEOUT', 0.3)
+    monkeypatch.setattr(dnl, 'client', PoliteClient(per_host=4, rate=0, setup=dnl._setup_session))
+    monkeypatch.setattr(dnl, 'store', None)
+    return dav
+
+
+def run_download(**options):
+    args = argparse.Namespace(workers=4, rate=0, recursive=False, delta=False, prune=False, dedupe=False)
+    for name, value in options.items():
+        setattr(args, name, value)
+    dnl.download(args)
+
+
+def local_files(tmp_path):
+    root = tmp_path / 'products'
+    return sorted(str(p.relative_to(root)) for p in root.rglob('*') if p.is_file())
+
+
+# ============================================================================
+# HTTP POOL
+# ============================================================================
+
+def test_token_bucket_spaces_requests():
+    bucket = TokenBucket(rate=20, capacity=1)
+    start = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    assert time.monotonic() - start >= 5 / 20 * 0.9
+
+
+def test_token_bucket_zero_rate_is_unlimited():
+    bucket = TokenBucket(rate=0)
+    start = time.monotonic()
+    for _ in range(1000):
+        bucket.acquire()
+    assert time.monotonic() - start < 0.5
+
+
+def test_client_caps_concurrent_requests_per_host(dav):
+    client = PoliteClient(per_host=2, rate=0)
+    url = dnl.WEBDAV_BASE + 'A/Images/SKU1/a.jpg'
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        statuses = list(pool.map(lambda _: client.request('GET', url).status_code, range(6)))
+    assert statuses == [200] * 6
+    assert client.requests_made == 6
+    assert dav.max_active <= 2
+
+
+# ============================================================================
+# PROPFIND AND TREE LISTING
+# ============================================================================
+
+def test_propfind_parses_multistatus(dav):
+    entries = dnl.propfind('A/Images/SKU1/', '1')
+    assert [e['path'] for e in entries] == ['A/Images/SKU1/', 'A/Images/SKU1/a.jpg',
+                                            'A/Images/SKU1/b.png', 'A/Images/SKU1/notes.txt']
+    assert entries[0]['is_dir'] and not entries[1]['is_dir']
+    assert entries[1]['size'] == len(FILES['A/Images/SKU1/a.jpg'])
+    assert entries[1]['etag'] == dav.etag('A/Images/SKU1/a.jpg')
+
+
+@pytest.mark.parametrize('fault', ['500', 'timeout', 'partial'])
+def test_propfind_failure_is_none(dav, fault):
+    dav.faults[('PROPFIND', '1', 'A/Images/SKU1')] = fault
+    assert dnl.propfind('A/Images/SKU1/', '1') is None
+
+
+def test_list_tree_depth_infinity(dav):
+    tree = dnl.list_tree('A/Images/')
+    assert tree['']['dirs'] == ['SKU1', 'SKU2']
+    assert sorted(tree['SKU1']['files']) == ['a.jpg', 'b.png', 'notes.txt']
+    assert [(m, d) for m, d, _ in dav.log] == [('PROPFIND', '0'), ('PROPFIND', 'infinity')]
+
+
+def test_list_tree_level_walk_matches_infinity(dav):
+    expected = dnl.list_tree('A/Images/')
+    dav.faults[('PROPFIND', 'infinity', 'A/Images')] = '403'
+    del dav.log[:]
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        assert dnl.list_tree('A/Images/', pool=pool) == expected
+    assert sorted(rel for _, depth, rel in dav.log if depth == '1') == [
+        'A/Images', 'A/Images/SKU1', 'A/Images/SKU2']
+
+
+def test_list_tree_reuses_unchanged_folders(dav):
+    dav.faults[('PROPFIND', 'infinity', 'A/Images')] = '403'
+    previous = dnl.list_tree('A/Images/')
+
+    del dav.log[:]
+    assert dnl.list_tree('A/Images/', previous) is previous
+    assert dav.log == [('PROPFIND', '0', 'A/Images')]
+
+    # Only the changed SKU folder is listed again
+    dav.files['A/Images/SKU2/e.jpg'] = b'\xff\xd8\xff new \xff\xd9'
+    del dav.log[:]
+    tree = dnl.list_tree('A/Images/', previous)
+    assert sorted(tree['SKU2']['files']) == ['c.jpg', 'e.jpg']
+    assert tree['SKU1'] == previous['SKU1']
+    assert sorted(rel for _, depth, rel in dav.log if depth == '1') == ['A/Images', 'A/Images/SKU2']
+
+
+@pytest.mark.parametrize('fault', ['500', 'timeout', 'partial'])
+def test_list_tree_failed_subfolder_is_none(dav, fault):
+    dav.faults[('PROPFIND', 'infinity', 'A/Images')] = '403'
+    dav.faults[('PROPFIND', '1', 'A/Images/SKU2')] = fault
+    assert dnl.list_tree('A/Images/') is None
+
+
+# ============================================================================
+# SKU SYNC
+# ============================================================================
+
+def test_sync_sku_downloads_images_only(dav, tmp_path):
+    result = dnl.sync_sku('SKU1', 'A/Images/SKU1/')
+    assert (result['images'], result['downloaded'], result['errors']) == (2, 2, 0)
+    assert local_files(tmp_path) == ['SKU1/a.jpg', 'SKU1/b.png']
+    assert (tmp_path / 'products' / 'SKU1' / 'a.jpg').read_bytes() == FILES['A/Images/SKU1/a.jpg']
+
+    result = dnl.sync_sku('SKU1', 'A/Images/SKU1/')
+    assert (result['downloaded'], result['skipped']) == (0, 2)
+    assert len(dav.requests('GET')) == 2
+
+
+@pytest.mark.parametrize('fault', ['500', 'timeout'])
+def test_sync_sku_failed_download_leaves_no_file(dav, tmp_path, fault):
+    dav.faults[('GET', '', 'A/Images/SKU1/b.png')] = fault
+    result = dnl.sync_sku('SKU1', 'A/Images/SKU1/')
+    assert (result['downloaded'], result['errors']) == (1, 1)
+    assert local_files(tmp_path) == ['SKU1/a.jpg']
+
+
+def test_delta_refetches_changed_and_prunes_removed(dav, tmp_path):
+    first = dnl.sync_sku('SKU1', 'A/Images/SKU1/', known={}, prune=True)
+    known = first['records']
+    assert sorted(known) == ['a.jpg', 'b.png']
+
+    dav.files['A/Images/SKU1/a.jpg'] = b'\xff\xd8\xff changed \xff\xd9'
+    del dav.files['A/Images/SKU1/b.png']
+    del dav.log[:]
+    result = dnl.sync_sku('SKU1', 'A/Images/SKU1/', known=known, prune=True)
+    assert (result['downloaded'], result['pruned']) == (1, 1)
+    assert result['records']['b.png'] is None
+    assert local_files(tmp_path) == ['SKU1/a.jpg']
+    assert (tmp_path / 'products' / 'SKU1' / 'a.jpg').read_bytes() == b'\xff\xd8\xff changed \xff\xd9'
+    assert dav.requests('GET') == [('GET', '', 'A/Images/SKU1/a.jpg')]
+
+
+@pytest.mark.parametrize('fault', ['500', 'timeout', 'partial'])
+def test_prune_never_runs_against_failed_listing(dav, tmp_path, fault):
+    known = dnl.sync_sku('SKU1', 'A/Images/SKU1/', known={}, prune=True)['records']
+    dav.faults[('PROPFIND', '1', 'A/Images/SKU1')] = fault
+    result = dnl.sync_sku('SKU1', 'A/Images/SKU1/', known=known, prune=True)
+    assert not result['listed']
+    assert (result['errors'], result['pruned'], result['records']) == (1, 0, {})
+    assert local_files(tmp_path) == ['SKU1/a.jpg', 'SKU1/b.png']
+
+
+# ============================================================================
+# FULL RUN
+# ============================================================================
+
+def test_download_fetches_every_brand(dav, tmp_path):
+    run_download()
+    assert local_files(tmp_path) == ['SKU1/a.jpg', 'SKU1/b.png', 'SKU2/c.jpg', 'SKU3/d.jpg']
+    with dnl.open_progress() as progress:
+        assert progress.completed == {'SKU1', 'SKU2', 'SKU3'}
+        assert progress.stats['downloaded'] == 4
+
+    # Completed SKUs are not listed again without --delta
+    del dav.log[:]
+    run_download()
+    assert {rel for _, _, rel in dav.log} == {'A/Images', 'B/Images'}
+
+
+def test_recursive_delta_prune_keeps_files_of_unlisted_folders(dav, tmp_path):
+    dav.faults[('PROPFIND', 'infinity', 'A/Images')] = '403'
+    dav.files['A/Images/SKU2/readme.txt'] = b'keeps the folder when c.jpg goes'
+    run_download(recursive=True, delta=True, prune=True)
+    manifest = json.loads((tmp_path / 'manifest.json').read_text(encoding='utf-8'))
+    assert sorted(manifest['A/Images/']) == ['', 'SKU1', 'SKU2']
+
+    del dav.files['A/Images/SKU1/b.png']
+    del dav.files['A/Images/SKU2/c.jpg']
+    dav.faults[('PROPFIND', '1', 'A/Images/SKU2')] = '500'
+    run_download(recursive=True, delta=True, prune=True)
+
+    # SKU1 was listed and pruned; SKU2 could not be listed, so its file and record stay
+    assert local_files(tmp_path) == ['SKU1/a.jpg', 'SKU2/c.jpg', 'SKU3/d.jpg']
+    state = json.loads((tmp_path / 'sync_state.json').read_text(encoding='utf-8'))
+    assert sorted(state['SKU1']) == ['a.jpg'] and sorted(state['SKU2']) == ['c.jpg']
+    # The incomplete tree was not saved over the previous manifest
+    assert json.loads((tmp_path / 'manifest.json').read_text(encoding='utf-8'))['A/Images/'] == manifest['A/Images/']
+
+    dav.faults.clear()
+    run_download(recursive=True, delta=True, prune=True)
+    assert local_files(tmp_path) == ['SKU1/a.jpg', 'SKU3/d.jpg']
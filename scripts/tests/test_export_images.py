@@ -0,0 +1,33 @@
+import export_data
+
+
+def store_manifest(skus, blobs):
+    return {'version': 1, 'skus': skus, 'sources': {},
+            'blobs': {sha1: {'ext': ext, 'size': 1} for sha1, ext in blobs.items()}}
+
+
+def test_image_lookup_resolves_any_sku_spelling():
+    index = {'B348 B349': {'mtime': 1, 'images': ['/images/products/B348 B349/B348.jpg']}}
+    images_for = export_data.image_lookup(index, store_manifest({}, {}))
+    assert images_for('b348 b349') == ['/images/products/B348 B349/B348.jpg']
+    assert images_for('B349') == ['/images/products/B348 B349/B348.jpg']
+    assert images_for('UG04E') == []
+
+
+def test_image_lookup_merges_store_images_by_name():
+    index = {'UG04E': {'mtime': 1, 'images': ['/images/products/UG04E/UG04E_1.jpg',
+                                              '/images/products/UG04E/UG04E_2.jpg']}}
+    manifest = store_manifest({'UG04E': {'UG04E_2.jpg': 'ab12', 'UG04E_3.png': 'cd34'},
+                               'PL501': {'PL501.jpg': 'ef56'}},
+                              {'ab12': '.jpg', 'cd34': '.png', 'ef56': '.jpg'})
+    images_for = export_data.image_lookup(index, manifest)
+    assert images_for('ug04e') == ['/images/products/UG04E/UG04E_1.jpg',
+                                   '/images/blobs/ab/ab12.jpg',
+                                   '/images/blobs/cd/cd34.png']
+    assert images_for('PL501') == ['/images/blobs/ef/ef56.jpg']
+
+
+def test_store_images_in_formats_the_site_cannot_show_are_skipped():
+    manifest = store_manifest({'A1': {'a.bmp': '11', 'b.tif': '22', 'c.webp': '33'}},
+                              {'11': '.bmp', '22': '.tif', '33': '.webp'})
+    assert export_data.with_store_images('A1', [], manifest) == ['/images/blobs/33/33.webp']
@@ -0,0 +1,91 @@
+import functools
+import json
+import os
+
+import pytest
+
+import bench_export
+import catalog_db
+import catalog_history
+import description_sidecar
+import export_data
+import generate_descriptions
+import image_store
+import image_variants
+import xlsx_snapshot
+from catalog_output import MANIFEST_NAME
+from search_index import SEARCH_INDEX_NAME
+
+
+@pytest.fixture(scope='module')
+def catalog(tmp_path_factory):
+    root = str(tmp_path_factory.mktemp('catalog'))
+    bench_export.generate(root, 60, seed=7)
+    return root
+
+
+@pytest.fixture
+def output_dir(catalog, tmp_path, monkeypatch):
+    """Run export_data on the synthetic catalog with every state file under tmp_path."""
+    catalog_db.close_all()
+    output_dir = tmp_path / 'data'
+    monkeypatch.setattr(export_data, 'DB_PATH', os.path.join(catalog, 'products.db'))
+    monkeypatch.setattr(export_data, 'PRICELIST_PATH', os.path.join(catalog, 'pricelist.xlsx'))
+    monkeypatch.setattr(export_data, 'NEXTCLOUD_PATH', os.path.join(catalog, 'brands.xlsx'))
+    monkeypatch.setattr(export_data, 'LOCAL_IMAGES_DIR', os.path.join(catalog, 'images'))
+    monkeypatch.setattr(export_data, 'OUTPUT_DIR', str(output_dir))
+    monkeypatch.setattr(export_data, 'STATE_PATH', str(tmp_path / 'export_state.json'))
+    monkeypatch.setattr(xlsx_snapshot, 'SNAPSHOT_DB', str(tmp_path / 'xlsx_snapshots.db'))
+    monkeypatch.setattr(catalog_history, 'HISTORY_DB', str(tmp_path / 'catalog_history.db'))
+    monkeypatch.setattr(image_store, 'load_manifest', lambda: {'version': 1, 'blobs': {}, 'skus': {}, 'sources': {}})
+    monkeypatch.setattr(image_variants, 'load_manifest', lambda: {'version': 1, 'images': {}})
+    monkeypatch.setattr(description_sidecar, 'load', lambda: {'version': 1, 'generated': {}, 'translated': {}})
+    yield output_dir
+    catalog_db.close_all()
+
+
+def export(**options):
+    return export_data.export(incremental=True, serial=True, **options)
+
+
+def test_unchanged_sources_skip_the_export(output_dir):
+    assert export() is not None
+    assert export() is None
+
+
+def test_changed_output_options_export_again(output_dir):
+    assert export() is not None
+    assert (output_dir / 'products.json').read_text(encoding='utf-8').startswith('[\n  {')
+
+    assert export(compact=True) is not None
+    assert (output_dir / 'products.json').read_text(encoding='utf-8').startswith('[\n{"')
+    assert export(compact=True) is None
+    assert export() is not None
+
+
+@pytest.mark.parametrize('name', ['categories.json', 'products.json', MANIFEST_NAME, SEARCH_INDEX_NAME,
+                                  catalog_history.CHANGES_NAME, 'shard'])
+def test_missing_output_exports_again(output_dir, name):
+    assert export() is not None
+    if name == 'shard':
+        name = os.path.join('products', sorted(os.listdir(output_dir / 'products'))[0])
+    (output_dir / name).unlink()
+
+    assert export() is not None
+    assert (output_dir / name).exists()
+    assert export() is None
+
+
+def test_descriptions_keep_the_compact_layout(output_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr(generate_descriptions, 'OUTPUT_FILE', str(output_dir / 'products.json'))
+    monkeypatch.setattr(generate_descriptions, 'TranslationCache',
+                        functools.partial(generate_descriptions.TranslationCache, path=str(tmp_path / 'cache.db')))
+    monkeypatch.setattr(description_sidecar, 'save', lambda sidecar: None)
+    categories, products = export(compact=True)
+
+    generate_descriptions.generate(products, categories, backend='stub')
+    assert (output_dir / 'products.json').read_text(encoding='utf-8').startswith('[\n{"')
+    shard = sorted((output_dir / 'products').iterdir())[0]
+    assert shard.read_text(encoding='utf-8').startswith('[\n{"')
+    assert json.loads((output_dir / MANIFEST_NAME).read_text(encoding='utf-8'))['compact'] is True
+    assert export(compact=True) is None
@@ -0,0 +1,75 @@
+from pathlib import Path
+
+import pytest
+
+from gallery_extract import CHUNK_SIZE, etree, extract_gallery_images
+
+FIXTURES = Path(__file__).resolve().parent / 'fixtures'
+
+# What the original BeautifulSoup selectors return for each saved page
+EXPECTED = {
+    'hairsera_lv_product.html': [
+        'https://hairsera.lv/wp-content/uploads/2023/04/B348.jpg',
+        'https://hairsera.lv/wp-content/uploads/2023/04/B348-2.jpg',
+        'https://hairsera.lv/wp-content/uploads/2023/04/B348-iepakojums.jpg?v=2&w=1200',
+        'https://hairsera.lv/wp-content/uploads/2023/04/B348-300x300.jpg',
+        'https://hairsera.lv/wp-content/uploads/2023/04/B348-2-300x300.jpg',
+    ],
+    # Unclosed slide <div>s keep the rest of the page inside .product-gallery
+    'hairsera_lt_product.html': [
+        'https://hairsera.lt/wp-content/uploads/2024/02/UG05E-300x300.jpg',
+        'https://hairsera.lt/wp-content/uploads/2024/02/UG04E-šukos.jpg',
+        'https://hairsera.lt/wp-content/uploads/2024/02/UG04E-2-800x800.jpg',
+        'https://hairsera.lt/wp-content/uploads/2024/02/UG04E-šukos-800x800.jpg',
+        'https://hairsera.lt/wp-content/uploads/2024/02/UG06E-300x300.jpg',
+    ],
+    'hairsera_lv_no_images.html': [],
+}
+
+STREAMING = ['html.parser', pytest.param('lxml', marks=pytest.mark.skipif(etree is None, reason='lxml not installed'))]
+
+
+def chunks(data, size, consumed=None):
+    for i in range(0, len(data), size):
+        if consumed is not None:
+            consumed[0] += min(size, len(data) - i)
+        yield data[i:i + size]
+
+
+@pytest.mark.parametrize('name', sorted(EXPECTED))
+def test_soup_selectors(name):
+    page = (FIXTURES / name).read_bytes()
+    assert extract_gallery_images([page], 'soup') == EXPECTED[name]
+
+
+@pytest.mark.parametrize('size', [CHUNK_SIZE, 256, 7])
+@pytest.mark.parametrize('engine', STREAMING)
+@pytest.mark.parametrize('name', sorted(EXPECTED))
+def test_streaming_engines_match_soup(name, engine, size):
+    page = (FIXTURES / name).read_bytes()
+    assert extract_gallery_images(chunks(page, size), engine) == EXPECTED[name]
+
+
+@pytest.mark.parametrize('engine', STREAMING)
+def test_stops_reading_after_gallery(engine):
+    page = (FIXTURES / 'hairsera_lv_product.html').read_bytes()
+    consumed = [0]
+    extract_gallery_images(chunks(page, 256, consumed), engine)
+    assert consumed[0] < page.index(b'related-products-wrapper')
+
+
+@pytest.mark.parametrize('engine', STREAMING + ['soup'])
+def test_unclosed_tags_inside_gallery_close_with_it(engine):
+    page = (b'<div class="woocommerce-product-gallery"><div class="woocommerce-product-gallery__image">'
+            b'<a href="a.jpg"><img src="a.jpg"></a><p>caption<span>text</div></div>'
+            b'<ul class="related"><li><img src="rel1.jpg"><li><img src="rel2.jpg"></ul>')
+    assert extract_gallery_images(chunks(page, 16), engine) == ['a.jpg']
+
+
+@pytest.mark.parametrize('engine', STREAMING + ['soup'])
+def test_stray_end_tags_are_ignored(engine):
+    page = (b'<div class="woocommerce-product-gallery"></span></p>'
+            b'<div class="woocommerce-product-gallery__image"><img src="a.jpg"></br></div>'
+            b'<div class="woocommerce-product-gallery__image"><img src="b.jpg"></div></div>'
+            b'<div><img src="after.jpg"></div>')
+    assert extract_gallery_images(chunks(page, 16), engine) == ['a.jpg', 'b.jpg']
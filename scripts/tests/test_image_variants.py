@@ -0,0 +1,70 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import image_store
+import image_variants
+
+Image = pytest.importorskip('PIL.Image')
+
+
+@pytest.fixture
+def public(tmp_path, monkeypatch):
+    public = tmp_path / 'public'
+    monkeypatch.setattr(image_variants, 'PUBLIC_DIR', public)
+    monkeypatch.setattr(image_variants, 'PRODUCTS_DIR', public / 'images' / 'products')
+    monkeypatch.setattr(image_variants, 'VARIANTS_DIR', public / 'images' / 'variants')
+    monkeypatch.setattr(image_variants, 'MANIFEST_PATH', public / 'images' / 'image-variants.json')
+    monkeypatch.setattr(image_variants, 'ProcessPoolExecutor', ThreadPoolExecutor)
+    monkeypatch.setattr(image_store, 'load_manifest', lambda: {'version': 1, 'blobs': {}, 'skus': {}, 'sources': {}})
+    sku = public / 'images' / 'products' / 'A1'
+    sku.mkdir(parents=True)
+    Image.effect_noise((600, 400), 64).convert('RGB').save(sku / 'A1.jpg', 'JPEG', quality=95)
+    return public
+
+
+def render(**options):
+    args = argparse.Namespace(workers=1, quality=image_variants.QUALITY, force=False)
+    for name, value in options.items():
+        setattr(args, name, value)
+    image_variants.render_all(args)
+    return image_variants.load_manifest()
+
+
+def detail_file(public, manifest):
+    entry = manifest['images']['/images/products/A1/A1.jpg']
+    return public / entry['variants']['detail']['src'].lstrip('/')
+
+
+def test_unchanged_originals_are_not_rendered_again(public):
+    manifest = render()
+    assert manifest['quality'] == image_variants.QUALITY
+    detail = detail_file(public, manifest)
+    mtime = detail.stat().st_mtime_ns
+
+    assert render() == manifest
+    assert detail.stat().st_mtime_ns == mtime
+
+
+def test_quality_change_rewrites_variants(public):
+    detail = detail_file(public, render())
+    size = detail.stat().st_size
+
+    manifest = render(quality=30)
+    assert manifest['quality'] == 30
+    assert detail.stat().st_size < size
+    assert manifest['images']['/images/products/A1/A1.jpg']['variants']['detail']['bytes'] == detail.stat().st_size
+
+
+def test_force_overwrites_existing_files(public):
+    detail = detail_file(public, render())
+    detail.write_bytes(b'stale')
+    render(force=True)
+    assert detail.read_bytes()[:4] == b'RIFF'
+
+
+def test_store_blob_without_file_is_skipped(public, monkeypatch):
+    store = {'version': 1, 'blobs': {'ab' * 20: {'ext': '.jpg'}}, 'skus': {}, 'sources': {}}
+    monkeypatch.setattr(image_store, 'load_manifest', lambda: store)
+    assert list(render()['images']) == ['/images/products/A1/A1.jpg']
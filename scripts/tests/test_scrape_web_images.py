@@ -0,0 +1,217 @@
+import argparse
+import json
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+import scrape_web_images as swi
+from http_pool import PoliteClient
+
+
+def gallery_page(*images):
+    imgs = ''.join(f'<div class="woocommerce-product-gallery__image"><img src="{src}"></div>'
+                   for src in images)
+    return (f'<html><body><div class="woocommerce-product-gallery">{imgs}</div>'
+            '<p>Related products</p></body></html>').encode()
+
+
+class Site:
+    """Product pages and images served by SiteHandler.
+
+    `pages` maps paths to HTML, `images` maps paths to JPEG bytes, `delays`
+    maps paths to seconds to wait before answering and `truncated` lists
+    image paths whose body stops half way (the connection is closed).
+    """
+
+    def __init__(self):
+        self.pages = {}
+        self.images = {}
+        self.delays = {}
+        self.truncated = set()
+        self.log = []
+        self.lock = threading.Lock()
+
+    def requested(self, prefix):
+        return sorted(path for path in self.log if path.startswith(prefix))
+
+
+def make_handler(site):
+    class SiteHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            with site.lock:
+                site.log.append(self.path)
+            time.sleep(site.delays.get(self.path, 0))
+            if self.path in site.pages:
+                body, content_type = site.pages[self.path], 'text/html; charset=utf-8'
+            elif self.path in site.images:
+                body, content_type = site.images[self.path], 'image/jpeg'
+            else:
+                body, content_type = b'not found', 'text/html'
+            self.send_response(200 if content_type != 'text/html' else 404)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            if self.path in site.truncated:
+                self.wfile.write(body[:len(body) // 2])
+                self.close_connection = True
+                return
+            self.wfile.write(body)
+
+    return SiteHandler
+
+
+def jpeg(label):
+    return b'\xff\xd8\xff' + label.encode() * 200 + b'\xff\xd9'
+
+
+@pytest.fixture
+def site(serve, monkeypatch, tmp_path):
+    site = Site()
+    site.base = serve(make_handler(site))
+    monkeypatch.setattr(swi, 'OUTPUT_DIR', tmp_path / 'products')
+    monkeypatch.setattr(swi, 'PRODUCTS_JSON', tmp_path / 'products.json')
+    monkeypatch.setattr(swi, 'PROGRESS_FILE', tmp_path / 'progress.jsonl')
+    monkeypatch.setattr(swi, 'LEGACY_PROGRESS_FILE', tmp_path / 'progress.json')
+    monkeypatch.setattr(swi, 'client', PoliteClient(per_host=8, rate=0))
+    monkeypatch.setattr(swi, 'store', None)
+    return site
+
+
+def add_products(site, tmp_path, products):
+    """products: {sku: (lv_page or None, lt_page or None)}; writes products.json and products.db."""
+    with open(tmp_path / 'products.json', 'w', encoding='utf-8') as f:
+        json.dump([{'id': i, 'sku': sku, 'images': []} for i, sku in enumerate(products, 1)], f)
+    conn = sqlite3.connect(tmp_path / 'products.db')
+    conn.execute('CREATE TABLE products (id INTEGER PRIMARY KEY, sku TEXT, name_lv TEXT, '
+                 'description_lv TEXT, price REAL, category_id INTEGER, source_url_lv TEXT, source_url_lt TEXT)')
+    for i, (sku, pages) in enumerate(products.items(), 1):
+        urls = []
+        for lang, page in zip(('lv', 'lt'), pages):
+            if page is None:
+                urls.append(None)
+                continue
+            site.pages[f'/{lang}/{sku}'] = page
+            urls.append(f'{site.base}/{lang}/{sku}')
+        conn.execute('INSERT INTO products (id, sku, source_url_lv, source_url_lt) VALUES (?, ?, ?, ?)',
+                     (i, sku, *urls))
+    conn.commit()
+    conn.close()
+
+
+def run_scrape(tmp_path, **options):
+    args = argparse.Namespace(page_workers=2, image_workers=3, race_urls=False, db=str(tmp_path / 'products.db'))
+    for name, value in options.items():
+        setattr(args, name, value)
+    swi.scrape(args, 'html.parser')
+
+
+def local_files(tmp_path):
+    root = tmp_path / 'products'
+    return sorted(str(p.relative_to(root)) for p in root.rglob('*') if p.is_file()) if root.exists() else []
+
+
+# ============================================================================
+# DOWNLOADS
+# ============================================================================
+
+def test_download_image_replaces_file_when_complete(site, tmp_path):
+    site.images['/img/a.jpg'] = jpeg('a')
+    target = tmp_path / 'products' / 'A' / 'A.jpg'
+    assert swi.download_image(f'{site.base}/img/a.jpg', target)
+    assert target.read_bytes() == jpeg('a')
+    assert local_files(tmp_path) == ['A/A.jpg']
+
+
+def test_interrupted_download_keeps_previous_file(site, tmp_path):
+    site.images['/img/a.jpg'] = jpeg('new')
+    site.truncated.add('/img/a.jpg')
+    target = tmp_path / 'products' / 'A' / 'A.jpg'
+    target.parent.mkdir(parents=True)
+    target.write_bytes(jpeg('old'))
+    assert not swi.download_image(f'{site.base}/img/a.jpg', target)
+    assert target.read_bytes() == jpeg('old')
+    assert local_files(tmp_path) == ['A/A.jpg']
+
+
+def test_download_image_rejects_html(site, tmp_path):
+    target = tmp_path / 'products' / 'A' / 'A.jpg'
+    assert not swi.download_image(f'{site.base}/img/missing.jpg', target)
+    assert local_files(tmp_path) == []
+
+
+# ============================================================================
+# PIPELINE
+# ============================================================================
+
+def test_page_and_image_pools_fetch_every_product(site, tmp_path):
+    products = {}
+    for n in range(6):
+        sku = f'S{n}'
+        site.images[f'/img/{sku}_1.jpg'] = jpeg(f'{sku}1')
+        site.images[f'/img/{sku}_2.png'] = jpeg(f'{sku}2')
+        products[sku] = (gallery_page(f'{site.base}/img/{sku}_1.jpg', f'{site.base}/img/{sku}_2.png'), None)
+        site.delays[f'/lv/{sku}'] = 0.02
+    add_products(site, tmp_path, products)
+
+    run_scrape(tmp_path)
+    assert local_files(tmp_path) == sorted(f'S{n}/S{n}_{i}{ext}' for n in range(6)
+                                           for i, ext in ((1, '.jpg'), (2, '.png')))
+    assert (tmp_path / 'products' / 'S3' / 'S3_2.png').read_bytes() == jpeg('S32')
+    with swi.open_progress() as progress:
+        assert progress.completed == {f'S{n}' for n in range(6)}
+        assert progress.stats['downloaded'] == 12
+
+    # Completed products are not requested again
+    del site.log[:]
+    run_scrape(tmp_path)
+    assert site.log == []
+
+
+def test_second_url_is_tried_when_first_has_no_images(site, tmp_path):
+    site.images['/img/b.jpg'] = jpeg('b')
+    add_products(site, tmp_path, {
+        'A': (gallery_page(), gallery_page(f'{site.base}/img/b.jpg')),
+        'C': (gallery_page(), gallery_page()),
+    })
+    run_scrape(tmp_path)
+    assert local_files(tmp_path) == ['A/A.jpg']
+    assert site.requested('/lt/') == ['/lt/A', '/lt/C']
+    with swi.open_progress() as progress:
+        assert progress.stats['no_images'] == 1
+
+
+def test_race_cancels_queued_losing_pages(site, tmp_path):
+    products = {}
+    for n in range(4):
+        sku = f'S{n}'
+        site.images[f'/img/{sku}.jpg'] = jpeg(sku)
+        products[sku] = (gallery_page(f'{site.base}/img/{sku}.jpg'), gallery_page(f'{site.base}/img/{sku}.jpg'))
+        site.delays[f'/lv/{sku}'] = 0.1
+    add_products(site, tmp_path, products)
+
+    # One page worker: every LV page is queued before any LT page, so each
+    # product is resolved while its LT page is still queued. Only the last
+    # LT page may already be running when its product resolves.
+    run_scrape(tmp_path, page_workers=1, race_urls=True)
+    assert local_files(tmp_path) == [f'S{n}/S{n}.jpg' for n in range(4)]
+    assert site.requested('/lv/') == [f'/lv/S{n}' for n in range(4)]
+    assert site.requested('/lt/') in ([], ['/lt/S3'])
+
+
+def test_race_uses_first_page_with_images(site, tmp_path):
+    site.images['/img/lt.jpg'] = jpeg('lt')
+    site.images['/img/lv.jpg'] = jpeg('lv')
+    add_products(site, tmp_path, {'A': (gallery_page(f'{site.base}/img/lv.jpg'),
+                                        gallery_page(f'{site.base}/img/lt.jpg'))})
+    site.delays['/lv/A'] = 0.3
+    run_scrape(tmp_path, race_urls=True)
+    assert (tmp_path / 'products' / 'A' / 'A.jpg').read_bytes() == jpeg('lt')
+    assert site.requested('/img/') == ['/img/lt.jpg']
@@ -0,0 +1,104 @@
+import pytest
+
+import translation_engine
+from translation_engine import Backoff, MemoryCache, StubBackend, TranslationEngine
+
+
+class MergingBackend(StubBackend):
+    """Stub that joins every line containing 'MERGE' with the line after it."""
+
+    def translate(self, text):
+        return super().translate(text.replace('MERGE\n', 'MERGE '))
+
+
+@pytest.fixture(autouse=True)
+def short_backoff(monkeypatch):
+    monkeypatch.setattr(translation_engine, 'MIN_BACKOFF', 0.01)
+    monkeypatch.setattr(translation_engine, 'MAX_BACKOFF', 0.04)
+
+
+def test_pack_respects_size_and_item_limits():
+    engine = TranslationEngine(StubBackend('lv', 'en'), max_chars=20, max_items=3)
+    texts = ['aaaa', 'bbbb', 'cccc', 'dddd', 'e' * 15, 'f' * 30, 'g']
+    batches = engine.pack(texts)
+    assert [t for batch in batches for t in batch] == texts
+    for batch in batches:
+        assert len(batch) <= 3
+        assert len(batch) == 1 or sum(len(t) + 1 for t in batch) <= 20
+    assert batches == [['aaaa', 'bbbb', 'cccc'], ['dddd'], ['e' * 15], ['f' * 30], ['g']]
+
+
+def test_translate_all_batches_and_keeps_order():
+    backend = StubBackend('lv', 'en')
+    engine = TranslationEngine(backend, workers=3, max_chars=40)
+    texts = [f'teksts {n:02d}' for n in range(20)] + ['teksts 03', '  teksts\n 05 ']
+    result = engine.translate_all(texts)
+
+    # Spellings of the same normalized text stay together, in first-seen order
+    assert list(result) == texts[:6] + ['  teksts\n 05 '] + texts[6:20]
+    assert result['teksts 07'] == '[en] teksts 07'
+    assert result['  teksts\n 05 '] == '[en] teksts 05'
+    assert engine.stats['requests'] == backend.calls == len(engine.pack(texts[:20]))
+    assert engine.stats['split_batches'] == 0
+
+    # Everything is cached now
+    assert engine.translate_all(texts) == result
+    assert backend.calls == engine.stats['requests']
+
+
+def test_line_count_mismatch_bisects_batch():
+    backend = MergingBackend('lv', 'en')
+    engine = TranslationEngine(backend, workers=1)
+    texts = ['viens', 'divi', 'trīs MERGE', 'četri']
+    result = engine.translate_all(texts)
+
+    # [4 items] -> [viens, divi] ok + [trīs MERGE, četri] -> [trīs MERGE] + [četri]
+    assert backend.calls == 1 + 2 + 2
+    assert engine.stats['split_batches'] == 2
+    assert list(result) == texts
+    assert result == {'viens': '[en] viens', 'divi': '[en] divi',
+                      'trīs MERGE': '[en] trīs MERGE', 'četri': '[en] četri'}
+
+
+def test_rate_limits_back_off_and_retry():
+    backend = StubBackend('lv', 'en', rate_limit_every=3)
+    engine = TranslationEngine(backend, workers=1, max_items=1)
+    texts = [f'vārds {n}' for n in range(6)]
+    result = engine.translate_all(texts)
+
+    # Calls 3 and 6 are rejected and retried: 6 translations take 8 requests
+    assert list(result) == texts
+    assert result['vārds 4'] == '[en] vārds 4'
+    assert engine.stats['requests'] == backend.calls == 8
+    assert engine.stats['rate_limited'] == 2
+    assert engine.stats['failed'] == 0
+
+
+def test_persistent_rate_limit_drops_batch():
+    failures = []
+
+    class RecordingCache(MemoryCache):
+        def put_failure(self, text, error, retry_in=None):
+            failures.append((text, retry_in))
+
+    backend = StubBackend('lv', 'en', rate_limit_every=1)
+    engine = TranslationEngine(backend, cache=RecordingCache(), workers=1, max_retries=3)
+    assert engine.translate_all(['viens', 'divi']) == {}
+    assert backend.calls == 3
+    assert engine.stats['failed'] == 2
+    assert failures == [('viens', translation_engine.RATE_LIMIT_RETRY_AFTER),
+                        ('divi', translation_engine.RATE_LIMIT_RETRY_AFTER)]
+
+
+def test_backoff_doubles_up_to_limit_and_decays():
+    backoff = Backoff()
+    delays = []
+    for _ in range(4):
+        backoff.hit()
+        delays.append(backoff.delay)
+    assert delays == [0.01, 0.02, 0.04, 0.04]
+    backoff.success()
+    assert backoff.delay == 0.02
+    backoff.success()
+    backoff.success()
+    assert backoff.delay == 0.0
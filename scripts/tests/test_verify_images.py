@@ -0,0 +1,90 @@
+import io
+
+import pytest
+
+import verify_images
+from verify_images import FULL, PILLOW, STRUCTURE, check_file
+
+Image = pytest.importorskip('PIL.Image')
+
+
+def jpeg_bytes(size=(256, 256)):
+    image = Image.effect_noise(size, 64).convert('RGB')
+    out = io.BytesIO()
+    image.save(out, 'JPEG', quality=90)
+    return out.getvalue()
+
+
+def png_bytes():
+    out = io.BytesIO()
+    Image.new('RGB', (32, 32), (200, 30, 30)).save(out, 'PNG')
+    return out.getvalue()
+
+
+def with_exif_thumbnail(data):
+    """Insert an APP1 segment holding a tiny 'thumbnail' with its own end marker."""
+    payload = b'Exif\x00\x00' + b'\xff\xd8\xff thumbnail \xff\xd9' + b'\x00' * 200
+    return data[:2] + b'\xff\xe1' + (len(payload) + 2).to_bytes(2, 'big') + payload + data[2:]
+
+
+@pytest.fixture
+def write(tmp_path):
+    def write(name, data):
+        path = tmp_path / name
+        path.write_bytes(data)
+        return str(path)
+    return write
+
+
+@pytest.mark.parametrize('level', [STRUCTURE, PILLOW, FULL])
+def test_good_images_pass(write, level):
+    assert check_file(write('a.jpg', jpeg_bytes()), level) == {'format': 'jpeg', 'error': None, 'level': level}
+    assert check_file(write('b.png', png_bytes()), level)['error'] is None
+
+
+@pytest.mark.parametrize('level', [STRUCTURE, PILLOW, FULL])
+def test_truncated_jpeg_is_bad(write, level):
+    data = jpeg_bytes()
+    result = check_file(write('a.jpg', data[:len(data) // 2]), level)
+    assert result['format'] == 'jpeg'
+    assert result['error']
+
+
+def test_truncated_jpeg_with_exif_thumbnail_is_bad_without_pillow(write):
+    data = with_exif_thumbnail(jpeg_bytes())
+    assert check_file(write('a.jpg', data), STRUCTURE)['error'] is None
+    result = check_file(write('b.jpg', data[:len(data) // 2]), STRUCTURE)
+    assert result['error'] == 'truncated JPEG (no end-of-image marker)'
+
+
+@pytest.mark.parametrize('level', [STRUCTURE, PILLOW, FULL])
+def test_jpeg_with_long_trailer_is_good(write, level):
+    # e.g. a motion photo: a video appended after the end-of-image marker
+    data = jpeg_bytes() + b'\x00\x00\x00\x18ftypmp42' + bytes(range(256)).replace(b'\xff', b'\x00') * 64
+    result = check_file(write('a.jpg', data), level)
+    assert result['error'] is None
+    assert result['warning']
+
+
+def test_trailer_beyond_scan_limit_without_pillow(write, monkeypatch):
+    monkeypatch.setattr(verify_images, 'JPEG_TRAILER_BYTES', 4096)
+    data = jpeg_bytes() + b'\x00' * 8192
+    assert check_file(write('a.jpg', data), STRUCTURE)['error'] == 'truncated JPEG (no end-of-image marker)'
+    assert check_file(write('b.jpg', data), PILLOW)['error'] is None
+
+
+@pytest.mark.parametrize('level', [STRUCTURE, PILLOW])
+def test_html_saved_as_jpg(write, level):
+    page = b'\n  <!DOCTYPE html><html><head><title>404 Not Found</title></head><body>Not found</body></html>'
+    assert check_file(write('a.jpg', page), level) == {'format': None, 'error': 'HTML page, not an image',
+                                                       'level': level}
+
+
+def test_empty_and_unknown_files(write):
+    assert check_file(write('a.jpg', b''))['error'] == 'empty file'
+    assert check_file(write('b.jpg', b'\x00\x01 not an image'))['error'] == 'unknown format'
+
+
+def test_truncated_png_is_bad(write):
+    data = png_bytes()
+    assert check_file(write('a.png', data[:-20]), STRUCTURE)['error'] == 'truncated PNG (no IEND chunk)'
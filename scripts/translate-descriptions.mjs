@@ -1,40 +1,224 @@
+import crypto from "crypto";
 import fs from "fs";
 import path from "path";
-import { fileURLToPath } from "url";
+import { fileURLToPath, pathToFileURL } from "url";
+import { createClient } from "@libsql/client";
 
 const __dirname = path.dirname(fileURLToPath(import.meta.url));
 const dataPath = path.join(__dirname, "..", "data", "products.json");
+// Translations survive re-exports here; export_data.py merges them (see description_sidecar.py)
+const sidecarPath = path.join(__dirname, "..", "data", "descriptions.json");
+
+// Translation cache shared with generate_descriptions.py (schema and policy: translation_cache.py)
+const CACHE_PATH = path.join(__dirname, "translation_cache.db");
+const SOURCE_LANG = "lv";
+const TARGET_LANG = "en";
+const BACKEND = "google-gtx";
+const RETRY_AFTER = 24 * 3600; // seconds before a failed translation is retried
+const MAX_ENTRIES = 50000;
+const MAX_AGE_DAYS = 365;
+const cache = createClient({ url: pathToFileURL(CACHE_PATH).href });
+const cacheKey = [SOURCE_LANG, TARGET_LANG, BACKEND];
 
 // Reload fresh data (in case previous run partially wrote)
 const raw = fs.readFileSync(dataPath, "utf8");
 const products = JSON.parse(raw);
 
-// Collect unique descriptions
-const uniqueDescs = [...new Set(products.map((p) => p.description_lv).filter(Boolean))];
+const sha1 = (text) => crypto.createHash("sha1").update(text || "", "utf8").digest("hex");
+// Sidecar keys, as sku_index.normalize_sku(): whitespace (incl. nbsp) collapsed, upper-case
+const skuKey = (sku) => sku.replace(/\s+/g, " ").trim().toUpperCase();
+
+function loadSidecar() {
+  if (!fs.existsSync(sidecarPath)) return { version: 1, generated: {}, translated: {} };
+  const sidecar = JSON.parse(fs.readFileSync(sidecarPath, "utf8"));
+  // Files written before skuKey() keyed nbsp spellings as-is
+  const rekey = (obj) => Object.fromEntries(Object.entries(obj).map(([sku, e]) => [skuKey(sku), e]));
+  return { ...sidecar, generated: rekey(sidecar.generated), translated: rekey(sidecar.translated) };
+}
+
+function saveSidecar(sidecar) {
+  const sorted = (obj) => Object.fromEntries(Object.entries(obj).sort(([a], [b]) => (a < b ? -1 : a > b ? 1 : 0)));
+  const data = { version: 1, generated: sorted(sidecar.generated), translated: sorted(sidecar.translated) };
+  fs.writeFileSync(sidecarPath, JSON.stringify(data, null, 2), "utf8");
+}
+
+// Run metrics, one JSON line per run in the same format as scripts/instrumentation.py
+const metricsPath = path.join(__dirname, "metrics", "translate-descriptions.jsonl");
+const metrics = { started: new Date(), start: performance.now(), timers: {}, counters: {} };
+const count = (name, n = 1) => {
+  metrics.counters[name] = (metrics.counters[name] || 0) + n;
+};
+function startStage(name) {
+  const t0 = performance.now();
+  return () => {
+    const timer = (metrics.timers[name] ||= { seconds: 0, calls: 0 });
+    timer.seconds += (performance.now() - t0) / 1000;
+    timer.calls++;
+  };
+}
+function writeMetrics(status) {
+  const record = {
+    script: "translate-descriptions",
+    started: metrics.started.toISOString().replace(/\.\d+Z$/, "+00:00"),
+    seconds: Math.round(performance.now() - metrics.start) / 1000,
+    status,
+    argv: process.argv.slice(2),
+    node: process.versions.node,
+    timers: metrics.timers,
+    counters: metrics.counters,
+    gauges: {},
+    peak_rss_bytes: process.resourceUsage().maxRSS * 1024,
+  };
+  fs.mkdirSync(path.dirname(metricsPath), { recursive: true });
+  fs.appendFileSync(metricsPath, JSON.stringify(record) + "\n", "utf8");
+}
+
+const sidecar = loadSidecar();
+
+// Adopt translations already present in products.json (written before the sidecar existed)
+for (const p of products) {
+  const key = skuKey(p.sku);
+  if (p.description_lv && p.description_en && p.description_en !== p.description_lv && !sidecar.translated[key]) {
+    sidecar.translated[key] = { source: sha1(p.description_lv), description_en: p.description_en };
+  }
+}
+
+// Only descriptions that changed since their last translation
+const isDirty = (p) => p.description_lv && sidecar.translated[skuKey(p.sku)]?.source !== sha1(p.description_lv);
+const uniqueDescs = [...new Set(products.filter(isDirty).map((p) => p.description_lv))];
 console.log(`Total products: ${products.length}`);
-console.log(`Unique descriptions to translate: ${uniqueDescs.length}`);
+console.log(`New or changed descriptions to translate: ${uniqueDescs.length}`);
+
+const normalize = (text) => text.replace(/\s+/g, " ").trim();
+const now = () => Date.now() / 1000;
+
+async function openCache() {
+  await cache.execute("PRAGMA journal_mode=WAL");
+  await cache.executeMultiple(`
+    CREATE TABLE IF NOT EXISTS translations (
+      source_lang TEXT NOT NULL, target_lang TEXT NOT NULL, text TEXT NOT NULL, backend TEXT NOT NULL,
+      translation TEXT, error TEXT, retry_after REAL, created_at REAL NOT NULL, used_at REAL NOT NULL,
+      PRIMARY KEY (source_lang, target_lang, text, backend)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS translations_used_at ON translations (used_at);
+    CREATE TABLE IF NOT EXISTS cache_stats (
+      source_lang TEXT NOT NULL, target_lang TEXT NOT NULL, backend TEXT NOT NULL,
+      hits INTEGER NOT NULL DEFAULT 0, misses INTEGER NOT NULL DEFAULT 0,
+      PRIMARY KEY (source_lang, target_lang, backend)
+    ) WITHOUT ROWID;
+  `);
+  const { rows } = await cache.execute({
+    sql: "SELECT text, translation, retry_after FROM translations WHERE source_lang = ? AND target_lang = ? AND backend = ?",
+    args: cacheKey,
+  });
+  return new Map(rows.map((r) => [r.text, { translation: r.translation, retryAfter: r.retry_after }]));
+}
+
+// Single-row upserts: a crash loses at most the translation in flight
+function cachePut(text, translation) {
+  const t = now();
+  return cache.execute({
+    sql: `INSERT INTO translations (source_lang, target_lang, text, backend, translation, error, retry_after, created_at, used_at)
+          VALUES (?, ?, ?, ?, ?, NULL, NULL, ?, ?)
+          ON CONFLICT (source_lang, target_lang, text, backend) DO UPDATE SET
+          translation = excluded.translation, error = NULL, retry_after = NULL, used_at = excluded.used_at`,
+    args: [...cacheKey, text, translation, t, t],
+  });
+}
+
+function cachePutFailure(text, error) {
+  const t = now();
+  return cache.execute({
+    sql: `INSERT INTO translations (source_lang, target_lang, text, backend, translation, error, retry_after, created_at, used_at)
+          VALUES (?, ?, ?, ?, NULL, ?, ?, ?, ?)
+          ON CONFLICT (source_lang, target_lang, text, backend) DO UPDATE SET
+          error = excluded.error, retry_after = excluded.retry_after, used_at = excluded.used_at
+          WHERE translation IS NULL`,
+    args: [...cacheKey, text, String(error).slice(0, 500), t + RETRY_AFTER, t, t],
+  });
+}
+
+async function closeCache(hitTexts, hits, misses) {
+  const t = now();
+  const touch = hitTexts.map((text) => ({
+    sql: "UPDATE translations SET used_at = ? WHERE source_lang = ? AND target_lang = ? AND text = ? AND backend = ?",
+    args: [t, SOURCE_LANG, TARGET_LANG, text, BACKEND],
+  }));
+  await cache.batch([
+    ...touch,
+    {
+      sql: `INSERT INTO cache_stats (source_lang, target_lang, backend, hits, misses) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (source_lang, target_lang, backend) DO UPDATE SET
+            hits = hits + excluded.hits, misses = misses + excluded.misses`,
+      args: [...cacheKey, hits, misses],
+    },
+    { sql: "DELETE FROM translations WHERE used_at < ?", args: [t - MAX_AGE_DAYS * 86400] },
+    {
+      sql: "DELETE FROM translations WHERE used_at < (SELECT used_at FROM translations ORDER BY used_at DESC LIMIT 1 OFFSET ?)",
+      args: [MAX_ENTRIES - 1],
+    },
+  ], "write");
+  cache.close();
+}
 
 async function translateOne(text) {
   const url = `https://translate.googleapis.com/translate_a/single?client=gtx&sl=lv&tl=en&dt=t&q=${encodeURIComponent(text)}`;
   for (let attempt = 0; attempt < 3; attempt++) {
     try {
       const res = await fetch(url);
+      count("http.requests");
       if (res.status === 429) {
         // Rate limited, wait and retry
         await new Promise((r) => setTimeout(r, 2000 * (attempt + 1)));
         continue;
       }
-      const data = await res.json();
-      return data[0].map((seg) => seg[0]).join("");
+      const body = await res.text();
+      count("http.bytes", Buffer.byteLength(body));
+      const data = JSON.parse(body);
+      const translation = data[0].map((seg) => seg[0]).join("");
+      await cachePut(normalize(text), translation);
+      return translation;
     } catch (err) {
       if (attempt === 2) {
         console.error(`Failed: ${text.substring(0, 40)}... -> ${err.message}`);
-        return text; // fallback to original
+        count("translate.failed");
+        await cachePutFailure(normalize(text), err.message);
+        return null; // caller falls back to the original (not cached; retried after RETRY_AFTER)
       }
       await new Promise((r) => setTimeout(r, 1000));
     }
   }
-  return text;
+  await cachePutFailure(normalize(text), "rate limited");
+  return null;
+}
+
+const manifestPath = path.join(path.dirname(dataPath), "products-manifest.json");
+const manifest = fs.existsSync(manifestPath) ? JSON.parse(fs.readFileSync(manifestPath, "utf8")) : null;
+// Same layouts as catalog_output.iter_json_array: indented, or (--compact exports) one product per line
+const compact = Boolean(manifest && manifest.compact);
+
+function jsonArray(items) {
+  if (!compact || !items.length) return JSON.stringify(items, null, 2);
+  return "[\n" + items.map((item) => JSON.stringify(item)).join(",\n") + "\n]";
+}
+
+// Replace a file only when its content changes (like catalog_output.write_chunks)
+function writeIfChanged(file, text) {
+  if (fs.existsSync(file) && fs.readFileSync(file, "utf8") === text) return false;
+  fs.writeFileSync(file + ".tmp", text, "utf8");
+  fs.renameSync(file + ".tmp", file);
+  return true;
+}
+
+// Keep the per-category shards written by export_data.py in sync with products.json
+function writeShards() {
+  if (!manifest) return 0;
+  let written = 0;
+  for (const [slug, shard] of Object.entries(manifest.shards)) {
+    const items = products.filter((p) => p.categorySlug === slug);
+    if (writeIfChanged(path.join(path.dirname(dataPath), shard.file), jsonArray(items))) written++;
+  }
+  return written;
 }
 
 // Run N concurrent translations
@@ -43,10 +227,33 @@ const BATCH_SIZE = 50;
 const translationMap = new Map();
 
 async function main() {
+  let stopStage = startStage("cache");
+  const cached = await openCache();
+  const hitTexts = [];
+  const pending = [];
+  let backingOff = 0;
+  for (const text of uniqueDescs) {
+    const row = cached.get(normalize(text));
+    if (row && row.translation != null) {
+      translationMap.set(text, row.translation);
+      hitTexts.push(normalize(text));
+    } else if (row && row.retryAfter && row.retryAfter > now()) {
+      backingOff++;
+    } else {
+      pending.push(text);
+    }
+  }
+  stopStage();
+  count("translate.cache_hits", hitTexts.length);
+  count("translate.cache_misses", pending.length + backingOff);
+  count("translate.backing_off", backingOff);
+  console.log(`Cache: ${hitTexts.length} hits, ${pending.length} to translate, ${backingOff} failed recently (skipped)`);
+
+  stopStage = startStage("translate");
   let completed = 0;
 
-  for (let batchStart = 0; batchStart < uniqueDescs.length; batchStart += BATCH_SIZE) {
-    const batch = uniqueDescs.slice(batchStart, batchStart + BATCH_SIZE);
+  for (let batchStart = 0; batchStart < pending.length; batchStart += BATCH_SIZE) {
+    const batch = pending.slice(batchStart, batchStart + BATCH_SIZE);
 
     // Process batch with concurrency limit
     for (let i = 0; i < batch.length; i += CONCURRENCY) {
@@ -56,22 +263,53 @@ async function main() {
       completed += slice.length;
     }
 
-    console.log(`Translated ${completed}/${uniqueDescs.length} (${Math.round((completed / uniqueDescs.length) * 100)}%)`);
+    console.log(`Translated ${completed}/${pending.length} (${Math.round((completed / pending.length) * 100)}%)`);
 
     // Small delay between batches
-    if (batchStart + BATCH_SIZE < uniqueDescs.length) {
+    if (batchStart + BATCH_SIZE < pending.length) {
       await new Promise((r) => setTimeout(r, 300));
     }
   }
 
+  stopStage();
+
+  stopStage = startStage("write");
+  await closeCache(hitTexts, hitTexts.length, pending.length + backingOff);
+
+  // Record successful translations, forget products that are gone or lost their description
+  const current = new Set();
+  for (const product of products) {
+    const key = skuKey(product.sku);
+    const translation = translationMap.get(product.description_lv);
+    if (translation) {
+      sidecar.translated[key] = { source: sha1(product.description_lv), description_en: translation };
+    }
+    if (product.description_lv) current.add(key);
+  }
+  for (const key of Object.keys(sidecar.translated)) {
+    if (!current.has(key)) delete sidecar.translated[key];
+  }
+  saveSidecar(sidecar);
+
   // Apply translations to products
   for (const product of products) {
-    product.description_en = translationMap.get(product.description_lv) || product.description_lv || "";
+    const entry = sidecar.translated[skuKey(product.sku)];
+    const upToDate = entry && entry.source === sha1(product.description_lv);
+    product.description_en = upToDate ? entry.description_en : product.description_lv || "";
   }
 
-  // Write back
-  fs.writeFileSync(dataPath, JSON.stringify(products, null, 2), "utf8");
-  console.log(`\nDone! Updated ${products.length} products with description_en.`);
+  // Write back (unchanged files are left untouched)
+  const written = (writeIfChanged(dataPath, jsonArray(products)) ? 1 : 0) + writeShards();
+  count("files_rewritten", written);
+  stopStage();
+  console.log(`\nDone! Updated ${products.length} products with description_en (${written} files rewritten).`);
 }
 
-main().catch(console.error);
+main()
+  .then(() => writeMetrics("ok"))
+  .catch((err) => {
+    writeMetrics(`error: ${err.name}`);
+    console.error(err);
+    // build_catalog.py only retries the translate stage when the script fails
+    process.exitCode = 1;
+  });
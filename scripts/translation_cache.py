@@ -0,0 +1,198 @@
+"""
+Persistent translation cache shared by generate_descriptions.py and
+translate-descriptions.mjs (scripts/translation_cache.db, SQLite).
+
+Rows are keyed by (source_lang, target_lang, normalized text, backend), so
+the EN->LV name translations and the LV->EN description translations of
+different backends never collide. Every write is a single-row upsert in
+autocommit mode (WAL journal), so a crash never loses more than the row
+being written and both scripts can use the file at the same time.
+
+Failed translations are stored with an error and a retry_after time instead
+of caching the untranslated text forever; they are retried once that time
+has passed. Hit/miss counters are kept per session and accumulated in the
+cache_stats table. On close, rows unused for MAX_AGE_DAYS are evicted and
+the table is trimmed to the MAX_ENTRIES most recently used rows.
+
+Usage:
+    with TranslationCache('en', 'lv', backend='google') as cache:
+        engine = TranslationEngine(backend, cache=cache)
+    python scripts/translation_cache.py          # print cache statistics
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import time
+
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8', errors='replace')
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DB = os.path.join(SCRIPT_DIR, 'translation_cache.db')
+
+MAX_ENTRIES = 50000
+MAX_AGE_DAYS = 365
+RETRY_AFTER = 24 * 3600   # default wait before a failed translation is retried
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS translations (
+        source_lang TEXT NOT NULL,
+        target_lang TEXT NOT NULL,
+        text TEXT NOT NULL,
+        backend TEXT NOT NULL,
+        translation TEXT,
+        error TEXT,
+        retry_after REAL,
+        created_at REAL NOT NULL,
+        used_at REAL NOT NULL,
+        PRIMARY KEY (source_lang, target_lang, text, backend)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS translations_used_at ON translations (used_at);
+    CREATE TABLE IF NOT EXISTS cache_stats (
+        source_lang TEXT NOT NULL,
+        target_lang TEXT NOT NULL,
+        backend TEXT NOT NULL,
+        hits INTEGER NOT NULL DEFAULT 0,
+        misses INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (source_lang, target_lang, backend)
+    ) WITHOUT ROWID;
+'''
+
+
+def connect(path=CACHE_DB):
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)  # autocommit
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+class TranslationCache:
+    """Cache of one language pair and backend; keys are normalized texts."""
+
+    def __init__(self, source_lang, target_lang, backend, path=CACHE_DB):
+        self.key = (source_lang, target_lang)
+        self.backend = backend
+        self.conn = connect(path)
+        self.hits = 0
+        self.misses = 0
+
+    def _row(self, text):
+        return self.conn.execute(
+            'SELECT translation, retry_after FROM translations '
+            'WHERE source_lang = ? AND target_lang = ? AND text = ? AND backend = ?',
+            (*self.key, text, self.backend),
+        ).fetchone()
+
+    def get(self, text):
+        """Cached translation or None; counts a hit or a miss."""
+        row = self._row(text)
+        if row and row[0] is not None:
+            self.hits += 1
+            self.conn.execute(
+                'UPDATE translations SET used_at = ? '
+                'WHERE source_lang = ? AND target_lang = ? AND text = ? AND backend = ?',
+                (time.time(), *self.key, text, self.backend),
+            )
+            return row[0]
+        self.misses += 1
+        return None
+
+    def backing_off(self, text):
+        """True while a recorded failure's retry_after has not passed yet."""
+        row = self._row(text)
+        return bool(row and row[0] is None and row[1] and row[1] > time.time())
+
+    def put(self, text, translation):
+        now = time.time()
+        self.conn.execute(
+            'INSERT INTO translations (source_lang, target_lang, text, backend, translation, '
+            'error, retry_after, created_at, used_at) VALUES (?, ?, ?, ?, ?, NULL, NULL, ?, ?) '
+            'ON CONFLICT (source_lang, target_lang, text, backend) DO UPDATE SET '
+            'translation = excluded.translation, error = NULL, retry_after = NULL, '
+            'used_at = excluded.used_at',
+            (*self.key, text, self.backend, translation, now, now),
+        )
+
+    def put_failure(self, text, error, retry_in=RETRY_AFTER):
+        """Remember a failed translation until now + retry_in (never overwrites a translation)."""
+        now = time.time()
+        self.conn.execute(
+            'INSERT INTO translations (source_lang, target_lang, text, backend, translation, '
+            'error, retry_after, created_at, used_at) VALUES (?, ?, ?, ?, NULL, ?, ?, ?, ?) '
+            'ON CONFLICT (source_lang, target_lang, text, backend) DO UPDATE SET '
+            'error = excluded.error, retry_after = excluded.retry_after, used_at = excluded.used_at '
+            'WHERE translation IS NULL',
+            (*self.key, text, self.backend, str(error)[:500], now + retry_in, now, now),
+        )
+
+    def __len__(self):
+        return self.conn.execute(
+            'SELECT COUNT(*) FROM translations WHERE source_lang = ? AND target_lang = ? '
+            'AND backend = ? AND translation IS NOT NULL',
+            (*self.key, self.backend),
+        ).fetchone()[0]
+
+    def import_json(self, path):
+        """Adopt an old {text: translation} JSON cache (skipping untranslated fallbacks)."""
+        with open(path, 'r', encoding='utf-8') as f:
+            legacy = json.load(f)
+        count = 0
+        self.conn.execute('BEGIN')
+        for text, translation in legacy.items():
+            if translation and translation != text:
+                self.put(' '.join(text.split()), translation)
+                count += 1
+        self.conn.execute('COMMIT')
+        return count
+
+    def evict(self, max_entries=MAX_ENTRIES, max_age_days=MAX_AGE_DAYS):
+        """Drop rows unused for max_age_days, then all but the max_entries most recent."""
+        cutoff = time.time() - max_age_days * 86400
+        removed = self.conn.execute('DELETE FROM translations WHERE used_at < ?', (cutoff,)).rowcount
+        removed += self.conn.execute(
+            'DELETE FROM translations WHERE used_at < ('
+            '  SELECT used_at FROM translations ORDER BY used_at DESC LIMIT 1 OFFSET ?)',
+            (max_entries - 1,),
+        ).rowcount
+        return removed
+
+    def close(self):
+        self.conn.execute(
+            'INSERT INTO cache_stats (source_lang, target_lang, backend, hits, misses) '
+            'VALUES (?, ?, ?, ?, ?) ON CONFLICT (source_lang, target_lang, backend) DO UPDATE SET '
+            'hits = hits + excluded.hits, misses = misses + excluded.misses',
+            (*self.key, self.backend, self.hits, self.misses),
+        )
+        self.evict()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    if not os.path.exists(CACHE_DB):
+        print(f'No translation cache at {CACHE_DB}')
+        return
+    conn = connect()
+    print(f'{"pair":<8} {"backend":<12} {"cached":>8} {"failed":>7} {"hits":>8} {"misses":>8}')
+    rows = conn.execute('''
+        SELECT t.source_lang, t.target_lang, t.backend,
+               SUM(t.translation IS NOT NULL), SUM(t.translation IS NULL),
+               COALESCE(s.hits, 0), COALESCE(s.misses, 0)
+        FROM translations t
+        LEFT JOIN cache_stats s USING (source_lang, target_lang, backend)
+        GROUP BY t.source_lang, t.target_lang, t.backend
+    ''').fetchall()
+    for src, tgt, backend, cached, failed, hits, misses in rows:
+        print(f'{src}->{tgt:<4} {backend:<12} {cached:>8} {failed:>7} {hits:>8} {misses:>8}')
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
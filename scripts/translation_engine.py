@@ -0,0 +1,288 @@
+"""
+Batched, concurrent translation for the description scripts.
+
+Instead of one request per string with a fixed sleep, pending strings are
+deduplicated, packed into batches of up to `max_chars` characters and sent
+as one request each, with a bounded number of batches in flight.
+
+Packing is newline-delimited: every item is collapsed to a single line
+before packing and a batch is only accepted when the translation comes
+back with exactly as many lines as were sent. Anything else (a backend
+merging or splitting lines) bisects the batch and retries the halves, down
+to single items, so a reply can never be misaligned.
+
+Rate limiting is adaptive: a 429 from any worker pauses all workers for a
+shared delay that doubles on every further 429 (up to MAX_BACKOFF) and
+decays again as batches succeed.
+
+Backends are small classes with `name` and `translate(text) -> str`;
+`get_backend('stub')` returns a deterministic local stand-in for tests and
+dry runs. The cache is MemoryCache or translation_cache.TranslationCache
+(get / put / put_failure / backing_off).
+
+Usage:
+    engine = TranslationEngine(get_backend('google', 'en', 'lv'))
+    translations = engine.translate_all(['Hair dryer', 'Round brush'])
+"""
+
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+WORKERS = 4           # batches in flight
+MAX_CHARS = 4500      # per request; Google's limit is 5000
+MAX_ITEMS = 100       # per request
+MIN_BACKOFF = 1.0     # seconds after the first 429
+MAX_BACKOFF = 60.0
+FAILURE_RETRY_AFTER = 24 * 3600      # retry a failed string after a day
+RATE_LIMIT_RETRY_AFTER = 3600        # ... or an hour if it only hit rate limits
+
+
+class RateLimited(Exception):
+    """The backend answered 429 / too many requests."""
+
+
+class TranslationFailed(Exception):
+    """One string could not be translated (returned in place of its translation)."""
+
+
+def normalize(text):
+    """Collapse whitespace so a string occupies exactly one packed line."""
+    return re.sub(r'\s+', ' ', text or '').strip()
+
+
+# ============================================================================
+# BACKENDS
+# ============================================================================
+
+class GoogleBackend:
+    """deep_translator's GoogleTranslator (free web endpoint)."""
+
+    def __init__(self, source, target):
+        from deep_translator import GoogleTranslator
+        from deep_translator.exceptions import TooManyRequests
+        self.name = 'google'
+        self._translator = GoogleTranslator(source=source, target=target)
+        self._rate_limited = TooManyRequests
+
+    def translate(self, text):
+        try:
+            return self._translator.translate(text)
+        except self._rate_limited as e:
+            raise RateLimited(str(e)) from e
+
+
+class StubBackend:
+    """Deterministic local backend: tags every line with the target language.
+
+    `rate_limit_every` makes every n-th call raise RateLimited, to exercise
+    the backoff path without a network.
+    """
+
+    def __init__(self, source, target, rate_limit_every=0):
+        self.name = 'stub'
+        self.target = target
+        self.rate_limit_every = rate_limit_every
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def translate(self, text):
+        with self._lock:
+            self.calls += 1
+            if self.rate_limit_every and self.calls % self.rate_limit_every == 0:
+                raise RateLimited('stub 429')
+        return '\n'.join(f'[{self.target}] {line}' for line in text.split('\n'))
+
+
+BACKENDS = {'google': GoogleBackend, 'stub': StubBackend}
+
+
+def get_backend(name, source, target, **kwargs):
+    return BACKENDS[name](source, target, **kwargs)
+
+
+# ============================================================================
+# ENGINE
+# ============================================================================
+
+class MemoryCache:
+    """In-process cache with the TranslationCache interface."""
+
+    def __init__(self):
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, text):
+        value = self.entries.get(text)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def backing_off(self, text):
+        return False
+
+    def put(self, text, translation):
+        self.entries[text] = translation
+
+    def put_failure(self, text, error, retry_in=None):
+        pass
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class Backoff:
+    """Shared pause for all workers, grown on 429s and decayed on success."""
+
+    def __init__(self):
+        self.delay = 0.0
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        while True:
+            with self._lock:
+                remaining = self._resume_at - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(remaining)
+
+    def hit(self):
+        with self._lock:
+            self.delay = min(MAX_BACKOFF, max(MIN_BACKOFF, self.delay * 2))
+            self._resume_at = max(self._resume_at, time.monotonic() + self.delay)
+
+    def success(self):
+        with self._lock:
+            self.delay = self.delay / 2 if self.delay > MIN_BACKOFF else 0.0
+
+
+class TranslationEngine:
+    """Translate many strings through a backend with batching, concurrency and a cache.
+
+    `cache` maps normalized source texts to translations (MemoryCache by default).
+    """
+
+    def __init__(self, backend, cache=None, workers=WORKERS, max_chars=MAX_CHARS,
+                 max_items=MAX_ITEMS, max_retries=8):
+        self.backend = backend
+        self.cache = cache if cache is not None else MemoryCache()
+        self.workers = workers
+        self.max_chars = max_chars
+        self.max_items = max_items
+        self.max_retries = max_retries
+        self.backoff = Backoff()
+        self.stats = {'requests': 0, 'rate_limited': 0, 'split_batches': 0, 'failed': 0,
+                      'backing_off': 0}
+        self._lock = threading.Lock()
+
+    def pack(self, texts):
+        """Group texts into batches that respect max_chars and max_items."""
+        batches, batch, size = [], [], 0
+        for text in texts:
+            if batch and (size + len(text) + 1 > self.max_chars or len(batch) >= self.max_items):
+                batches.append(batch)
+                batch, size = [], 0
+            batch.append(text)
+            size += len(text) + 1
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _request(self, text):
+        """One backend call, waiting out and retrying rate limits."""
+        for _ in range(self.max_retries):
+            self.backoff.wait()
+            with self._lock:
+                self.stats['requests'] += 1
+            try:
+                result = self.backend.translate(text)
+            except RateLimited:
+                with self._lock:
+                    self.stats['rate_limited'] += 1
+                self.backoff.hit()
+                continue
+            self.backoff.success()
+            return result
+        raise RateLimited(f'still rate limited after {self.max_retries} attempts')
+
+    def _translate_batch(self, batch):
+        """Translate a batch; returns {text: translation or TranslationFailed}."""
+        try:
+            reply = self._request('\n'.join(batch))
+        except RateLimited:
+            raise
+        except Exception as e:
+            if len(batch) == 1:
+                print(f'    Translation error: {e}')
+                return {batch[0]: TranslationFailed(str(e) or type(e).__name__)}
+            reply = None
+
+        lines = reply.split('\n') if reply is not None else []
+        if len(lines) == len(batch):
+            return {src: line.strip() for src, line in zip(batch, lines)}
+        if len(batch) == 1:
+            # A single item that came back as several lines: keep it joined
+            return {batch[0]: ' '.join(line.strip() for line in lines if line.strip())}
+
+        with self._lock:
+            self.stats['split_batches'] += 1
+        mid = len(batch) // 2
+        return {**self._translate_batch(batch[:mid]), **self._translate_batch(batch[mid:])}
+
+    def translate_all(self, texts, progress=None):
+        """Translate every string; returns {original text: translation}.
+
+        Cached strings are not sent again; new translations are stored in the
+        cache as soon as their batch completes. Strings that could not be
+        translated are recorded as failures in the cache (and not retried
+        until their retry time) and are absent from the result.
+        """
+        originals = {}
+        for text in texts:
+            key = normalize(text)
+            if key:
+                originals.setdefault(key, []).append(text)
+
+        results = {}
+        pending = []
+        for key in originals:
+            cached = self.cache.get(key)
+            if cached is not None:
+                results[key] = cached
+            elif self.cache.backing_off(key):
+                self.stats['backing_off'] += 1
+            else:
+                pending.append(key)
+
+        batches = self.pack(pending)
+        done = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self._translate_batch, batch): batch for batch in batches}
+            for future in as_completed(futures):
+                try:
+                    translated = future.result()
+                except RateLimited as e:
+                    print(f'    Translation batch dropped: {e}')
+                    for key in futures[future]:
+                        self.cache.put_failure(key, e, RATE_LIMIT_RETRY_AFTER)
+                    self.stats['failed'] += len(futures[future])
+                    translated = {}
+                for key, value in translated.items():
+                    if isinstance(value, TranslationFailed):
+                        self.cache.put_failure(key, value, FAILURE_RETRY_AFTER)
+                        self.stats['failed'] += 1
+                    else:
+                        self.cache.put(key, value)
+                        results[key] = value
+                done += 1
+                if progress:
+                    progress(done, len(batches))
+
+        return {text: results[key]
+                for key, same in originals.items() if key in results
+                for text in same}
@@ -0,0 +1,332 @@
+"""
+Verify the local image library and quarantine broken files.
+
+The downloaders trust any file that exists, so a truncated download or an
+HTML error page saved as .jpg would stay in public/images/ and be published
+by export_data.py. This pass checks every SKU-folder image and every image
+store blob in a process pool:
+
+    magic bytes    JPEG, PNG, GIF, WebP, BMP or TIFF signature (HTML and
+                   empty files are reported as such)
+    structure      end-of-image marker / IEND chunk / GIF trailer present,
+                   declared RIFF/BMP size not larger than the file
+    Pillow         header parse + verify() when Pillow is installed;
+                   --full also decodes every pixel
+
+Only the first and last KB of a file are read unless Pillow needs more.
+A JPEG may carry data after its end-of-image marker (camera trailers,
+motion photos), so a missing marker in the last KB is only a warning: with
+Pillow the image is decoded to decide, without it the marker is searched
+for further back.
+Results are cached by size + mtime in scripts/image_verify_cache.json, so a
+re-run only checks new or changed files.
+
+Bad files are moved to scripts/image_quarantine/ (same relative path, logged
+in quarantine.jsonl). A quarantined store blob is dropped from the store
+manifest together with its download sources, and the affected SKUs are
+removed from both downloaders' progress journals, so the next
+download_nextcloud_images.py / scrape_web_images.py run fetches them again.
+
+Usage:
+    python scripts/verify_images.py
+    python scripts/verify_images.py --dry-run     # report only, move nothing
+    python scripts/verify_images.py --full        # decode every image completely
+    python scripts/verify_images.py --recheck     # ignore the cache
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import download_nextcloud_images
+import image_store
+import instrumentation
+import scrape_web_images
+from image_variants import PUBLIC_DIR, WORKERS, iter_originals
+from sku_index import normalize_sku
+
+if sys.platform == 'win32':
+    sys.stdout.reconfigure(encoding='utf-8', errors='replace')
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_PATH = os.path.join(SCRIPT_DIR, 'image_verify_cache.json')
+QUARANTINE_DIR = os.path.join(SCRIPT_DIR, 'image_quarantine')
+QUARANTINE_LOG = os.path.join(QUARANTINE_DIR, 'quarantine.jsonl')
+
+HEAD_BYTES = 1024
+TAIL_BYTES = 1024
+JPEG_TRAILER_BYTES = 8 * 1024 * 1024   # how far back to look for a JPEG end marker without Pillow
+JPEG_EOI = b'\xff\xd9'
+
+# Bumped when the checks change, so older cached verdicts are redone
+CACHE_VERSION = 2
+
+# Check levels: a cached result counts when it was made at the requested level or deeper
+STRUCTURE, PILLOW, FULL = 0, 1, 2
+
+SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+    (b'II*\x00', 'tiff'),
+    (b'MM\x00*', 'tiff'),
+    (b'BM', 'bmp'),
+)
+
+
+def sniff(head):
+    """Image format from the first bytes of a file, or None."""
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    for magic, fmt in SIGNATURES:
+        if head.startswith(magic):
+            return fmt
+    return None
+
+
+def structure_error(fmt, head, tail, size):
+    """Cheap truncation check from the file's first and last bytes; None when fine.
+
+    JPEG end markers are checked by check_file(), which may need more of the file.
+    """
+    if fmt == 'png' and b'IEND' not in tail:
+        return 'truncated PNG (no IEND chunk)'
+    if fmt == 'gif' and not tail.rstrip(b'\x00').endswith(b';'):
+        return 'truncated GIF (no trailer)'
+    if fmt == 'webp' and int.from_bytes(head[4:8], 'little') + 8 > size:
+        return 'truncated WebP (shorter than its RIFF size)'
+    if fmt == 'bmp' and int.from_bytes(head[2:6], 'little') > size:
+        return 'truncated BMP (shorter than its header size)'
+    return None
+
+
+def _jpeg_data_start(f):
+    """Offset of the first JPEG segment after the APPn / COM segments.
+
+    An EXIF thumbnail (with its own end marker) lives in APP1, so a marker
+    found before this offset says nothing about the main image.
+    """
+    offset = 2
+    while True:
+        f.seek(offset)
+        header = f.read(4)
+        if len(header) < 4 or header[0] != 0xFF or not (0xE0 <= header[1] <= 0xEF or header[1] == 0xFE):
+            return offset
+        offset += 2 + int.from_bytes(header[2:4], 'big')
+
+
+def _has_jpeg_end(f, size):
+    """True when a JPEG end marker occurs in the last JPEG_TRAILER_BYTES of the image data."""
+    start = max(_jpeg_data_start(f), size - JPEG_TRAILER_BYTES)
+    end = size
+    block = 65536
+    while end > start:
+        pos = max(start, end - block)
+        f.seek(pos)
+        if JPEG_EOI in f.read(end - pos + len(JPEG_EOI) - 1):  # overlap the previous block
+            return True
+        end = pos
+    return False
+
+
+def check_file(path, level=PILLOW):
+    """Verify one image file (runs in a worker process).
+
+    Returns {'format', 'error', 'level'}; error is None for a good image.
+    A 'warning' is added for a JPEG without an end marker in its last KB
+    that still passed.
+    """
+    result = {'format': None, 'error': None, 'level': level}
+    size = os.path.getsize(path)
+    if size == 0:
+        result['error'] = 'empty file'
+        return result
+    with open(path, 'rb') as f:
+        head = f.read(HEAD_BYTES)
+        f.seek(max(0, size - TAIL_BYTES))
+        tail = f.read(TAIL_BYTES)
+
+    fmt = result['format'] = sniff(head)
+    if fmt is None:
+        text = head.lstrip().lower()
+        result['error'] = ('HTML page, not an image' if text.startswith(b'<') or b'<html' in text
+                           else 'unknown format')
+        return result
+    result['error'] = structure_error(fmt, head, tail, size)
+    if result['error']:
+        return result
+
+    Image = None
+    if level > STRUCTURE:
+        try:
+            from PIL import Image
+        except ImportError:
+            result['level'] = STRUCTURE
+
+    if fmt == 'jpeg' and JPEG_EOI not in tail:
+        if Image is None:
+            with open(path, 'rb') as f:
+                if not _has_jpeg_end(f, size):
+                    result['error'] = 'truncated JPEG (no end-of-image marker)'
+                    return result
+            result['warning'] = 'data after the JPEG end-of-image marker'
+        else:
+            # Let the decoder decide: a truncated JPEG fails to load
+            result['warning'] = 'no JPEG end-of-image marker in the last KB'
+    if Image is None:
+        return result
+
+    try:
+        with Image.open(path) as im:
+            im.verify()
+        if level == FULL or 'warning' in result:
+            with Image.open(path) as im:
+                im.load()
+    except Exception as e:
+        result['error'] = f'{type(e).__name__}: {e}'
+    return result
+
+
+# ============================================================================
+# CACHE AND QUARANTINE
+# ============================================================================
+
+def load_cache(path=CACHE_PATH):
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        if cache.get('version') == CACHE_VERSION:
+            return cache
+    return {'version': CACHE_VERSION, 'files': {}}
+
+
+def save_cache(cache, path=CACHE_PATH):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def quarantine(bad):
+    """Move bad files out of public/ and make the downloaders fetch them again.
+
+    `bad` maps web paths to (file path, error). Returns the SKUs reset.
+    """
+    store = image_store.ImageStore()
+    skus = set()
+    os.makedirs(QUARANTINE_DIR, exist_ok=True)
+    with open(QUARANTINE_LOG, 'a', encoding='utf-8') as log:
+        for web_path, (path, error) in sorted(bad.items()):
+            relative = web_path.removeprefix('/images/')
+            target = os.path.join(QUARANTINE_DIR, relative)
+            if os.path.exists(target):
+                target += f'.{int(time.time())}'
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.move(path, target)
+
+            if relative.startswith('blobs/'):
+                sha1 = os.path.splitext(os.path.basename(relative))[0]
+                owners = store.drop_blob(sha1)
+            else:
+                owners = [relative.split('/')[1]]  # products/<SKU>/<file>
+            skus.update(owners)
+            log.write(json.dumps({'at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'image': web_path,
+                                  'moved_to': target, 'error': error, 'skus': owners},
+                                 ensure_ascii=False) + '\n')
+            print(f'  QUARANTINED {web_path}: {error}')
+    store.save()
+
+    keys = {normalize_sku(sku) for sku in skus}
+    for name, module in (('nextcloud', download_nextcloud_images), ('web', scrape_web_images)):
+        with module.open_progress() as journal:
+            reset = journal.forget(keys)
+        if reset:
+            print(f'  Reset {reset} SKUs in the {name} download progress')
+    return skus
+
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description='Verify product images and quarantine broken ones.')
+    parser.add_argument('--workers', type=int, default=WORKERS, help=f'worker processes (default {WORKERS})')
+    parser.add_argument('--full', action='store_true', help='decode every image completely (slower)')
+    parser.add_argument('--recheck', action='store_true', help='ignore cached results')
+    parser.add_argument('--dry-run', action='store_true', help='report bad files without moving them')
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumentation.run('verify_images', args):
+        verify(args)
+
+
+def verify(args):
+    print('=' * 60)
+    print('  Image Library Verification')
+    print('=' * 60)
+
+    level = FULL if args.full else PILLOW
+    if importlib.util.find_spec('PIL') is None:
+        print('Pillow not installed: checking signatures and structure only')
+        level = STRUCTURE
+
+    previous = {} if args.recheck else load_cache()['files']
+    cache = {'version': CACHE_VERSION, 'files': {}}
+    todo = {}
+    with instrumentation.stage('scan'):
+        for web_path, path in iter_originals():
+            if not os.path.exists(path):
+                continue  # store manifest entry without its blob file
+            st = os.stat(path)
+            stamp = [st.st_size, st.st_mtime_ns]
+            cached = previous.get(web_path)
+            if cached and cached['stamp'] == stamp and (cached['level'] >= level or cached['error']):
+                cache['files'][web_path] = cached
+            else:
+                todo[web_path] = (path, stamp)
+    print(f'Images: {len(cache["files"]) + len(todo)} ({len(todo)} new or changed)')
+
+    if todo:
+        with instrumentation.stage('verify'), ProcessPoolExecutor(max_workers=args.workers) as pool:
+            paths = [path for path, _ in todo.values()]
+            results = pool.map(check_file, paths, [level] * len(paths), chunksize=32)
+            for i, (web_path, result) in enumerate(zip(todo, results), 1):
+                cache['files'][web_path] = dict(result, stamp=todo[web_path][1])
+                if i % 1000 == 0:
+                    print(f'  [{i}/{len(todo)}]')
+
+    bad = {web_path: (PUBLIC_DIR / web_path.lstrip('/'), entry['error'])
+           for web_path, entry in cache['files'].items() if entry['error']}
+    for web_path in todo:
+        entry = cache['files'][web_path]
+        if not entry['error'] and entry.get('warning'):
+            print(f'  WARNING {web_path}: {entry["warning"]}')
+    instrumentation.count('images.checked', len(todo))
+    instrumentation.count('images.cached', len(cache['files']) - len(todo))
+    instrumentation.count('images.bad', len(bad))
+
+    if bad and not args.dry_run:
+        with instrumentation.stage('quarantine'):
+            skus = quarantine(bad)
+        for web_path in bad:
+            del cache['files'][web_path]
+        print(f'\n  Quarantined {len(bad)} files of {len(skus)} SKUs to {QUARANTINE_DIR}')
+    elif bad:
+        for web_path, (_, error) in sorted(bad.items()):
+            print(f'  BAD {web_path}: {error}')
+        print(f'\n  {len(bad)} bad files (dry run, nothing moved)')
+    else:
+        print('\n  All images OK')
+    save_cache(cache)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""
+Cached row snapshots of the Excel workbooks used by export_data.py.
+
+Parsing the pricelist with openpyxl dominates export time, although the
+workbook only changes a few times a day. The first read of a sheet stores
+its used columns in a SQLite side-table keyed by the workbook's SHA-1;
+later reads of the same workbook come straight from SQLite. A changed
+workbook (different hash) is re-parsed and its snapshot replaced.
+
+Usage:
+    from xlsx_snapshot import read_sheet
+    rows = read_sheet(PRICELIST_PATH, 'Verifica', max_col=14)
+"""
+
+import datetime
+import hashlib
+import os
+import sqlite3
+
+import openpyxl
+
+import instrumentation
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SNAPSHOT_DB = os.path.join(SCRIPT_DIR, 'xlsx_snapshots.db')
+
+MAX_COLUMNS = 14  # widest sheet we read (pricelist 'Verifica')
+
+_COLS = ', '.join(f'c{i}' for i in range(MAX_COLUMNS))
+
+
+def _connect(db_path):
+    # Generous timeout: export_data.py may refresh two sheets from parallel processes
+    conn = sqlite3.connect(db_path, timeout=60)
+    conn.executescript(f'''
+        CREATE TABLE IF NOT EXISTS snapshots (
+            path TEXT NOT NULL,
+            sheet TEXT NOT NULL,
+            max_col INTEGER NOT NULL,
+            min_row INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            sha1 TEXT NOT NULL,
+            PRIMARY KEY (path, sheet)
+        );
+        CREATE TABLE IF NOT EXISTS snapshot_rows (
+            sha1 TEXT NOT NULL,
+            sheet TEXT NOT NULL,
+            row_idx INTEGER NOT NULL,
+            {_COLS},
+            PRIMARY KEY (sha1, sheet, row_idx)
+        ) WITHOUT ROWID;
+    ''')
+    return conn
+
+
+def _file_sha1(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _cell(value):
+    """Coerce a cell to a type SQLite round-trips unchanged."""
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    return value
+
+
+def _parse_sheet(path, sheet, max_col, min_row):
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet]
+        rows = []
+        for row in ws.iter_rows(min_row=min_row, max_col=max_col, values_only=True):
+            if all(v is None for v in row):
+                continue  # trailing blank rows of read-only sheets
+            row = tuple(_cell(v) for v in row)
+            rows.append(row + (None,) * (max_col - len(row)))
+        return rows
+    finally:
+        wb.close()
+
+
+def read_sheet(path, sheet, max_col, min_row=2, db_path=None):
+    """Return the non-empty rows of `sheet` as tuples of `max_col` values.
+
+    Equivalent to iterating `ws.iter_rows(min_row, max_col, values_only=True)`
+    (minus fully blank rows), but served from the snapshot cache whenever the
+    workbook content is unchanged.
+    """
+    if max_col > MAX_COLUMNS:
+        raise ValueError(f'max_col {max_col} exceeds snapshot width {MAX_COLUMNS}')
+
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    conn = _connect(db_path or SNAPSHOT_DB)
+    try:
+        meta = conn.execute(
+            'SELECT size, mtime_ns, sha1, max_col, min_row FROM snapshots WHERE path = ? AND sheet = ?',
+            (path, sheet),
+        ).fetchone()
+
+        if meta and (meta[0], meta[1]) == (st.st_size, st.st_mtime_ns):
+            sha1 = meta[2]
+        else:
+            sha1 = _file_sha1(path)
+
+        if meta and meta[2] == sha1 and meta[3] >= max_col and meta[4] == min_row:
+            if (meta[0], meta[1]) != (st.st_size, st.st_mtime_ns):
+                conn.execute(
+                    'UPDATE snapshots SET size = ?, mtime_ns = ? WHERE path = ? AND sheet = ?',
+                    (st.st_size, st.st_mtime_ns, path, sheet),
+                )
+                conn.commit()
+            cols = ', '.join(f'c{i}' for i in range(max_col))
+            cur = conn.execute(
+                f'SELECT {cols} FROM snapshot_rows WHERE sha1 = ? AND sheet = ? ORDER BY row_idx',
+                (sha1, sheet),
+            )
+            instrumentation.count('xlsx.snapshot_hits')
+            return cur.fetchall()
+
+        with instrumentation.stage('openpyxl'):
+            rows = _parse_sheet(path, sheet, max_col, min_row)
+        instrumentation.count('xlsx.sheets_parsed')
+        instrumentation.count('xlsx.rows_parsed', len(rows))
+        placeholders = ', '.join('?' * (MAX_COLUMNS + 3))
+        with conn:
+            if meta:
+                conn.execute('DELETE FROM snapshot_rows WHERE sha1 = ? AND sheet = ?', (meta[2], sheet))
+            conn.execute('DELETE FROM snapshot_rows WHERE sha1 = ? AND sheet = ?', (sha1, sheet))
+            conn.executemany(
+                f'INSERT INTO snapshot_rows (sha1, sheet, row_idx, {_COLS}) VALUES ({placeholders})',
+                ((sha1, sheet, i) + row + (None,) * (MAX_COLUMNS - max_col)
+                 for i, row in enumerate(rows)),
+            )
+            conn.execute(
+                'INSERT OR REPLACE INTO snapshots (path, sheet, max_col, min_row, size, mtime_ns, sha1) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (path, sheet, max_col, min_row, st.st_size, st.st_mtime_ns, sha1),
+            )
+        return rows
+    finally:
+        conn.close()
@@ -3,6 +3,7 @@
 import { useState } from "react";
 import Image from "next/image";
 import { Product, Category } from "@/lib/types";
+import { getProductImages, imageFor } from "@/lib/images";
 import { Locale, getTranslations } from "@/lib/translations";
 import PriceInquiry from "./PriceDisplay";
 import BackButton from "./BackButton";
@@ -28,7 +29,7 @@ export default function ProductDetail({
   const categoryName = category
     ? (locale === "en" ? category.name_en : category.name_lv)
     : t.categories;
-  const localImages = product.images.filter((img) => img.startsWith("/") || img.startsWith("https://"));
+  const localImages = getProductImages(product);
   const [activeIndex, setActiveIndex] = useState(0);
 
   return (
@@ -48,10 +49,8 @@ export default function ProductDetail({
           <div className={`rounded-2xl h-56 md:h-80 flex items-center justify-center overflow-hidden ${localImages.length > 0 ? "bg-white" : "bg-brand-light-grey"}`}>
             {localImages.length > 0 ? (
               <Image
-                src={localImages[activeIndex]}
+                {...imageFor(localImages[activeIndex], "detail", 600)}
                 alt={displayName}
-                width={600}
-                height={600}
                 className="w-full h-full object-contain p-2"
               />
             ) : (
@@ -85,10 +84,8 @@ export default function ProductDetail({
                   }`}
                 >
                   <Image
-                    src={img}
+                    {...imageFor(img, "thumb", 56)}
                     alt={`${displayName} ${i + 1}`}
-                    width={56}
-                    height={56}
                     className="w-full h-full object-contain bg-white"
                   />
                 </button>
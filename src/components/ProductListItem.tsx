@@ -1,6 +1,7 @@
 import Link from "next/link";
 import Image from "next/image";
 import { Product } from "@/lib/types";
+import { getProductImages, imageFor } from "@/lib/images";
 import { Locale, getTranslations } from "@/lib/translations";
 import PriceInquiry from "./PriceDisplay";
 
@@ -15,7 +16,9 @@ export default function ProductListItem({ product, locale, index = 0 }: ProductL
   const displayName = locale === "en"
     ? (product.name_en || product.name_lv || product.sku)
     : (product.name_lv || product.name_en || product.sku);
-  const hasImage = product.images.length > 0 && (product.images[0].startsWith('/') || product.images[0].startsWith('https://'));
+  const images = getProductImages(product);
+  const hasImage = images.length > 0;
+  const image = hasImage ? imageFor(images[0], "list", 200) : null;
 
   return (
     <Link href={`/${locale}/products/${product.id}`} className="md:h-full">
@@ -24,12 +27,12 @@ export default function ProductListItem({ product, locale, index = 0 }: ProductL
         style={{ "--stagger": `${index * 30}ms` } as React.CSSProperties}
       >
         <div className={`w-14 h-14 md:w-full md:h-32 rounded-lg flex-shrink-0 flex items-center justify-center overflow-hidden ${hasImage ? "bg-white" : "bg-brand-light-grey md:bg-brand-grey/20"}`}>
-          {hasImage ? (
+          {image ? (
             <Image
-              src={product.images[0]}
+              src={image.src}
               alt={displayName}
-              width={200}
-              height={200}
+              width={image.width}
+              height={image.height}
               className="w-full h-full object-contain"
             />
           ) : (
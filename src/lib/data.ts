@@ -9,8 +9,31 @@ function loadJSON<T>(filename: string): T {
   return JSON.parse(raw) as T;
 }
 
+/** Written by scripts/export_data.py next to products.json */
+interface ProductManifest {
+  total: number;
+  shards: Record<string, { file: string; count: number }>;
+  /** [firstId, lastId, categorySlug] — contiguous id runs per shard */
+  ranges: [number, number, string][];
+  /** products.json and the shards hold one unindented product per line */
+  compact?: boolean;
+}
+
+/** Written by scripts/export_data.py — see scripts/search_index.py */
+interface SearchIndex {
+  version: number;
+  gramSize: number;
+  total: number;
+  /** gram -> ascending product ids, delta-encoded */
+  grams: Record<string, number[]>;
+}
+
 let _categories: Category[] | null = null;
 let _products: Product[] | null = null;
+let _productsById: Map<number, Product> | null = null;
+let _manifest: ProductManifest | null | undefined;
+let _searchIndex: SearchIndex | null | undefined;
+const _shards = new Map<string, Product[]>();
 
 function getLoadedCategories(): Category[] {
   if (!_categories) {
@@ -26,6 +49,125 @@ function getLoadedProducts(): Product[] {
   return _products;
 }
 
+function getProductsById(): Map<number, Product> {
+  if (!_productsById) {
+    _productsById = new Map(getLoadedProducts().map((p) => [p.id, p]));
+  }
+  return _productsById;
+}
+
+function getManifest(): ProductManifest | null {
+  if (_manifest === undefined) {
+    const manifestPath = path.join(process.cwd(), 'data', 'products-manifest.json');
+    _manifest = fs.existsSync(manifestPath)
+      ? loadJSON<ProductManifest>('products-manifest.json')
+      : null;
+  }
+  return _manifest;
+}
+
+/** Products of one category — parses only that category's shard when available */
+function getLoadedCategoryProducts(categorySlug: string): Product[] {
+  const manifest = getManifest();
+  if (_products || !manifest) {
+    return getLoadedProducts().filter((p) => p.categorySlug === categorySlug);
+  }
+  const shard = manifest.shards[categorySlug];
+  if (!shard) return [];
+  let products = _shards.get(categorySlug);
+  if (!products) {
+    products = loadJSON<Product[]>(shard.file);
+    _shards.set(categorySlug, products);
+  }
+  return products;
+}
+
+function findLoadedProduct(id: number): Product | undefined {
+  const manifest = getManifest();
+  if (!_products && manifest) {
+    const range = manifest.ranges.find(([first, last]) => id >= first && id <= last);
+    if (range) {
+      return getLoadedCategoryProducts(range[2]).find((p) => p.id === id);
+    }
+  }
+  return getProductsById().get(id);
+}
+
+function getSearchIndex(): SearchIndex | null {
+  if (_searchIndex === undefined) {
+    const indexPath = path.join(process.cwd(), 'data', 'search-index.json');
+    _searchIndex = fs.existsSync(indexPath)
+      ? loadJSON<SearchIndex>('search-index.json')
+      : null;
+  }
+  return _searchIndex;
+}
+
+/** Lowercase and strip diacritics; mirrors fold() in scripts/search_index.py */
+function foldText(text: string): string {
+  return text.toLowerCase().normalize('NFD').replace(/[\u0300-\u036f]/g, '');
+}
+
+function decodePostings(deltas: number[]): number[] {
+  const ids = new Array<number>(deltas.length);
+  let id = 0;
+  for (let i = 0; i < deltas.length; i++) {
+    id += deltas[i];
+    ids[i] = id;
+  }
+  return ids;
+}
+
+/**
+ * Ids of base products whose fields may contain the folded query, found by
+ * intersecting trigram posting lists. Returns null when there is no index or
+ * the query is shorter than one gram, so the caller falls back to a scan.
+ */
+function searchCandidates(q: string): number[] | null {
+  const index = getSearchIndex();
+  if (!index || q.length < index.gramSize) return null;
+
+  const lists: number[][] = [];
+  const seen = new Set<string>();
+  for (let i = 0; i + index.gramSize <= q.length; i++) {
+    const gram = q.slice(i, i + index.gramSize);
+    if (seen.has(gram)) continue;
+    seen.add(gram);
+    const postings = index.grams[gram];
+    if (!postings) return [];
+    lists.push(postings);
+  }
+
+  // Start from the rarest gram so the working set stays as small as possible
+  lists.sort((a, b) => a.length - b.length);
+  let result = new Set(decodePostings(lists[0]));
+  for (const list of lists.slice(1)) {
+    const next = new Set<number>();
+    for (const id of decodePostings(list)) {
+      if (result.has(id)) next.add(id);
+    }
+    result = next;
+    if (result.size === 0) break;
+  }
+  return [...result];
+}
+
+/** Base products that can appear in a category: its shard plus products moved there by an override */
+function getCategoryCandidates(
+  categorySlug: string,
+  overridesMap: Map<number, Record<string, unknown>>
+): Product[] {
+  const base = getLoadedCategoryProducts(categorySlug);
+  const movedIn: Product[] = [];
+  for (const [id, ov] of overridesMap) {
+    if (ov.categorySlug !== categorySlug) continue;
+    const product = findLoadedProduct(id);
+    if (product && product.categorySlug !== categorySlug) movedIn.push(product);
+  }
+  if (movedIn.length === 0) return base;
+  return [...base, ...movedIn].sort((a, b) => a.id - b.id);
+}
+
 /** Apply overrides map to a list of products, returning new product objects */
 function applyOverrides(
   products: Product[],
@@ -102,7 +244,7 @@ export async function getProductsByCategory(categorySlug: string): Promise<Produ
     getHiddenProductIds(),
     getProductOverrides(),
   ]);
-  const products = applyOverrides(getLoadedProducts(), overrides);
+  const products = applyOverrides(getCategoryCandidates(categorySlug, overrides), overrides);
   return products.filter(
     (p) => p.categorySlug === categorySlug && !hidden.has(p.id)
   );
@@ -126,7 +268,7 @@ export async function getProductById(id: number): Promise<Product | undefined> {
     getHiddenProductIds(),
     getProductOverrides(),
   ]);
-  const product = getLoadedProducts().find((p) => p.id === id);
+  const product = findLoadedProduct(id);
   if (!product || hidden.has(product.id)) return undefined;
   return applyOverrideSingle(product, overrides);
 }
@@ -135,21 +277,36 @@ export async function searchProducts(
   query: string,
   categorySlug?: string
 ): Promise<Product[]> {
-  const q = query.toLowerCase();
+  const q = foldText(query);
   const [hidden, overrides] = await Promise.all([
     getHiddenProductIds(),
     getProductOverrides(),
   ]);
-  const base = getLoadedProducts();
-  const pool = categorySlug
-    ? base.filter((p) => p.categorySlug === categorySlug)
-    : base;
-  const withOverrides = applyOverrides(pool, overrides);
-  return withOverrides.filter(
-    (p) =>
-      !hidden.has(p.id) &&
-      ((p.name_lv || '').toLowerCase().includes(q) ||
-        (p.name_en || '').toLowerCase().includes(q) ||
-        (p.sku || '').toLowerCase().includes(q))
-  );
+  const matches = (p: Product) =>
+    foldText(p.name_lv || '').includes(q) ||
+    foldText(p.name_en || '').includes(q) ||
+    foldText(p.sku || '').includes(q);
+
+  const candidates = searchCandidates(q);
+  if (candidates === null) {
+    const pool = categorySlug
+      ? getLoadedCategoryProducts(categorySlug)
+      : getLoadedProducts();
+    const withOverrides = applyOverrides(pool, overrides);
+    return withOverrides.filter((p) => !hidden.has(p.id) && matches(p));
+  }
+
+  // Overridden products may match on edited names the index has never seen
+  const ids = new Set(candidates);
+  for (const id of overrides.keys()) ids.add(id);
+
+  const results: Product[] = [];
+  for (const id of [...ids].sort((a, b) => a - b)) {
+    if (hidden.has(id)) continue;
+    const base = findLoadedProduct(id);
+    if (!base || (categorySlug && base.categorySlug !== categorySlug)) continue;
+    const product = applyOverrideSingle(base, overrides);
+    if (matches(product)) results.push(product);
+  }
+  return results;
 }
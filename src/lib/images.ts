@@ -0,0 +1,20 @@
+import { ImageVariant, ImageVariantName, ImageVariants, Product } from "./types";
+
+export interface ProductImage {
+  original: string;
+  variants: ImageVariants | null;
+}
+
+/** Displayable images of a product (local or https), with their pre-rendered variants */
+export function getProductImages(product: Product): ProductImage[] {
+  return product.images.flatMap((src, i) =>
+    src.startsWith("/") || src.startsWith("https://")
+      ? [{ original: src, variants: product.imageVariants?.[i] ?? null }]
+      : []
+  );
+}
+
+/** The requested variant, or the original at the given display size when none was rendered */
+export function imageFor(image: ProductImage, size: ImageVariantName, fallbackSize: number): ImageVariant {
+  return image.variants?.[size] ?? { src: image.original, width: fallbackSize, height: fallbackSize };
+}
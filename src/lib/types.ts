@@ -20,4 +20,20 @@ export interface Product {
   brand: string;
   ean: string;
   images: string[];
+  /** Pre-rendered WebP sizes per image (aligned with `images`), see scripts/image_variants.py */
+  imageVariants?: (ImageVariants | null)[];
+}
+
+export interface ImageVariant {
+  src: string;
+  width: number;
+  height: number;
+}
+
+export type ImageVariantName = "thumb" | "list" | "detail";
+
+export interface ImageVariants extends Record<ImageVariantName, ImageVariant> {
+  /** Size of the original */
+  width: number;
+  height: number;
 }